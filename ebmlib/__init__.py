@@ -1,2 +1,2 @@
 """... automodule::"""
-import units, rbm, srrbm, autoencoder, srautoencoder
+from . import units, sequences, loader, fit, rbm, srrbm, autoencoder, srautoencoder, parallel, checkpoint, serve, sessions, prefix
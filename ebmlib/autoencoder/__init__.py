@@ -1,3 +1,3 @@
 """... automodule::"""
-from autoencoder import Autoencoder
-from backproptrainer import BackPropTrainer, SparseBackPropTrainer
+from . autoencoder import Autoencoder
+from . backproptrainer import BackPropTrainer, SparseBackPropTrainer
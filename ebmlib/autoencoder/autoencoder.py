@@ -28,7 +28,7 @@
 #---------------------------------------#
 
 import numpy as np
-from .. units import unittypes
+from .. units import unittypes, inputdot, copystate
 
 class Autoencoder(object):
 	"""autoencoder class
@@ -37,30 +37,33 @@ class Autoencoder(object):
 	:param nhid: number of hidden units
 	:param htype: hidden unit type, see units.py for available types
 	:param otype: output unit type, see units.py for available types
+	:param dtype: floating point type of the weights and biases
 
 	:type nin: int
 	:type nhid: int
 	:type htype: string
 	:type otype: string
+	:type dtype: numpy.dtype
 	"""
-	def __init__(self, nin, nhid, htype = 'tanh', otype = 'sigmoid'):
+	def __init__(self, nin, nhid, htype = 'tanh', otype = 'sigmoid', dtype = np.float64):
 		self.nin = nin
 		self.nhid = nhid
-		self.i = np.zeros(nin)
-		self.h = np.zeros(nhid)
-		self.o = np.zeros(nin)
+		self.dtype = np.dtype(dtype)
+		self.i = np.zeros(nin, dtype = dtype)
+		self.h = np.zeros(nhid, dtype = dtype)
+		self.o = np.zeros(nin, dtype = dtype)
 
-		self.hb = np.zeros(nhid)
-		self.ob = np.zeros(nin)
+		self.hb = np.zeros(nhid, dtype = dtype)
+		self.ob = np.zeros(nin, dtype = dtype)
 
-		self.whi = np.random.normal(0., 0.2, (nhid, nin))
-		self.woh = np.random.normal(0., 0.2, (nin, nhid))
+		self.whi = np.random.normal(0., 0.2, (nhid, nin)).astype(dtype)
+		self.woh = np.random.normal(0., 0.2, (nin, nhid)).astype(dtype)
 
-		self.dwhi = np.zeros((nhid, nin))
-		self.dwoh = np.zeros((nin, nhid))
+		self.dwhi = np.zeros((nhid, nin), dtype = dtype)
+		self.dwoh = np.zeros((nin, nhid), dtype = dtype)
 		
-		self.dhb = np.zeros(nhid)
-		self.dob = np.zeros(nin)
+		self.dhb = np.zeros(nhid, dtype = dtype)
+		self.dob = np.zeros(nin, dtype = dtype)
 
 		self.htype = htype
 		self.otype = otype
@@ -71,52 +74,57 @@ class Autoencoder(object):
 	def ff(self, x):
 		"""get reconstruction of x
 
-		:param x: input
-		:type x: numpy.array
+		:param x: input, or one input per row, which may be a scipy.sparse matrix
+		:type x: numpy.array or scipy.sparse matrix
 		:returns: reconstruction of x
 		:rtype: numpy.array
 		"""
-		self.h = self.hact(np.dot(self.whi, x) + self.hb)
-		self.o = self.oact(np.dot(self.woh, self.h) + self.ob)
+		self.h = self.hact(inputdot(x, self.whi) + self.hb)
+		self.o = self.oact(np.dot(self.h, self.woh.T) + self.ob)
 		return self.o
 
 	def encode(self, x):
 		"""get encoding of x
 
-		:param x: input
-		:type x: numpy.array
+		:param x: input, or one input per row, which may be a scipy.sparse matrix
+		:type x: numpy.array or scipy.sparse matrix
 		:returns: encoding of x
 		:rtype: numpy.array
 		"""
-		self.h = self.hact(np.dot(self.whi, x) + self.hb)
+		self.h = self.hact(inputdot(x, self.whi) + self.hb)
 		return self.h
 
 	def decode(self, h):
 		"""get decoding of h
 
-		:param h: hidden state to decode
+		:param h: hidden state to decode, or one state per row
 		:type h: numpy.array
 		:returns: decoding of h
 		:rtype: numpy.array
 		"""
-		self.o = self.oact(np.dot(self.woh, h) + self.ob)
+		self.o = self.oact(np.dot(h, self.woh.T) + self.ob)
+		return self.o
 
-	def __getstate__(self):
+	def _state(self):
+		"""state of the model without copying its arrays, read by ebmlib.checkpoint"""
 		d = {
 			'nin':		self.nin,
 			'nhid':		self.nhid,
 			'htype':	self.htype,
 			'otype':	self.otype,
-			'whi':		self.whi.copy(),
-			'woh':		self.woh.copy(),
-			'hb':		self.hb.copy(),
-			'ob':		self.ob.copy(),
-			'dwhi':		self.dwhi.copy(),
-			'dwoh':		self.dwoh.copy(),
-			'dhb':		self.dhb.copy(),
-			'dob':		self.dob.copy()}
+			'whi':		self.whi,
+			'woh':		self.woh,
+			'hb':		self.hb,
+			'ob':		self.ob,
+			'dwhi':		self.dwhi,
+			'dwoh':		self.dwoh,
+			'dhb':		self.dhb,
+			'dob':		self.dob}
 		return d
 
+	def __getstate__(self):
+		return copystate(self._state())
+
 	def __setstate__(self, d):
 		self.nin =		d['nin']
 		self.nhid =		d['nhid']
@@ -130,12 +138,13 @@ class Autoencoder(object):
 		self.dwoh =		d['dwoh']
 		self.dhb =		d['dhb']
 		self.dob =		d['dob']
+		self.dtype = self.whi.dtype
 		
 		self.hact = unittypes[self.htype]
 		self.oact = unittypes[self.otype]
 
-		self.i = np.zeros(self.nin)
-		self.h = np.zeros(self.nhid)
-		self.o = np.zeros(self.nin)
+		self.i = np.zeros(self.nin, dtype = self.dtype)
+		self.h = np.zeros(self.nhid, dtype = self.dtype)
+		self.o = np.zeros(self.nin, dtype = self.dtype)
 
 
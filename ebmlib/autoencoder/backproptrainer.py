@@ -28,7 +28,7 @@
 #---------------------------------------#
 
 import numpy as np
-from .. units import derivatives
+from .. units import derivatives, issparse, asinput, compact, apply_update, blockstats
 
 class BackPropTrainer(object):
 	"""backpropagation trainer class
@@ -47,6 +47,13 @@ class BackPropTrainer(object):
 		self.lr, self.m, self.l2 = lr, m, l2
 		self.dherr = derivatives[net.htype]
 		self.doerr = derivatives[net.otype]
+		# workspace, reused by every update
+		self._gwoh = np.zeros(net.woh.shape, dtype = net.dtype)
+		self._twoh = np.zeros(net.woh.shape, dtype = net.dtype)
+		self._gwhi = np.zeros(net.whi.shape, dtype = net.dtype)
+		self._twhi = np.zeros(net.whi.shape, dtype = net.dtype)
+		self._gob = np.zeros(net.ob.shape, dtype = net.dtype)
+		self._ghb = np.zeros(net.hb.shape, dtype = net.dtype)
 
 	def learn(self, net, x, m = True, l2 = True):
 		"""weight update for single training example
@@ -61,90 +68,116 @@ class BackPropTrainer(object):
 		:type l2: bool
 		:rtype: None
 		"""
+		x = np.asarray(x, dtype = net.dtype)
 		net.ff(x)
 		eo = self.doerr(net.o) * (x - net.o)
 		eh = self.dherr(net.h) * np.dot(net.woh.T, eo)
 
+		gwoh, gwhi, gob, ghb = self._gwoh, self._gwhi, self._gob, self._ghb
+		np.multiply(eo[:, np.newaxis], net.h, out = gwoh)
+		np.multiply(eh[:, np.newaxis], x, out = gwhi)
+		gob[...] = eo
+		ghb[...] = eh
+
 		if l2:
-			dwoh = self.lr * (np.outer(eo, net.h) - self.l2 * net.woh)
-			dwhi = self.lr * (np.outer(eh, x) - self.l2 * net.whi)
-		else:
-			dwoh = self.lr * np.outer(eo, net.h)
-			dwhi = self.lr * np.outer(eh, x)
-		
-		dob = self.lr * eo
-		dhb = self.lr * eh
-
-		if m:
-			dwoh += self.m * net.dwoh
-			dwhi += self.m * net.dwhi
-			dob += self.m * net.dob
-			dhb += self.m * net.dhb
-
-		net.woh += dwoh
-		net.whi += dwhi
-		net.ob += dob
-		net.hb += dhb
-
-		net.dwoh = dwoh
-		net.dwhi = dwhi
-		net.dob = dob
-		net.dhb = dhb
-
-	def batchlearn(self, net, X, m = True, l2 = True):
+			np.multiply(net.woh, self.l2, out = self._twoh)
+			np.multiply(net.whi, self.l2, out = self._twhi)
+			gwoh -= self._twoh
+			gwhi -= self._twhi
+
+		for g in (gwoh, gwhi, gob, ghb):
+			g *= self.lr
+
+		apply_update(net.woh, net.dwoh, gwoh, self.m if m else 0.)
+		apply_update(net.whi, net.dwhi, gwhi, self.m if m else 0.)
+		apply_update(net.ob, net.dob, gob, self.m if m else 0.)
+		apply_update(net.hb, net.dhb, ghb, self.m if m else 0.)
+
+	def batchlearn(self, net, X, m = True, l2 = True, block = None):
 		"""weight update for a batch of training examples
 
 		:param net: model to update
-		:param X: examples
+		:param X: examples, which may be a scipy.sparse matrix
 		:param m: include momentum term in cost function
 		:param l2: include l2 regularization term in cost function
+		:param block: compute the gradients over blocks of this many examples, see units.blockstats
 
 		:type net: ebmlib.autoencoder.AutoEncoder
-		:type X: 2d numpy.array or list of numpy.array
+		:type X: 2d numpy.array, list of numpy.array or scipy.sparse matrix
 		:type m: bool
 		:type l2: bool
+		:type block: int
 
 		:rtype: None
 		"""
-		dwoh = np.zeros(net.woh.shape)
-		dwhi = np.zeros(net.whi.shape)
-		dob = np.zeros(net.ob.shape)
-		dhb = np.zeros(net.hb.shape)
-		
-		for x in X:
-			net.ff(x)
-			eo = self.doerr(net.o) * (x - net.o)
-			eh = self.dherr(net.h) * np.dot(net.woh.T, eo)
-			dwoh += np.outer(eo, net.h)
-			dwhi += np.outer(eh, x)
-			dob += eo
-			dhb += eh
+		X = asinput(X, net.dtype)
+		self.applystats(net, blockstats(lambda B: self.batchstats(net, B), X, block), X.shape[0], m, l2)
 
-		if l2:
-			dwoh = self.lr * (dwoh - self.l2 * net.woh)/len(X)
-			dwhi = self.lr * (dwhi - self.l2 * net.whi)/len(X)
+	def batchstats(self, net, X):
+		"""summed gradients of a batch of training examples
+
+		The statistics of several batches add up to those of their union,
+		so they can be computed separately and summed before applystats.
+
+		:param net: model
+		:param X: examples, which may be a scipy.sparse matrix
+		:type net: ebmlib.autoencoder.AutoEncoder
+		:type X: 2d numpy.array, list of numpy.array or scipy.sparse matrix
+		:returns: summed gradients of woh, whi, ob and hb
+		:rtype: tuple of numpy.array
+		"""
+		X = asinput(X, net.dtype)
+		# forward and backward pass over the whole batch
+		O = net.ff(X)
+		H = net.h
+		EO = self.doerr(O) * ((X.toarray() if issparse(X) else X) - O)
+		EH = self.dherr(H) * np.dot(EO, net.woh)
+
+		gwoh, gwhi, gob, ghb = self._gwoh, self._gwhi, self._gob, self._ghb
+		np.dot(EO.T, H, out = gwoh)
+		if issparse(X):
+			# only the columns holding nonzeros have a nonzero gradient
+			cols, Xc = compact(X)
+			gwhi[...] = 0
+			gwhi[:, cols] = Xc.T.dot(EH).T
 		else:
-			dwoh = self.lr * dwoh / len(X)
-			dwhi = self.lr * dwhi / len(X)
-
-		dob = self.lr * dob / len(X)
-		dhb = self.lr * dhb / len(X)
-		
-		if m:
-			dwoh += self.m * net.dwoh
-			dwhi += self.m * net.dwhi
-			dob += self.m * net.dob
-			dhb += self.m * net.dhb
-
-		net.woh += dwoh
-		net.whi += dwhi
-		net.ob += dob
-		net.hb += dhb
-
-		net.dwoh = dwoh
-		net.dwhi = dwhi
-		net.dob = dob
-		net.dhb = dhb
+			np.dot(EH.T, X, out = gwhi)
+		EO.sum(axis = 0, out = gob)
+		EH.sum(axis = 0, out = ghb)
+		return gwoh, gwhi, gob, ghb
+
+	def applystats(self, net, stats, n, m = True, l2 = True):
+		"""weight update from summed batch gradients
+
+		:param net: model to update
+		:param stats: gradients returned by batchstats, overwritten
+		:param n: number of examples the gradients are summed over
+		:param m: include momentum term in cost function
+		:param l2: include l2 regularization term in cost function
+
+		:type net: ebmlib.autoencoder.AutoEncoder
+		:type stats: tuple of numpy.array
+		:type n: int
+		:type m: bool
+		:type l2: bool
+
+		:rtype: None
+		"""
+		gwoh, gwhi, gob, ghb = stats
+
+		if l2:
+			np.multiply(net.woh, self.l2, out = self._twoh)
+			np.multiply(net.whi, self.l2, out = self._twhi)
+			gwoh -= self._twoh
+			gwhi -= self._twhi
+
+		for g in (gwoh, gwhi, gob, ghb):
+			g *= self.lr / n
+
+		apply_update(net.woh, net.dwoh, gwoh, self.m if m else 0.)
+		apply_update(net.whi, net.dwhi, gwhi, self.m if m else 0.)
+		apply_update(net.ob, net.dob, gob, self.m if m else 0.)
+		apply_update(net.hb, net.dhb, ghb, self.m if m else 0.)
 
 class SparseBackPropTrainer(object):
 	"""backpropagation with sparisty constraint trainer class
@@ -170,7 +203,15 @@ class SparseBackPropTrainer(object):
 		self.dherr = derivatives[net.htype]
 		self.doerr = derivatives[net.otype]
 
-		self.q = np.zeros(net.nhid)
+		self.q = np.zeros(net.nhid, dtype = net.dtype)
+		# workspace, reused by every update
+		self._gwoh = np.zeros(net.woh.shape, dtype = net.dtype)
+		self._twoh = np.zeros(net.woh.shape, dtype = net.dtype)
+		self._gwhi = np.zeros(net.whi.shape, dtype = net.dtype)
+		self._twhi = np.zeros(net.whi.shape, dtype = net.dtype)
+		self._gob = np.zeros(net.ob.shape, dtype = net.dtype)
+		self._ghb = np.zeros(net.hb.shape, dtype = net.dtype)
+		self._gdwhi = np.zeros(net.whi.shape, dtype = net.dtype)
 
 	def sparseterm(self, h):
 		"""compute the sparse penalty term and update the exponential decaying mean approximation
@@ -209,93 +250,118 @@ class SparseBackPropTrainer(object):
 
 		:rtype: None
 		"""
+		x = np.asarray(x, dtype = net.dtype)
 		net.ff(x)
 		eo = self.doerr(net.o) * (x - net.o)
 		eh = self.dherr(net.h) * (np.dot(net.woh.T, eo) - self.sparseterm(net.h))
 
+		gwoh, gwhi, gob, ghb = self._gwoh, self._gwhi, self._gob, self._ghb
+		np.multiply(eo[:, np.newaxis], net.h, out = gwoh)
+		np.multiply(eh[:, np.newaxis], x, out = gwhi)
+		gob[...] = eo
+		ghb[...] = eh
+
 		if l2:
-			dwoh = self.lr * (np.outer(eo, net.h) - self.l2 * net.woh)
-			dwhi = self.lr * (np.outer(eh, x) - self.l2 * net.whi)
-		else:
-			dwoh = self.lr * np.outer(eo, net.h)
-			dwhi = self.lr * np.outer(eh, x)
-		
-		dob = self.lr * eo
-		dhb = self.lr * eh
-
-		if m:
-			dwoh += self.m * net.dwoh
-			dwhi += self.m * net.dwhi
-			dob += self.m * net.dob
-			dhb += self.m * net.dhb
-
-		net.woh += dwoh
-		net.whi += dwhi
-		net.ob += dob
-		net.hb += dhb
-
-		net.dwoh = dwoh
-		net.dwhi = dwhi
-		net.dob = dob
-		net.dhb = dhb
-
-	def batchlearn(self, net, X, m = True, l2 = True):
+			np.multiply(net.woh, self.l2, out = self._twoh)
+			np.multiply(net.whi, self.l2, out = self._twhi)
+			gwoh -= self._twoh
+			gwhi -= self._twhi
+
+		for g in (gwoh, gwhi, gob, ghb):
+			g *= self.lr
+
+		apply_update(net.woh, net.dwoh, gwoh, self.m if m else 0.)
+		apply_update(net.whi, net.dwhi, gwhi, self.m if m else 0.)
+		apply_update(net.ob, net.dob, gob, self.m if m else 0.)
+		apply_update(net.hb, net.dhb, ghb, self.m if m else 0.)
+
+	def batchlearn(self, net, X, m = True, l2 = True, block = None):
 		"""weight update for a batch of training examples
 
 		:param net: model to update
-		:param x: example
+		:param X: examples
 		:param m: include momentum term in cost function
 		:param l2: include l2 regularization term in cost function
+		:param block: compute the gradients over blocks of this many examples, see units.blockstats
 
-		:type rbm: ebmlib.autoencoder.AutoEncoder
+		:type net: ebmlib.autoencoder.AutoEncoder
 		:type X: 2d numpy.array of list of numpy.array
 		:type m: bool
 		:type l2: bool
+		:type block: int
 
 		:rtype: None
 		"""
-		dwoh = np.zeros(net.woh.shape)
-		dwhi = np.zeros(net.whi.shape)
-		dob = np.zeros(net.ob.shape)
-		dhb = np.zeros(net.hb.shape)
-		
-		phat = np.zeros(net.nhid)
-		for x in X:
-			net.ff(x)
-			phat += net.h
-		phat /= len(X)
-		sparse_penalty_term = self.batchsparseterm(phat)
-		for x in X:
-			net.ff(x)
-			eo = self.doerr(net.o) * (x - net.o)
-			eh = self.dherr(net.h) * (np.dot(net.woh.T, eo) - sparse_penalty_term)
-			dwoh += np.outer(eo, net.h)
-			dwhi += np.outer(eh, x)
-			dob += eo
-			dhb += eh
+		X = np.asarray(X, dtype = net.dtype)
+		self.applystats(net, blockstats(lambda B: self.batchstats(net, B), X, block), len(X), m, l2)
+
+	def batchstats(self, net, X):
+		"""summed gradients of a batch of training examples, before the sparsity penalty
+
+		The penalty depends on the mean hidden activity of the whole
+		batch, so the gradients of whi and hb are returned without it,
+		together with the sums applystats needs to add it once the mean
+		is known. The statistics of several batches add up to those of
+		their union, so they can be computed separately and summed before
+		applystats.
+
+		:param net: model
+		:param X: examples
+		:type net: ebmlib.autoencoder.AutoEncoder
+		:type X: 2d numpy.array or list of numpy.array
+		:returns: summed gradients of woh, whi, ob and hb, summed products of the hidden derivatives with the inputs, summed hidden derivatives and summed hidden activities
+		:rtype: tuple of numpy.array
+		"""
+		X = np.asarray(X, dtype = net.dtype)
+		O = net.ff(X)
+		H = net.h
+		EO = self.doerr(O) * (X - O)
+		DH = self.dherr(H) * np.ones(H.shape, dtype = H.dtype)
+		EH = DH * np.dot(EO, net.woh)
+
+		gwoh, gwhi, gob, ghb = self._gwoh, self._gwhi, self._gob, self._ghb
+		np.dot(EO.T, H, out = gwoh)
+		np.dot(EH.T, X, out = gwhi)
+		np.dot(DH.T, X, out = self._gdwhi)
+		EO.sum(axis = 0, out = gob)
+		EH.sum(axis = 0, out = ghb)
+		return gwoh, gwhi, gob, ghb, self._gdwhi, DH.sum(axis = 0), H.sum(axis = 0)
+
+	def applystats(self, net, stats, n, m = True, l2 = True):
+		"""weight update from summed batch gradients
+
+		:param net: model to update
+		:param stats: statistics returned by batchstats, overwritten
+		:param n: number of examples the statistics are summed over
+		:param m: include momentum term in cost function
+		:param l2: include l2 regularization term in cost function
+
+		:type net: ebmlib.autoencoder.AutoEncoder
+		:type stats: tuple of numpy.array
+		:type n: int
+		:type m: bool
+		:type l2: bool
+
+		:rtype: None
+		"""
+		gwoh, gwhi, gob, ghb, gdwhi, gdhb, hsum = stats
+
+		# sparsity, from the mean activity of the whole batch
+		sparse_penalty_term = self.batchsparseterm(hsum / n)
+		gdwhi *= sparse_penalty_term[:, np.newaxis]
+		gwhi -= gdwhi
+		ghb -= sparse_penalty_term * gdhb
 
 		if l2:
-			dwoh = self.lr * (dwoh - self.l2 * net.woh)/len(X)
-			dwhi = self.lr * (dwhi - self.l2 * net.whi)/len(X)
-		else:
-			dwoh = self.lr * dwoh / len(X)
-			dwhi = self.lr * dwhi / len(X)
-
-		dob = self.lr * dob / len(X)
-		dhb = self.lr * dhb / len(X)
-		
-		if m:
-			dwoh += self.m * net.dwoh
-			dwhi += self.m * net.dwhi
-			dob += self.m * net.dob
-			dhb += self.m * net.dhb
-
-		net.woh += dwoh
-		net.whi += dwhi
-		net.ob += dob
-		net.hb += dhb
-
-		net.dwoh = dwoh
-		net.dwhi = dwhi
-		net.dob = dob
-		net.dhb = dhb
+			np.multiply(net.woh, self.l2, out = self._twoh)
+			np.multiply(net.whi, self.l2, out = self._twhi)
+			gwoh -= self._twoh
+			gwhi -= self._twhi
+
+		for g in (gwoh, gwhi, gob, ghb):
+			g *= self.lr / n
+
+		apply_update(net.woh, net.dwoh, gwoh, self.m if m else 0.)
+		apply_update(net.whi, net.dwhi, gwhi, self.m if m else 0.)
+		apply_update(net.ob, net.dob, gob, self.m if m else 0.)
+		apply_update(net.hb, net.dhb, ghb, self.m if m else 0.)
@@ -0,0 +1,396 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake 
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	checkpoint.py
+# description:
+#	Checkpoints stored as a directory of .npy files plus a json header,
+#	loaded by memory mapping.
+#---------------------------------------#
+
+import os
+import json
+import shutil
+import time
+import random
+import threading
+import importlib
+import numpy as np
+
+# version of the on disk layout, stored in every header
+VERSION = 1
+
+def _scalar(x):
+	"""convert numpy scalars to plain python for json"""
+	return x.item() if isinstance(x, np.generic) else x
+
+def isdelta(key, state):
+	"""is a state entry a momentum delta, i.e. dW next to W
+
+	:param key: state key
+	:param state: model state
+	:type key: string
+	:type state: dict
+	:rtype: bool
+	"""
+	return key.startswith('d') and key[1:] in state
+
+def _write(path, state, header):
+	"""write the arrays of a state and the header into a new directory"""
+	os.makedirs(path)
+	header['arrays'] = {}
+	header['scalars'] = {}
+	for key, value in state.items():
+		if isinstance(value, np.ndarray):
+			np.save(os.path.join(path, key + '.npy'), value)
+			header['arrays'][key] = {'dtype': value.dtype.str, 'shape': list(value.shape)}
+		else:
+			header['scalars'][key] = _scalar(value)
+	with open(os.path.join(path, 'header.json'), 'w') as f:
+		json.dump(header, f, indent = 1, sort_keys = True)
+
+def _read(path, header, mmap):
+	"""read the state written by _write"""
+	state = dict(header['scalars'])
+	for key in header['arrays']:
+		state[key] = np.load(os.path.join(path, key + '.npy'), mmap_mode = 'r' if mmap else None)
+	return state
+
+def _replace(tmp, path):
+	"""move a finished checkpoint directory into place"""
+	if os.path.exists(path):
+		old = path + '.old'
+		if os.path.exists(old):
+			shutil.rmtree(old)
+		os.rename(path, old)
+		os.rename(tmp, path)
+		shutil.rmtree(old)
+	else:
+		os.rename(tmp, path)
+
+def trainerstate(trainer):
+	"""state of a trainer needed to resume training
+
+	This is every public array, e.g. the sparsity running mean q or the
+	persistent chains of a PcdTrainer, lists of equally shaped array
+	tuples such as the chains of srrbm.PcdTrainer, and every scalar
+	hyperparameter. Attributes starting with an underscore are
+	workspace and are left out, as are functions.
+
+	:param trainer: trainer
+	:type trainer: ebmlib trainer
+	:returns: arrays and scalars by attribute name, and the arity of every list of tuples
+	:rtype: (dict, dict)
+	"""
+	state, lists = {}, {}
+	for key, value in vars(trainer).items():
+		if key.startswith('_'):
+			continue
+		if isinstance(value, np.ndarray) or isinstance(value, (bool, int, float, str, np.generic)):
+			state[key] = value
+		elif isinstance(value, list) and value and isinstance(value[0], tuple):
+			lists[key] = len(value[0])
+			for i in range(lists[key]):
+				state['%s.%d' % (key, i)] = np.array([t[i] for t in value])
+	return state, lists
+
+def _rngstate():
+	"""numpy and python random number generator states, arrays and json parts"""
+	name, keys, pos, has_gauss, gauss = np.random.get_state()
+	return {'_rngkeys': keys}, {
+		'numpy': [name, int(pos), int(has_gauss), float(gauss)],
+		'python': random.getstate()}
+
+def save(model, path, training = True, trainer = None):
+	"""save a model, and optionally the state of its trainer
+
+	Every array of the model's state is written as its own .npy file
+	straight from the model, without copying, next to a header.json
+	holding the format version, the model class, the non array state
+	and the dtype and shape of every array. The checkpoint is written
+	to a temporary directory and then renamed, so an existing checkpoint
+	at path is only replaced by a complete one.
+
+	With a trainer, its state from trainerstate and the state of the
+	numpy and python random number generators are written to the
+	trainer subdirectory in the same way, so restore can resume
+	training exactly where it stopped.
+
+	:param model: model to save
+	:param path: checkpoint directory
+	:param training: also save the momentum deltas, which only training needs
+	:param trainer: trainer whose state is saved too
+	:type model: any ebmlib model
+	:type path: string
+	:type training: bool
+	:type trainer: ebmlib trainer
+	:rtype: None
+	"""
+	_save(path, *_snapshot(model, training, trainer))
+
+def _snapshot(model, training, trainer):
+	"""states and headers of a model and optionally its trainer, arrays not copied"""
+	state = model._state()
+	header = {
+		'version':	VERSION,
+		'class':	model.__class__.__module__ + '.' + model.__class__.__name__,
+		'excluded':	[]}
+	if not training:
+		header['excluded'] = sorted(key for key in state if isdelta(key, state))
+		state = dict((key, value) for key, value in state.items() if key not in header['excluded'])
+	if trainer is None:
+		return state, header, None, None
+	tstate, lists = trainerstate(trainer)
+	rngarrays, rng = _rngstate()
+	tstate.update(rngarrays)
+	theader = {
+		'version':	VERSION,
+		'class':	trainer.__class__.__module__ + '.' + trainer.__class__.__name__,
+		'lists':	lists,
+		'rng':		rng}
+	return state, header, tstate, theader
+
+def _save(path, state, header, tstate, theader):
+	"""write a snapshot to a temporary directory and move it into place"""
+	tmp = path.rstrip(os.sep) + '.tmp'
+	if os.path.exists(tmp):
+		shutil.rmtree(tmp)
+	_write(tmp, state, header)
+	if tstate is not None:
+		_write(os.path.join(tmp, 'trainer'), tstate, theader)
+	_replace(tmp, path)
+
+def restore(trainer, path, rng = True):
+	"""restore the state of a trainer saved along with a model
+
+	The trainer must have been created for the model loaded from the same
+	checkpoint. Its arrays and hyperparameters are replaced by the saved
+	ones.
+
+	:param trainer: trainer to restore
+	:param path: checkpoint directory
+	:param rng: also restore the numpy and python random number generators
+	:type trainer: ebmlib trainer
+	:type path: string
+	:type rng: bool
+	:rtype: None
+	"""
+	h = header(os.path.join(path, 'trainer'))
+	state = _read(os.path.join(path, 'trainer'), h, False)
+	keys = state.pop('_rngkeys')
+	for key, arity in h['lists'].items():
+		parts = [state.pop('%s.%d' % (key, i)) for i in range(arity)]
+		state[key] = [tuple(t) for t in zip(*parts)]
+	for key, value in state.items():
+		setattr(trainer, key, value)
+	if rng:
+		name, pos, has_gauss, gauss = h['rng']['numpy']
+		np.random.set_state((name, keys, pos, has_gauss, gauss))
+		version, internal, gauss_next = h['rng']['python']
+		random.setstate((version, tuple(internal), gauss_next))
+
+def header(path):
+	"""read the header of a checkpoint
+
+	:param path: checkpoint directory
+	:type path: string
+	:rtype: dict
+	"""
+	with open(os.path.join(path, 'header.json')) as f:
+		h = json.load(f)
+	if h['version'] > VERSION:
+		raise ValueError('checkpoint version %d is newer than supported version %d' % (h['version'], VERSION))
+	return h
+
+def load(path, mmap = True):
+	"""load a model saved by save
+
+	With mmap the arrays are read only memory maps of the checkpoint
+	files, so loading reads nothing until the weights are used and
+	several processes can share one copy in the page cache. This suits
+	inference; to continue training load with mmap = False. Deltas left
+	out of the checkpoint are restored as zeros.
+
+	:param path: checkpoint directory
+	:param mmap: memory map the arrays read only instead of reading them
+	:type path: string
+	:type mmap: bool
+	:returns: the model
+	:rtype: ebmlib model
+	"""
+	h = header(path)
+	modname, clsname = h['class'].rsplit('.', 1)
+	cls = getattr(importlib.import_module(modname), clsname)
+	state = _read(path, h, mmap)
+	for key in h['excluded']:
+		state[key] = np.zeros_like(state[key[1:]])
+	model = cls.__new__(cls)
+	model.__setstate__(state)
+	return model
+
+class CheckpointWriter(object):
+	"""write checkpoints in a background thread
+
+	write copies the model and trainer arrays into one of two sets of
+	preallocated buffers and returns, and a background thread saves the
+	copy while training continues. A write only waits if the buffer set
+	it needs is still being saved, i.e. when checkpoints are requested
+	faster than they can be written. Checkpoints are directories named
+	prefix-step in directory; once a new one is complete, all but the
+	newest keep are removed.
+
+	The seconds write blocks training, waiting for the buffer set and
+	copying into it, and the seconds spent saving are recorded for every
+	checkpoint in timings. An error of a background save is raised once,
+	by the next call of write or wait.
+
+	:param directory: directory holding the checkpoints
+	:param keep: number of newest checkpoints kept
+	:param prefix: name of the checkpoints before the step number
+	:type directory: string
+	:type keep: int
+	:type prefix: string
+	"""
+	def __init__(self, directory, keep = 3, prefix = 'checkpoint'):
+		if keep < 1:
+			raise ValueError('keep must be at least 1, got %r' % (keep,))
+		self.directory = directory
+		self.keep = keep
+		self.prefix = prefix
+		self.timings = []
+		self.error = None
+		if not os.path.exists(directory):
+			os.makedirs(directory)
+		self._buffers = [{}, {}]
+		self._threads = [None, None]
+		self._lock = threading.Lock()
+		self._count = 0
+
+	def path(self, step):
+		"""directory of the checkpoint of a step
+
+		:param step: step number
+		:type step: int
+		:rtype: string
+		"""
+		return os.path.join(self.directory, '%s-%010d' % (self.prefix, step))
+
+	def checkpoints(self):
+		"""complete checkpoints, oldest first
+
+		:rtype: list of string
+		"""
+		names = [name for name in os.listdir(self.directory)
+			if name.startswith(self.prefix + '-') and name[len(self.prefix) + 1:].isdigit()]
+		return [os.path.join(self.directory, name) for name in sorted(names)]
+
+	def latest(self):
+		"""newest complete checkpoint, None if there is none
+
+		:rtype: string
+		"""
+		paths = self.checkpoints()
+		return paths[-1] if paths else None
+
+	def _copy(self, buf, state):
+		"""copy the arrays of a state into reusable buffers"""
+		copied = {}
+		for key, value in state.items():
+			if isinstance(value, np.ndarray):
+				b = buf.get(key)
+				if b is None or b.shape != value.shape or b.dtype != value.dtype:
+					b = buf[key] = np.empty(value.shape, dtype = value.dtype)
+				np.copyto(b, value)
+				copied[key] = b
+			else:
+				copied[key] = value
+		return copied
+
+	def write(self, model, step, trainer = None, training = True):
+		"""checkpoint a model, and optionally its trainer, in the background
+
+		:param model: model to save
+		:param step: step number naming the checkpoint
+		:param trainer: trainer whose state is saved too
+		:param training: also save the momentum deltas
+		:type model: any ebmlib model
+		:type step: int
+		:type trainer: ebmlib trainer
+		:type training: bool
+		:rtype: None
+		"""
+		self._raise()
+		start = time.time()
+		i = self._count % 2
+		self._count += 1
+		if self._threads[i] is not None:
+			self._threads[i].join()
+		state, header, tstate, theader = _snapshot(model, training, trainer)
+		state = self._copy(self._buffers[i].setdefault('model', {}), state)
+		if tstate is not None:
+			tstate = self._copy(self._buffers[i].setdefault('trainer', {}), tstate)
+		timing = {'step': step, 'snapshot': time.time() - start, 'write': None}
+		self.timings.append(timing)
+
+		def run():
+			try:
+				t = time.time()
+				_save(self.path(step), state, header, tstate, theader)
+				timing['write'] = time.time() - t
+				self._rotate()
+			except Exception as e:
+				with self._lock:
+					self.error = e
+
+		self._threads[i] = threading.Thread(target = run)
+		self._threads[i].daemon = True
+		self._threads[i].start()
+
+	def _rotate(self):
+		"""remove all but the newest keep checkpoints
+
+		Both buffer sets may be saving at once and finish in either order,
+		so the removal is serialized, and wait rotates again once both are
+		done.
+		"""
+		with self._lock:
+			for path in self.checkpoints()[:-self.keep]:
+				shutil.rmtree(path, ignore_errors = True)
+
+	def _raise(self):
+		"""raise the error of a failed background save, only once"""
+		with self._lock:
+			e, self.error = self.error, None
+		if e is not None:
+			raise e
+
+	def wait(self):
+		"""wait until every checkpoint requested so far is written
+
+		:rtype: None
+		"""
+		for t in self._threads:
+			if t is not None:
+				t.join()
+		self._raise()
+		self._rotate()
@@ -0,0 +1,147 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake 
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	fit.py
+# description:
+#	Epoch driver shared by all trainers.
+#---------------------------------------#
+
+import time
+import numpy as np
+from . loader import MinibatchLoader, prefetch as _prefetch
+from . sequences import pack, buckets, SequenceSet
+
+def _seqbatches(seqs, batchsize, shuffle, bucket, rng, dtype):
+	"""packed minibatches of batchsize sequences"""
+	if bucket:
+		lengths = seqs.lengths if isinstance(seqs, SequenceSet) else [len(seq) for seq in seqs]
+		batches = buckets(lengths, batchsize, rng if shuffle else None)
+	else:
+		order = rng.permutation(len(seqs)) if shuffle else np.arange(len(seqs))
+		batches = [order[i:i + batchsize] for i in range(0, len(seqs), batchsize)]
+	for idx in batches:
+		if isinstance(seqs, SequenceSet):
+			data, batchsizes, perm = seqs.pack(idx, dtype)
+		else:
+			data, batchsizes, perm = pack([seqs[j] for j in idx], dtype)
+		yield len(idx), (data, batchsizes)
+
+def fit(trainer, model, data, batchsize = 100, epochs = 1, method = 'batchlearn',
+		shuffle = True, seed = None, prefetch = 2, evaluate = None, every = None,
+		seconds = None, examples = None, bucket = False, **kwargs):
+	"""train a model for a number of epochs or until a budget runs out
+
+	With method 'batchlearn' data holds one example per row and is
+	served by a loader.MinibatchLoader, so memory mapped datasets larger
+	than memory work. With method 'seqbatchlearn' data is a list of
+	sequences or a sequences.SequenceSet, and every minibatch of
+	batchsize sequences is packed with sequences.pack in a background
+	thread.
+
+	The time spent in the trainer, in evaluate, and everywhere else is
+	measured separately. The last is the cost of the driver and of
+	waiting for data, reported as a fraction of the total time.
+
+	:param trainer: trainer to use
+	:param model: model to train
+	:param data: examples, or sequences for 'seqbatchlearn'
+	:param batchsize: number of examples or sequences per minibatch
+	:param epochs: maximum number of passes over data
+	:param method: name of the trainer method called with each minibatch, 'batchlearn' or 'seqbatchlearn'
+	:param shuffle: visit the minibatches in a new random order every epoch
+	:param seed: seed of the minibatch order
+	:param prefetch: number of minibatches prepared ahead, 0 to prepare them in the calling thread
+	:param evaluate: called with the model every `every` minibatches and after the last one
+	:param every: minibatches between evaluations, only after each epoch if None
+	:param seconds: stop once this many seconds have passed
+	:param examples: stop once this many examples or sequences have been trained on
+	:param bucket: with 'seqbatchlearn', group sequences of similar length into minibatches, see sequences.buckets
+	:param kwargs: passed to the trainer method, e.g. k, m, l2 or s
+
+	:type trainer: ebmlib trainer
+	:type model: ebmlib model
+	:type data: 2d numpy.array, list of 2d numpy.array or ebmlib.sequences.SequenceSet
+	:type batchsize: int
+	:type epochs: int
+	:type method: string
+	:type shuffle: bool
+	:type seed: int
+	:type prefetch: int
+	:type evaluate: function
+	:type every: int
+	:type seconds: float
+	:type examples: int
+	:type bucket: bool
+
+	:returns: epochs, minibatches and examples trained on, total seconds, seconds spent in the trainer and in evaluate, fraction of time spent elsewhere, and (seconds, examples, evaluate(model)) at each evaluation
+	:rtype: dict
+	"""
+	learn = getattr(trainer, method)
+	rng = np.random.RandomState(seed)
+	if method == 'seqbatchlearn':
+		batches = lambda: _prefetch(_seqbatches(data, batchsize, shuffle, bucket, rng, model.dtype), prefetch)
+	else:
+		loader = MinibatchLoader(data, batchsize, shuffle = shuffle, seed = seed,
+			prefetch = prefetch, dtype = model.dtype)
+		batches = lambda: ((len(X), (X,)) for X in loader)
+
+	report = {'epochs': 0, 'steps': 0, 'examples': 0, 'seconds': 0.,
+		'compute': 0., 'evaluation': 0., 'overhead': 0., 'trace': []}
+	start = time.time()
+
+	def check():
+		t = time.time()
+		report['trace'].append((t - start, report['examples'], evaluate(model)))
+		report['evaluation'] += time.time() - t
+
+	def exhausted():
+		if seconds is not None and time.time() - start >= seconds:
+			return True
+		return examples is not None and report['examples'] >= examples
+
+	done = False
+	for epoch in range(epochs):
+		for n, args in batches():
+			t = time.time()
+			learn(model, *args, **kwargs)
+			report['compute'] += time.time() - t
+			report['steps'] += 1
+			report['examples'] += n
+			if evaluate is not None and every and report['steps'] % every == 0:
+				check()
+			if exhausted():
+				done = True
+				break
+		else:
+			report['epochs'] += 1
+			if evaluate is not None and not every:
+				check()
+		if done:
+			break
+	if evaluate is not None and (not report['trace'] or report['trace'][-1][1] != report['examples']):
+		check()
+
+	report['seconds'] = time.time() - start
+	report['overhead'] = 1 - (report['compute'] + report['evaluation']) / max(report['seconds'], 1e-12)
+	return report
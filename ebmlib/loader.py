@@ -0,0 +1,296 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake 
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	loader.py
+# description:
+#	Shuffled minibatches from in memory or memory mapped datasets,
+#	read ahead by a background thread.
+#---------------------------------------#
+
+import threading
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+import numpy as np
+
+def memmap(path, dtype = None, shape = None):
+	"""open a dataset on disk without reading it
+
+	:param path: .npy file, or raw file of dtype elements
+	:param dtype: element type of a raw file
+	:param shape: shape of a raw file, one example per row, (-1, ncol) is allowed
+	:type path: string
+	:type dtype: numpy.dtype
+	:type shape: tuple
+	:returns: read only memory mapped array
+	:rtype: numpy.memmap
+	"""
+	if path.endswith('.npy'):
+		return np.load(path, mmap_mode = 'r')
+	m = np.memmap(path, dtype = dtype, mode = 'r')
+	if shape is not None:
+		m = m.reshape(shape)
+	return m
+
+def read(data, start, stop, out):
+	"""copy rows start to stop of a dataset into out
+
+	Datasets that are not arrays, e.g. compressed ones, provide their own
+	read(start, stop, out) method.
+
+	:param data: dataset
+	:param start: first row
+	:param stop: one past the last row
+	:param out: destination, stop - start rows
+	:type data: numpy.array or object with a read method
+	:type start: int
+	:type stop: int
+	:type out: numpy.array
+	:rtype: None
+	"""
+	if hasattr(data, 'read'):
+		data.read(start, stop, out)
+	else:
+		out[...] = data[start:stop]
+
+class BitPacked(object):
+	"""binary dataset stored one bit per element
+
+	Binary visible units only ever hold 0 or 1, so a dataset of them
+	packed with numpy.packbits is 8 times smaller than as uint8 and 64
+	times smaller than as float64, on disk and in memory. Rows are
+	unpacked by read, which is what MinibatchLoader calls, straight into
+	its reusable buffers of the model's dtype.
+
+	:param bits: rows packed along axis 1 by numpy.packbits, e.g. loader.packbits(X).bits or a memmap of it from loader.memmap
+	:param ncol: number of elements per row before packing
+	:type bits: numpy.array of numpy.uint8
+	:type ncol: int
+	"""
+	def __init__(self, bits, ncol):
+		self.bits = bits
+		self.ncol = ncol
+		self.shape = (len(bits), ncol)
+
+	def __len__(self):
+		return len(self.bits)
+
+	def read(self, start, stop, out):
+		"""unpack rows start to stop into out
+
+		:param start: first row
+		:param stop: one past the last row
+		:param out: destination, stop - start rows
+		:type start: int
+		:type stop: int
+		:type out: numpy.array
+		:rtype: None
+		"""
+		out[...] = np.unpackbits(self.bits[start:stop], axis = 1)[:, :self.ncol]
+
+	def unpack(self, start = 0, stop = None, dtype = np.float32):
+		"""rows start to stop as a new array
+
+		:param start: first row
+		:param stop: one past the last row, the last row if None
+		:param dtype: element type
+		:type start: int
+		:type stop: int
+		:type dtype: numpy.dtype
+		:rtype: numpy.array
+		"""
+		stop = len(self) if stop is None else min(stop, len(self))
+		out = np.empty((stop - start, self.ncol), dtype = dtype)
+		self.read(start, stop, out)
+		return out
+
+def packbits(X):
+	"""pack a binary dataset, nonzero elements become 1
+
+	Save the result with numpy.save(path, packed.bits) and reopen it
+	without reading it with BitPacked(loader.memmap(path), ncol).
+
+	:param X: dataset, one example per row
+	:type X: 2d numpy.array
+	:rtype: ebmlib.loader.BitPacked
+	"""
+	X = np.asarray(X)
+	return BitPacked(np.packbits(X != 0, axis = 1), X.shape[1])
+
+class MinibatchLoader(object):
+	"""shuffled minibatches of a dataset
+
+	The dataset is split into contiguous blocks of batchsize rows and
+	every pass visits the blocks in a new random order, so each minibatch
+	is a sequential read of the dataset, which keeps memory mapped files
+	far larger than memory fast. A background thread reads the next
+	prefetch minibatches into a ring of reusable buffers while the
+	current one is trained on. Each minibatch is a view of one of these
+	buffers, valid until the next one is requested.
+
+	The minibatches can be passed directly to any trainer's batchlearn,
+	the buffers already have the model's dtype so no copy is made.
+
+	:param data: dataset, one example per row, e.g. a numpy.array, a memmap from loader.memmap, a loader.BitPacked, or any object with len, shape and read(start, stop, out)
+	:param batchsize: number of examples per minibatch
+	:param shuffle: visit the blocks in random order
+	:param seed: seed of the block order
+	:param prefetch: number of minibatches read ahead, 0 to read in the calling thread
+	:param dtype: floating point type of the minibatches
+	:param droplast: skip the final minibatch if it has less than batchsize examples
+
+	:type data: numpy.array
+	:type batchsize: int
+	:type shuffle: bool
+	:type seed: int
+	:type prefetch: int
+	:type dtype: numpy.dtype
+	:type droplast: bool
+	"""
+	def __init__(self, data, batchsize, shuffle = True, seed = None, prefetch = 2,
+				dtype = np.float64, droplast = False):
+		self.data = data
+		self.batchsize = batchsize
+		self.shuffle = shuffle
+		self.rng = np.random.RandomState(seed)
+		self.prefetch = prefetch
+		self.dtype = np.dtype(dtype)
+		self.droplast = droplast
+		self.shape = (batchsize,) + tuple(data.shape[1:])
+		self._buffers = [np.empty(self.shape, dtype = self.dtype) for i in range(prefetch + 1)]
+
+	def __len__(self):
+		n = len(self.data)
+		if self.droplast:
+			return n // self.batchsize
+		return (n + self.batchsize - 1) // self.batchsize
+
+	def blocks(self):
+		"""start and stop rows of each minibatch of one pass, in visiting order
+
+		:rtype: list of (int, int)
+		"""
+		n = len(self.data)
+		starts = np.arange(len(self)) * self.batchsize
+		if self.shuffle:
+			starts = starts[self.rng.permutation(len(starts))]
+		return [(int(start), int(min(start + self.batchsize, n))) for start in starts]
+
+	def __iter__(self):
+		blocks = self.blocks()
+		if self.prefetch == 0:
+			buf = self._buffers[0]
+			for start, stop in blocks:
+				read(self.data, start, stop, buf[:stop - start])
+				yield buf[:stop - start]
+			return
+
+		free = queue.Queue()
+		full = queue.Queue()
+		for i in range(len(self._buffers)):
+			free.put(i)
+		stop_reading = threading.Event()
+
+		def reader():
+			try:
+				for start, stop in blocks:
+					i = free.get()
+					if stop_reading.is_set():
+						return
+					read(self.data, start, stop, self._buffers[i][:stop - start])
+					full.put((i, stop - start))
+				full.put(None)
+			except Exception as e:
+				full.put(e)
+
+		t = threading.Thread(target = reader)
+		t.daemon = True
+		t.start()
+		i = None
+		try:
+			while True:
+				item = full.get()
+				if i is not None:
+					free.put(i)
+				if item is None:
+					break
+				if isinstance(item, Exception):
+					raise item
+				i, n = item
+				yield self._buffers[i][:n]
+		finally:
+			stop_reading.set()
+			free.put(None)
+			t.join()
+
+def prefetch(iterable, n = 2):
+	"""iterate in a background thread, n items ahead of the caller
+
+	:param iterable: items to produce
+	:param n: number of items produced ahead, 0 to produce them in the calling thread
+	:type iterable: iterable
+	:type n: int
+	:returns: the items of iterable
+	:rtype: generator
+	"""
+	if n == 0:
+		for item in iterable:
+			yield item
+		return
+
+	items = queue.Queue(n)
+	stop_reading = threading.Event()
+	done = object()
+
+	def reader():
+		try:
+			for item in iterable:
+				items.put((True, item))
+				if stop_reading.is_set():
+					return
+			items.put((True, done))
+		except Exception as e:
+			items.put((False, e))
+
+	t = threading.Thread(target = reader)
+	t.daemon = True
+	t.start()
+	try:
+		while True:
+			ok, item = items.get()
+			if not ok:
+				raise item
+			if item is done:
+				break
+			yield item
+	finally:
+		stop_reading.set()
+		# unblock the reader if it is waiting on a full queue
+		while t.is_alive():
+			try:
+				items.get(timeout = 0.01)
+			except queue.Empty:
+				pass
+		t.join()
@@ -0,0 +1,350 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake 
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	parallel.py
+# description:
+#	Training with several worker processes over weights kept in
+#	shared memory.
+#---------------------------------------#
+
+import ctypes
+import time
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+
+# worker processes must inherit the shared arrays, so they are forked
+if hasattr(multiprocessing, 'get_context'):
+	_mp = multiprocessing.get_context('fork')
+else:
+	_mp = multiprocessing
+
+def shared_array(shape, dtype):
+	"""allocate a zeroed array in memory shared with forked processes
+
+	:param shape: shape of the array
+	:param dtype: element type
+	:type shape: tuple
+	:type dtype: numpy.dtype
+	:returns: the array
+	:rtype: numpy.array
+	"""
+	dtype = np.dtype(dtype)
+	n = int(np.prod(shape))
+	buf = RawArray(ctypes.c_char, max(1, n * dtype.itemsize))
+	return np.frombuffer(buf, dtype = dtype, count = n).reshape(shape)
+
+def share(model):
+	"""move every array of a model into shared memory
+
+	The arrays are replaced in place, so processes forked afterwards
+	read and update the same weights, biases and deltas as the parent.
+
+	:param model: model to share
+	:type model: any ebmlib model
+	:returns: model
+	:rtype: any ebmlib model
+	"""
+	for name, value in list(vars(model).items()):
+		if isinstance(value, np.ndarray):
+			a = shared_array(value.shape, value.dtype)
+			a[...] = value
+			setattr(model, name, a)
+	return model
+
+class _Draws(object):
+	"""stands in for numpy.random.random and numpy.random.normal, which
+	the sampling and noisy unit functions of ebmlib.units draw from
+
+	Without noise every draw is recorded in draws, and must have one row
+	per example of the lo to hi being computed. With noise the draws are
+	checked against draws and answered in the same order with rows lo to
+	hi of noise, the random numbers drawn by the parent for the whole
+	minibatch.
+	"""
+	def __init__(self, lo, hi, draws, noise = None):
+		self.lo, self.hi = lo, hi
+		self.draws, self.noise = draws, noise
+		self.i = 0
+
+	def __enter__(self):
+		self.saved = np.random.random, np.random.normal
+		np.random.random, np.random.normal = self.random, self.normal
+		return self
+
+	def __exit__(self, *exc):
+		np.random.random, np.random.normal = self.saved
+
+	def random(self, size = None):
+		return self.draw('random_sample', (), size)
+
+	def normal(self, loc = 0.0, scale = 1.0, size = None):
+		return self.draw('normal', (loc, scale), size)
+
+	def draw(self, name, args, size):
+		size = () if size is None else tuple(int(d) for d in np.atleast_1d(size))
+		if size[:1] != (self.hi - self.lo,):
+			raise ValueError('random numbers are not drawn one row per example')
+		if self.noise is None:
+			self.draws.append((name, args, size[1:]))
+			return np.zeros(size)
+		if self.i >= len(self.draws) or self.draws[self.i] != (name, args, size[1:]):
+			raise RuntimeError('random numbers are drawn differently than for the first batch')
+		self.i += 1
+		return self.noise[self.i - 1][self.lo:self.hi]
+
+def _statworker(trainer, model, X, draws, noise, slots, block, kwargs, conn):
+	"""worker loop, compute the statistics of a range of blocks per request"""
+	while True:
+		msg = conn.recv()
+		if msg is None:
+			break
+		first, last, n = msg
+		for b in range(first, last):
+			lo, hi = b * block, min(n, (b + 1) * block)
+			with _Draws(lo, hi, draws, noise):
+				stats = trainer.batchstats(model, X[lo:hi], **kwargs)
+			for slot, stat in zip(slots, stats):
+				slot[b] = stat
+		conn.send(True)
+	conn.close()
+
+class DataParallelTrainer(object):
+	"""synchronous data parallel training
+
+	Each minibatch is split into blocks of block examples, and every
+	worker process computes the summed statistics of a contiguous range
+	of blocks with trainer.batchstats into shared memory. The parent
+	adds the blocks up in order and updates the shared model with
+	trainer.applystats, so momentum, l2 and sparsity behave as in
+	trainer.batchlearn.
+
+	The updates are bit for bit those of serial training, whatever the
+	number of workers: after numpy.random.seed(seed), calling
+	trainer.batchlearn(model, X, block = block, **kwargs) on the same
+	minibatches gives the same weights and deltas. For that the parent
+	draws the random numbers of every block from seed in the order
+	serial training draws them and hands each worker its rows, and
+	batchlearn adds up the same blocks in the same order, see
+	units.blockstats. Each block needs the random numbers it draws to
+	have one row per example, which holds for the sampling and noisy
+	unit functions of ebmlib.units.
+
+	Works with any trainer providing batchstats and applystats, i.e.
+	ebmlib.rbm.CdkTrainer, ebmlib.autoencoder.BackPropTrainer and
+	ebmlib.autoencoder.SparseBackPropTrainer. Every worker needs a block
+	of its own to keep busy, and the statistics of every block of a
+	minibatch are kept in shared memory.
+
+	:param trainer: trainer defining the update
+	:param model: model to train, moved into shared memory
+	:param nin: number of inputs per example
+	:param batchsize: largest minibatch that will be trained on
+	:param nworkers: number of worker processes
+	:param seed: seed of the random numbers drawn for the workers
+	:param block: number of examples whose statistics are computed at once
+	:param kwargs: passed to trainer.batchstats, e.g. k
+
+	:type trainer: ebmlib trainer
+	:type model: ebmlib model
+	:type nin: int
+	:type batchsize: int
+	:type nworkers: int
+	:type seed: int
+	:type block: int
+	"""
+	def __init__(self, trainer, model, nin, batchsize, nworkers = None, seed = None, block = 16, **kwargs):
+		if not (hasattr(trainer, 'batchstats') and hasattr(trainer, 'applystats')):
+			raise TypeError('%s has no batchstats and applystats' % type(trainer).__name__)
+		self.trainer = trainer
+		self.model = share(model)
+		self.nworkers = nworkers or _mp.cpu_count()
+		self.batchsize = batchsize
+		self.block = block
+		self.rng = np.random.RandomState(seed)
+		self.X = shared_array((batchsize, nin), model.dtype)
+		# statistics of a dummy batch give their shapes, and its draws those of every block
+		self.draws = []
+		with _Draws(0, 2, self.draws):
+			stats = trainer.batchstats(model, np.zeros((2, nin), dtype = model.dtype), **kwargs)
+		nblocks = -(-batchsize // block)
+		self.slots = [shared_array((nblocks,) + stat.shape, stat.dtype) for stat in stats]
+		self.stats = [np.zeros(stat.shape, stat.dtype) for stat in stats]
+		self.noise = [shared_array((batchsize,) + shape, np.float64) for name, args, shape in self.draws]
+
+		self.conns = []
+		self.workers = []
+		for i in range(self.nworkers):
+			parent, child = _mp.Pipe()
+			w = _mp.Process(target = _statworker,
+				args = (trainer, model, self.X, self.draws, self.noise, self.slots, block, kwargs, child))
+			w.daemon = True
+			w.start()
+			child.close()
+			self.conns.append(parent)
+			self.workers.append(w)
+
+	def batchlearn(self, X, m = True, l2 = True, **kwargs):
+		"""weight update for a batch of examples computed by the workers
+
+		:param X: examples, at most batchsize of them
+		:param m: include momentum term in cost function
+		:param l2: include l2 regularization term in cost function
+		:param kwargs: passed to trainer.applystats, e.g. s
+		:type X: 2d numpy.array or list of numpy.array
+		:type m: bool
+		:type l2: bool
+		:rtype: None
+		"""
+		X = np.asarray(X, dtype = self.model.dtype)
+		n = len(X)
+		if n > self.batchsize:
+			raise ValueError('batch of %d examples exceeds batchsize %d' % (n, self.batchsize))
+		if n == 0:
+			return
+		self.X[:n] = X
+
+		# random numbers block by block, in the order serial training draws them
+		nblocks = -(-n // self.block)
+		for b in range(nblocks):
+			lo, hi = b * self.block, min(n, (b + 1) * self.block)
+			for (name, args, shape), noise in zip(self.draws, self.noise):
+				noise[lo:hi] = getattr(self.rng, name)(*args, size = (hi - lo,) + shape)
+
+		bounds = np.linspace(0, nblocks, self.nworkers + 1).astype(int)
+		busy = []
+		for i, conn in enumerate(self.conns):
+			if bounds[i + 1] > bounds[i]:
+				conn.send((bounds[i], bounds[i + 1], n))
+				busy.append(i)
+		for i in busy:
+			self.conns[i].recv()
+
+		# reduce in block order, as units.blockstats does
+		for stat, slot in zip(self.stats, self.slots):
+			stat[...] = slot[0]
+			for b in range(1, nblocks):
+				stat += slot[b]
+		self.trainer.applystats(self.model, self.stats, n, m, l2, **kwargs)
+
+	def close(self):
+		"""stop the worker processes
+
+		:rtype: None
+		"""
+		for conn in self.conns:
+			conn.send(None)
+			conn.close()
+		for w in self.workers:
+			w.join()
+		self.conns, self.workers = [], []
+
+def _hogwildworker(trainer, model, X, idx, epochs, seed, counts, i, kwargs, tick = None):
+	"""worker loop, run trainer.learn over one shard without locking"""
+	rng = np.random.RandomState(seed)
+	np.random.seed(seed)
+	for epoch in range(epochs):
+		for j in idx[rng.permutation(len(idx))]:
+			trainer.learn(model, X[j], **kwargs)
+			counts[i] += 1
+			if tick is not None:
+				tick()
+
+def hogwild(trainer, model, X, nworkers = None, epochs = 1, seed = None, 
+			evaluate = None, interval = 1.0, **kwargs):
+	"""asynchronous lock free training over shared weights
+
+	The model is moved into shared memory and every worker process runs
+	trainer.learn over its own shard of X in random order, updating the
+	shared weights, biases and deltas without locks. With sparse data
+	the updates of different workers rarely touch the same weights.
+	With nworkers = 0 the same schedule runs serially in this process,
+	which gives a baseline for comparing throughput and convergence.
+
+	:param trainer: trainer providing learn, e.g. ebmlib.rbm.CdkTrainer or ebmlib.autoencoder.BackPropTrainer
+	:param model: model to train
+	:param X: examples
+	:param nworkers: number of worker processes, 0 to train serially
+	:param epochs: number of passes each worker makes over its shard
+	:param seed: seed of the shard order and of the workers' random numbers
+	:param evaluate: called with the model about every interval seconds, e.g. to compute a reconstruction error
+	:param interval: seconds between calls of evaluate
+	:param kwargs: passed to trainer.learn
+
+	:type trainer: ebmlib trainer
+	:type model: ebmlib model
+	:type X: 2d numpy.array
+	:type nworkers: int
+	:type epochs: int
+	:type seed: int
+	:type evaluate: function
+	:type interval: float
+
+	:returns: examples trained on, seconds, examples per second, and (seconds, examples, evaluate(model)) at each evaluation
+	:rtype: dict
+	"""
+	X = np.asarray(X, dtype = model.dtype)
+	if nworkers is None:
+		nworkers = _mp.cpu_count()
+	rng = np.random.RandomState(seed)
+	shards = np.array_split(rng.permutation(len(X)), max(1, nworkers))
+	seeds = rng.randint(2 ** 31 - 1, size = len(shards))
+	trace = []
+	clock = [time.time()] * 2
+
+	def check():
+		if evaluate is not None:
+			trace.append((time.time() - clock[0], int(counts.sum()), evaluate(model)))
+			clock[1] = time.time()
+
+	def tick():
+		if evaluate is not None and time.time() - clock[1] >= interval:
+			check()
+
+	if nworkers == 0:
+		counts = np.zeros(1, dtype = np.int64)
+		check()
+		_hogwildworker(trainer, model, X, shards[0], epochs, seeds[0], counts, 0, kwargs, tick)
+	else:
+		share(model)
+		counts = shared_array((nworkers,), np.int64)
+		check()
+		workers = []
+		for i in range(nworkers):
+			w = _mp.Process(target = _hogwildworker,
+				args = (trainer, model, X, shards[i], epochs, seeds[i], counts, i, kwargs))
+			w.daemon = True
+			w.start()
+			workers.append(w)
+		for w in workers:
+			while w.is_alive():
+				w.join(interval)
+				tick()
+	seconds = time.time() - clock[0]
+	check()
+	return {
+		'examples':		int(counts.sum()),
+		'seconds':		seconds,
+		'examples_per_sec':	counts.sum() / float(seconds),
+		'trace':		trace}
@@ -0,0 +1,195 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake 
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	prefix.py
+# description:
+#	Prefix sharing state cache for encoding and scoring many sequences
+#	with a recurrent model.
+#---------------------------------------#
+
+import collections
+import numpy as np
+
+class PrefixCache(object):
+	"""cache of recurrent states indexed by sequence prefix
+
+	Sequences are walked one time step at a time, all of them together.
+	The state after a prefix is looked up in a trie whose nodes are
+	keyed by their parent node and the bytes of the last input, so a
+	prefix shared by several sequences, in this batch or an earlier one,
+	is advanced only once. The states missing at a time step are
+	computed by a single call of the model's next_state with one input
+	and state per row.
+
+	Node states are rows of one preallocated (maxnodes, nhid) array.
+	When it is full the least recently used node is evicted together
+	with its descendants, which could no longer be reached. Each node
+	also holds the bytes of its input in its key.
+
+	A model with stochastic states, e.g. srrbm.Srrbm, draws one sample
+	per cached prefix, which all sequences sharing it then use. score
+	needs a free_energy that takes one input and state per row, like
+	srrbm.Srrbm.free_energy, which srrbm.Drrbm does not have.
+
+	:param model: recurrent model whose next_state takes one input and state per row, see sessions.SessionStore
+	:param maxnodes: maximum number of cached prefixes
+	:type model: ebmlib recurrent model
+	:type maxnodes: int
+	"""
+	def __init__(self, model, maxnodes = 100000):
+		self.model = model
+		self.maxnodes = maxnodes
+		self.h0 = model.initial_state()
+		self.states = np.empty((maxnodes,) + self.h0.shape, dtype = self.h0.dtype)
+		self.steps = self.hits = self.shared = self.computed = self.evictions = 0
+		# (parent id, input bytes) -> (id, row), least recently used first
+		self._nodes = collections.OrderedDict()
+		# id of every cached node and the root 0 -> keys of its children
+		self._children = {0: set()}
+		self._free = list(range(maxnodes - 1, -1, -1))
+		self._nextid = 1
+
+	def __len__(self):
+		return len(self._nodes)
+
+	def clear(self):
+		"""drop every cached prefix and reset the counters
+
+		:rtype: None
+		"""
+		self._nodes.clear()
+		self._children = {0: set()}
+		self._free = list(range(self.maxnodes - 1, -1, -1))
+		self.steps = self.hits = self.shared = self.computed = self.evictions = 0
+
+	def _evict(self, key):
+		"""remove a node and its descendants"""
+		stack = [key]
+		self._children[key[0]].discard(key)
+		while stack:
+			nid, row = self._nodes.pop(stack.pop())
+			self._free.append(row)
+			stack.extend(self._children.pop(nid))
+			self.evictions += 1
+
+	def _insert(self, key, h):
+		nid = self._nextid
+		self._nextid += 1
+		if not self._free:
+			self._evict(next(iter(self._nodes)))
+		# a prefix whose parent was just evicted could not be reached
+		if key[0] in self._children:
+			row = self._free.pop()
+			self.states[row] = h
+			self._nodes[key] = (nid, row)
+			self._children[key[0]].add(key)
+			self._children[nid] = set()
+		return nid
+
+	def _walk(self, seqs, term = None):
+		seqs = [np.asarray(s, dtype = self.h0.dtype) for s in seqs]
+		n = len(seqs)
+		lengths = np.array([len(s) for s in seqs], dtype = np.intp)
+		H = np.empty((n,) + self.h0.shape, dtype = self.h0.dtype)
+		H[...] = self.h0
+		ids = np.zeros(n, dtype = np.int64)
+		terms = np.zeros(n, dtype = self.h0.dtype)
+		for t in range(lengths.max() if n else 0):
+			active = np.flatnonzero(lengths > t)
+			X = np.array([seqs[i][t] for i in active])
+			if term is not None:
+				terms[active] += term(X, H[active])
+			misses = collections.OrderedDict()
+			for j, i in enumerate(active):
+				key = (ids[i], X[j].tobytes())
+				node = self._nodes.pop(key, None)
+				if node is None:
+					misses.setdefault(key, []).append(j)
+				else:
+					self._nodes[key] = node
+					ids[i] = node[0]
+					H[i] = self.states[node[1]]
+					self.hits += 1
+			if misses:
+				first = np.array([js[0] for js in misses.values()], dtype = np.intp)
+				Hnew = self.model.next_state(X[first], H[active[first]])
+				for (key, js), h in zip(misses.items(), Hnew):
+					nid = self._insert(key, h)
+					ids[active[js]] = nid
+					H[active[js]] = h
+					self.shared += len(js) - 1
+				self.computed += len(misses)
+			self.steps += len(active)
+		return H, terms
+
+	def encode(self, seqs):
+		"""final state of every sequence, e.g. of srautoencoder.SimpleRecursiveAutoencoder.push
+
+		:param seqs: sequences, each an array with one input per row
+		:type seqs: list of numpy.array
+		:returns: one state per row
+		:rtype: numpy.array
+		"""
+		return self._walk(seqs)[0]
+
+	def score(self, seqs):
+		"""total free energy of every sequence, the sum over time steps of the
+		model's free_energy of each input given the state before it, see
+		srrbm.Srrbm.free_energy. Raises ValueError for models whose
+		free_energy does not take one input and state per row.
+
+		:param seqs: sequences, each an array with one input per row
+		:type seqs: list of numpy.array
+		:returns: final states and total free energies
+		:rtype: (numpy.array, numpy.array)
+		"""
+		v = np.zeros((2, self.model.nvis), dtype = self.h0.dtype)
+		try:
+			e = self.model.free_energy(v, np.array([self.h0, self.h0]))
+		except ValueError:
+			e = None
+		if np.shape(e) != (2,):
+			raise ValueError('%s.free_energy does not take one input and state per row' % type(self.model).__name__)
+		return self._walk(seqs, self.model.free_energy)
+
+	def stats(self):
+		"""hit rate and compute saved since creation or the last clear
+
+		hits counts steps whose state was cached, shared the steps whose
+		state was computed once for several sequences of the same batch,
+		and saved the fraction of steps that did not call next_state.
+
+		:returns: steps, computed, hits, shared, hitrate, saved, nodes and evictions
+		:rtype: dict
+		"""
+		steps = max(1, self.steps)
+		return {
+			'steps':		self.steps,
+			'computed':		self.computed,
+			'hits':			self.hits,
+			'shared':		self.shared,
+			'hitrate':		self.hits / float(steps),
+			'saved':		(self.steps - self.computed) / float(steps),
+			'nodes':		len(self._nodes),
+			'evictions':	self.evictions}
@@ -1,9 +1,9 @@
 """... automodule::"""
-from rbm import Rbm
-from cdktrainer import CdkTrainer
-from pcdtrainer import PcdTrainer
+from . rbm import Rbm
+from . cdktrainer import CdkTrainer
+from . pcdtrainer import PcdTrainer
 
-from drbm import Drbm
-from disccdktrainer import DiscCdkTrainer
+from . drbm import Drbm
+from . disccdktrainer import DiscCdkTrainer
 
-from smrbm import SoftmaxRbm
+from . smrbm import SoftmaxRbm
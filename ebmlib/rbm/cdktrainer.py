@@ -28,7 +28,7 @@
 #---------------------------------------#
 
 import numpy as np
-from .. units import sigmoid, rthresh
+from .. units import sigmoid, rthresh, issparse, asinput, compact, apply_update, blockstats
 class CdkTrainer(object):
 	"""contrastive divergence trainer class
 
@@ -52,7 +52,12 @@ class CdkTrainer(object):
 					spen = 0.001, p = 0.1, pdecay = 0.96):
 		self.lr, self.m, self.l2 = lr, m, l2
 		self.spen, self.p, self.pdecay = spen, p, pdecay
-		self.q = np.zeros(rbm.nhid)
+		self.q = np.zeros(rbm.nhid, dtype = rbm.dtype)
+		# workspace, reused by every update
+		self._gW = np.zeros(rbm.W.shape, dtype = rbm.dtype)
+		self._tW = np.zeros(rbm.W.shape, dtype = rbm.dtype)
+		self._gvb = np.zeros(rbm.vb.shape, dtype = rbm.dtype)
+		self._ghb = np.zeros(rbm.hb.shape, dtype = rbm.dtype)
 
 	def cross_entropy(self, x, v):
 		"""compute the cross entropy of a reconstruction of an input x"""
@@ -99,6 +104,7 @@ class CdkTrainer(object):
 
 		:rtype: None
 		"""
+		x = np.asarray(x, dtype = rbm.dtype)
 		pv = x
 		ph = rbm.ff(x)
 		if k == 1:
@@ -110,111 +116,128 @@ class CdkTrainer(object):
 				nv = rbm.fb(rbm.hid_sample(nh))
 				nh = rbm.ff(rbm.vis_sample(nv))
 	
-		pg = np.outer(ph, pv)
-		ng = np.outer(nh, nv)
-
-		gW = pg - ng
-		gvb = pv - nv
-		ghb = ph - nh
+		gW, gvb, ghb = self._gW, self._gvb, self._ghb
+		# positive minus negative outer product as a single rank 2 product
+		np.dot(np.vstack((ph, -nh)).T, np.vstack((pv, nv)), out = gW)
+		np.subtract(pv, nv, out = gvb)
+		np.subtract(ph, nh, out = ghb)
 
 		# regulization
 		if l2:
-			gW -= (self.l2 * rbm.W)
+			np.multiply(rbm.W, self.l2, out = self._tW)
+			gW -= self._tW
 		# sparisty
 		if s:
 			sparse_penalty_term = self.sparseterm(ph)
-			gW = (gW.T - sparse_penalty_term).T
+			gW -= sparse_penalty_term[:, np.newaxis]
 			ghb -= sparse_penalty_term
 
-		dW = self.lr * gW
-		dvb = self.lr * gvb
-		dhb = self.lr * ghb
-
-		# momentum
-		if m:
-			dW += self.m * rbm.dW
-			dvb += self.m * rbm.dvb
-			dhb += self.m * rbm.dhb
-
-		rbm.W += dW
-		rbm.vb += dvb
-		rbm.hb += dhb
+		gW *= self.lr
+		gvb *= self.lr
+		ghb *= self.lr
 
-		rbm.dW = dW
-		rbm.dvb = dvb
-		rbm.dhb = dhb
+		apply_update(rbm.W, rbm.dW, gW, self.m if m else 0.)
+		apply_update(rbm.vb, rbm.dvb, gvb, self.m if m else 0.)
+		apply_update(rbm.hb, rbm.dhb, ghb, self.m if m else 0.)
 
-	def batchlearn(self, rbm, X, k = 1, m = True, l2 = True, s = True):
+	def batchlearn(self, rbm, X, k = 1, m = True, l2 = True, s = True, block = None):
 		"""cdk weight update for a batch visible vector
 
 		:param rbm: model to update
-		:param X: datapoints
+		:param X: datapoints, which may be a scipy.sparse matrix
 		:param k: number of gibbs steps to take for negative phase
 		:param m: include momentum term in cost function
 		:param l2: include l2 regularization term in cost function
 		:param s: include sparsity penalty term in cost function
+		:param block: compute the statistics over blocks of this many datapoints, see units.blockstats
 
 		:type rbm: ebmlib.rbm.Rbm
-		:type X: 2d numpy.array or list of numpy.array
+		:type X: 2d numpy.array, list of numpy.array or scipy.sparse matrix
 		:type k: int
 		:type m: bool
 		:type l2: bool
 		:type s: bool
+		:type block: int
 
 		:rtype: None
 		"""
-		dW = np.zeros(rbm.W.shape)
-		dvb = np.zeros(rbm.vb.shape)
-		dhb = np.zeros(rbm.hb.shape)
-		
-		q = np.zeros(rbm.nhid)
-
-		for x in X:
-			pv = x
-			ph = rbm.ff(x)
-			if k == 1:
-				nv = rbm.fb(rbm.hid_sample(ph))
-				nh = rbm.ff(rbm.vis_sample(nv))
-			else:
-				nh = ph.copy()
-				for i in range(k):
-					nv = rbm.fb(rbm.hid_sample(nh))
-					nh = rbm.ff(rbm.vis_sample(nv))
-	
-			pg = np.outer(ph, pv)
-			ng = np.outer(nh, nv)
-		
-			dvb += (pv - nv)
-			dhb += (ph - nh)
-			dW += pg - ng
-			
-			if s:
-				q += ph
-	
+		X = asinput(X, rbm.dtype)
+		stats = blockstats(lambda B: self.batchstats(rbm, B, k), X, block)
+		self.applystats(rbm, stats, X.shape[0], m, l2, s)
+
+	def batchstats(self, rbm, X, k = 1):
+		"""summed cdk statistics of a batch of visible vectors
+
+		The statistics of several batches add up to those of their union,
+		so they can be computed separately and summed before applystats.
+
+		:param rbm: model
+		:param X: datapoints, which may be a scipy.sparse matrix
+		:param k: number of gibbs steps to take for negative phase
+		:type rbm: ebmlib.rbm.Rbm
+		:type X: 2d numpy.array, list of numpy.array or scipy.sparse matrix
+		:type k: int
+		:returns: positive minus negative statistics of W, vb and hb, and the summed hidden probabilities
+		:rtype: tuple of numpy.array
+		"""
+		X = asinput(X, rbm.dtype)
+
+		# positive and negative phase for the whole batch, one state per row
+		ph = rbm.ff(X)
+		nh = ph
+		for i in range(k):
+			nv = rbm.fb(rbm.hid_sample(nh))
+			nh = rbm.ff(rbm.vis_sample(nv))
+
+		# summed outer products over the batch
+		gW, gvb, ghb = self._gW, self._gvb, self._ghb
+		if issparse(X):
+			# positive statistics only for the columns holding nonzeros
+			cols, Xc = compact(X)
+			np.dot(-nh.T, nv, out = gW)
+			gW[:, cols] += Xc.T.dot(ph).T
+			np.subtract(np.asarray(X.sum(axis = 0)).ravel(), nv.sum(axis = 0), out = gvb)
+		else:
+			np.dot(np.vstack((ph, -nh)).T, np.vstack((X, nv)), out = gW)
+			np.subtract(X.sum(axis = 0), nv.sum(axis = 0), out = gvb)
+		np.subtract(ph.sum(axis = 0), nh.sum(axis = 0), out = ghb)
+		return gW, gvb, ghb, ph.sum(axis = 0)
+
+	def applystats(self, rbm, stats, n, m = True, l2 = True, s = True):
+		"""cdk weight update from summed batch statistics
+
+		:param rbm: model to update
+		:param stats: statistics returned by batchstats, overwritten
+		:param n: number of datapoints the statistics are summed over
+		:param m: include momentum term in cost function
+		:param l2: include l2 regularization term in cost function
+		:param s: include sparsity penalty term in cost function
+
+		:type rbm: ebmlib.rbm.Rbm
+		:type stats: tuple of numpy.array
+		:type n: int
+		:type m: bool
+		:type l2: bool
+		:type s: bool
+
+		:rtype: None
+		"""
+		gW, gvb, ghb, phsum = stats
+
 		# regularization
 		if l2:
-			dW -= self.l2 * rbm.W
+			np.multiply(rbm.W, self.l2, out = self._tW)
+			gW -= self._tW
 		# sparsity
 		if s:
-			sparse_penalty_term = self.batchsparseterm(q/len(X))
-			dW = (dW.T - sparse_penalty_term).T
-			dhb -= sparse_penalty_term
-
-			
-		dW = self.lr * dW / len(X)
-		dvb = self.lr * dvb / len(X)
-		dhb = self.lr * dhb  / len(X)
-
-		if m:
-			dW += self.m * rbm.dW
-			dvb += self.m * rbm.dvb
-			dhb += self.m * rbm.dhb
-
-		rbm.W += dW
-		rbm.vb += dvb
-		rbm.hb += dhb
+			sparse_penalty_term = self.batchsparseterm(phsum / n)
+			gW -= sparse_penalty_term[:, np.newaxis]
+			ghb -= sparse_penalty_term
 
-		rbm.dW = dW
-		rbm.dvb = dvb
-		rbm.dhb = dhb
+		gW *= self.lr / n
+		gvb *= self.lr / n
+		ghb *= self.lr / n
 
+		apply_update(rbm.W, rbm.dW, gW, self.m if m else 0.)
+		apply_update(rbm.vb, rbm.dvb, gvb, self.m if m else 0.)
+		apply_update(rbm.hb, rbm.dhb, ghb, self.m if m else 0.)
@@ -28,7 +28,7 @@
 #---------------------------------------#
 
 import numpy as np
-from .. units import sigmoid
+from .. units import sigmoid, apply_update
 
 class DiscCdkTrainer(object):
 	"""contrastive divergence trainer class
@@ -53,7 +53,7 @@ class DiscCdkTrainer(object):
 					spen = 0.001, p = 0.1, pdecay = 0.96):
 		self.lr, self.m, self.l2 = lr, m, l2
 		self.spen, self.p, self.pdecay = spen, p, pdecay
-		self.q = np.zeros(rbm.nhid)
+		self.q = np.zeros(rbm.nhid, dtype = rbm.dtype)
 
 	def cross_entropy(self, rbm, x):
 		"""compute the cross entropy of a reconstruction of an input x"""
@@ -90,6 +90,8 @@ class DiscCdkTrainer(object):
 		return cj + sumW + Ujy
 
 	def iterdisclearn(self, rbm, x, y, m = True, l2 = True):
+		x = np.asarray(x, dtype = rbm.dtype)
+		y = np.asarray(y, dtype = rbm.dtype)
 		pclass = rbm.pclass(x)
 		pos = sigmoid(np.dot(rbm.Whv, x) + np.dot(rbm.Who, y) + rbm.hb)
 		neg = sigmoid(np.dot(rbm.Whv, x) + np.dot(rbm.Who, pclass) + rbm.hb)
@@ -102,7 +104,12 @@ class DiscCdkTrainer(object):
 
 
 	def disclearn(self, rbm, x, y, m = True, l2 = True):
-		"""sgd weight update for single visible output configuration
+		"""exact gradient of log p(y|x) for a visible output configuration
+
+		x and y may also hold one configuration per row, in which case the
+		update uses the mean gradient of the minibatch. The hidden
+		activations of every class form a (batch, nout, nhid) block,
+		evaluated a block of at most rbm.blocksize elements at a time.
 
 		:param rbm: model to update
 		:param x: data vector
@@ -118,69 +125,40 @@ class DiscCdkTrainer(object):
 
 		:rtype: None
 		"""
-		ystar = [np.zeros(rbm.nout) for i in range(rbm.nout)]
-		for i, v in enumerate(ystar):
-			v[i] = 1
-
-		pos = sigmoid(np.dot(rbm.Whv, x) + np.dot(rbm.Who, y) + rbm.hb)
-		pclass = rbm.pclass(x)
-		negs = [pclass[i] * sigmoid(np.dot(rbm.Whv, x) + np.dot(rbm.Who, ys) + rbm.hb) for i, ys in enumerate(ystar)]
-		
-		posv = np.outer(pos, x)
-		poso = np.outer(pos, y)
-		#posWhv = np.array([pos[i] * x for i in range(rbm.nhid)])
-		#posWho = np.array([pos[i] * y for i in range(rbm.nhid)])
-
-		negv = np.zeros((rbm.nhid, rbm.nvis))
-		nego = np.zeros((rbm.nhid, rbm.nout))
-
-		for i in range(rbm.nout):
-			negv += np.outer(negs[i], x)
-			nego += np.outer(negs[i], ystar[i])
-
-		#negWhv = np.array([pclass[i] * negs[i] * x for i in range(rbm.nhid)])
-		#negWho = np.array([pclass[i] * negs[i] for i in range(rbm.nhid)])
-
-		gWhv = posv - negv
-		gWho = poso - nego
-
-		#gWhv = np.outer(pos, x) - np.outer(neg, x)
-		#gWho = np.outer(pos, y) - np.outer(neg, pclass)
-		#ghb = (pos - neg)
-		#gvb = x.copy()
-		#gob = y.copy()
+		X = np.atleast_2d(np.asarray(x, dtype = rbm.dtype))
+		Y = np.atleast_2d(np.asarray(y, dtype = rbm.dtype))
+		n = len(X)
+
+		# hidden input of every class is the shared Whv x + hb plus a column of Who
+		h_partial = np.dot(X, rbm.Whv.T) + rbm.hb
+		pclass = np.exp(rbm.log_pclass(X, h_partial))
+		pos = sigmoid(h_partial + np.dot(Y, rbm.Who.T))
+
+		# hidden activations expected under the class posterior
+		neg = np.empty_like(pos)
+		gWho = np.dot(pos.T, Y)
+		step = max(1, rbm.blocksize // (rbm.nout * rbm.nhid))
+		for i in range(0, n, step):
+			a = h_partial[i:i + step, np.newaxis, :] + rbm.Who.T
+			negs = pclass[i:i + step, :, np.newaxis] * sigmoid(a)
+			negs.sum(axis = 1, out = neg[i:i + step])
+			gWho -= negs.sum(axis = 0).T
+
+		gWhv = np.dot((pos - neg).T, X)
+		ghb = (pos - neg).sum(axis = 0)
+		gob = (Y - pclass).sum(axis = 0)
 
 		if l2:
-			gWhv -= self.l2 * rbm.Whv
-			gWho -= self.l2 * rbm.Who
-			ghb -= self.l2 * rbm.hb
-			gvb -= self.l2 * rbm.vb
-			gob -= self.l2 * rbm.ob
-
-		dWhv = self.lr * gWhv
-		dWho = self.lr * gWho
-		#dhb = self.lr * ghb
-		#dvb = self.lr * gvb
-		#dob = self.lr * gob
-
-		if m:
-			dWho += self.m * rbm.dWho
-			dWhv += self.m * rbm.dWhv
-			dhb += self.m * rbm.dhb
-			dvb += self.m * rbm.dvb
-			dob += self.m * rbm.dob
+			gWhv -= n * self.l2 * rbm.Whv
+			gWho -= n * self.l2 * rbm.Who
 
-		rbm.Whv += dWhv
-		rbm.Who += dWho
-		#rbm.hb += dhb
-		#rbm.vb += dvb
-		#rbm.ob += dob
+		for g in (gWhv, gWho, ghb, gob):
+			g *= self.lr / n
 
-		rbm.dWhv = dWhv
-		rbm.dWho = dWho
-		#rbm.dhb = dhb
-		#rbm.dvb = dvb
-		#rbm.dob = dob
+		apply_update(rbm.Whv, rbm.dWhv, gWhv, self.m if m else 0.)
+		apply_update(rbm.Who, rbm.dWho, gWho, self.m if m else 0.)
+		apply_update(rbm.hb, rbm.dhb, ghb, self.m if m else 0.)
+		apply_update(rbm.ob, rbm.dob, gob, self.m if m else 0.)
 
 	def genlearn(self, rbm, x, y, k = 1, m = True, l2 = True, s = True):
 		"""cdk weight update for single visible vector
@@ -201,6 +179,8 @@ class DiscCdkTrainer(object):
 
 		:rtype: None
 		"""
+		x = np.asarray(x, dtype = rbm.dtype)
+		y = np.asarray(y, dtype = rbm.dtype)
 		pv = x
 		po = y
 		ph = rbm.ff(pv, po)
@@ -281,13 +261,15 @@ class DiscCdkTrainer(object):
 
 		:rtype: None
 		"""
-		dWhv = np.zeros(rbm.Whv.shape)
-		dWho = np.zeros(rbm.Who.shape)
-		dvb = np.zeros(rbm.vb.shape)
-		dhb = np.zeros(rbm.hb.shape)
-		dob = np.zeros(rbm.ob.shape)
+		X = np.asarray(X, dtype = rbm.dtype)
+		Y = np.asarray(Y, dtype = rbm.dtype)
+		dWhv = np.zeros(rbm.Whv.shape, dtype = rbm.dtype)
+		dWho = np.zeros(rbm.Who.shape, dtype = rbm.dtype)
+		dvb = np.zeros(rbm.vb.shape, dtype = rbm.dtype)
+		dhb = np.zeros(rbm.hb.shape, dtype = rbm.dtype)
+		dob = np.zeros(rbm.ob.shape, dtype = rbm.dtype)
 		
-		q = np.zeros(rbm.nhid)
+		q = np.zeros(rbm.nhid, dtype = rbm.dtype)
 
 		for x, y in zip(X, Y):
 			pv = x
@@ -28,7 +28,7 @@
 #---------------------------------------#
 
 import numpy as np
-from .. units import unittypes, sigmoid, pthresh, softmax
+from .. units import unittypes, sigmoid, pthresh, softmax, copystate
 
 class Drbm(object):
 	"""discriminitive restricted boltzmann machine class
@@ -37,29 +37,35 @@ class Drbm(object):
 	:param nhid: number of hidden units
 	:param vtype: visible unit type, see units.py for available types
 	:param htype: hidden unit type, see units.py for available types
+	:param dtype: floating point type of the weights and biases
 	:type nvis: int
 	:type nhid: int
 	:type vtype: string
 	:type htype: string
+	:type dtype: numpy.dtype
 	"""
+	# largest (batch, nout, nhid) block evaluated at once by log_pclass
+	blocksize = 2 ** 22
+
 	def __init__(self, nvis, nout, nhid, 
-				vtype = 'pthresh', htype = 'pthresh', otype = 'softmax'):
+				vtype = 'pthresh', htype = 'pthresh', otype = 'softmax', dtype = np.float64):
 		self.nvis = nvis
 		self.nhid = nhid
+		self.dtype = np.dtype(dtype)
 		self.nout = nout
 		# weights
-		self.Whv = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nvis))
-		self.Who = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nout))
+		self.Whv = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nvis)).astype(dtype)
+		self.Who = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nout)).astype(dtype)
 		# biases
-		self.vb = np.zeros(nvis)
-		self.hb = np.zeros(nhid)
-		self.ob = np.zeros(nout)
+		self.vb = np.zeros(nvis, dtype = dtype)
+		self.hb = np.zeros(nhid, dtype = dtype)
+		self.ob = np.zeros(nout, dtype = dtype)
 		# deltas
-		self.dWhv = np.zeros((nhid, nvis))
-		self.dWho = np.zeros((nhid, nout))
-		self.dvb = np.zeros(nvis)
-		self.dhb = np.zeros(nhid)
-		self.dob = np.zeros(nout)
+		self.dWhv = np.zeros((nhid, nvis), dtype = dtype)
+		self.dWho = np.zeros((nhid, nout), dtype = dtype)
+		self.dvb = np.zeros(nvis, dtype = dtype)
+		self.dhb = np.zeros(nhid, dtype = dtype)
+		self.dob = np.zeros(nout, dtype = dtype)
 		# activation functions
 		self.htype = htype
 		self.vtype = vtype
@@ -71,69 +77,114 @@ class Drbm(object):
 	def ff(self, v, o):
 		"""sample hidden given visible and output
 
-		:param v: visible unit state
+		:param v: visible unit state, or one state per row
+		:param o: output unit state, or one state per row
 		:type v: numpy.array
+		:type o: numpy.array
 		:returns: hidden state
 		:rtype: numpy.array
 		"""
-		return self.hact(np.dot(self.Whv, v) + np.dot(self.Who, o) + self.hb)
+		return self.hact(np.dot(v, self.Whv.T) + np.dot(o, self.Who.T) + self.hb)
 
 	def fb(self, h):
 		"""sample visible and output given hidden
 
-		:param h: hidden unit state
+		:param h: hidden unit state, or one state per row
 		:type h: numpy.array
 		:returns: visible and output states
 		:rtype: (numpy.ndarray, numpy.ndarray)
 		"""
-		return self.vact(np.dot(self.Whv.T, h) + self.vb), self.oact(np.dot(self.Who.T, h) + self.ob)
+		return self.vact(np.dot(h, self.Whv) + self.vb), self.oact(np.dot(h, self.Who) + self.ob)
 
 	def output(self, v, rtype = 'pvec'):
+		"""classify a visible vector, or one visible vector per row
+
+		:param v: visible unit state
+		:param rtype: 'pvec' for class probabilities, 'bvec' for a 1 of k vector, 'index' for the class index
+		:type v: numpy.array
+		:type rtype: string
+		:returns: one result per visible vector
+		:rtype: numpy.array or int
+		"""
 		p = self.pclass(v)
 		if rtype == 'pvec':
 			return p
 		elif rtype == 'bvec':
-			r = np.zeros(self.nout)
-			r[p.argmax()] = 1
-			return r
+			idx = np.asarray(p.argmax(axis = -1))
+			return (np.arange(self.nout) == idx[..., np.newaxis]).astype(self.dtype)
 		elif rtype == 'index':
-			return p.argmax()
+			return p.argmax(axis = -1)
 		return p
 
 	def pclass(self, v):
-		p = np.zeros(self.nout)
-		o_class_vecs = [np.zeros(self.nout) for i in range(self.nout)]
-		vbias_term, h_partial = self.visible_free_energy_terms(v)
-		for i, o in enumerate(o_class_vecs):
-			o[i] = 1
-			p[i] = self.free_energy(v, o, vbias_term = vbias_term, h_partial = h_partial)
-		return p / p.sum()
+		"""compute p(o|v) for every class
+
+		:param v: visible unit state, or one state per row
+		:type v: numpy.array
+		:returns: class probabilities, shape (nout,) or (batch, nout)
+		:rtype: numpy.array
+		"""
+		return np.exp(self.log_pclass(v))
+
+	def log_pclass(self, v, h_partial = None):
+		"""compute log p(o|v) for every class
+
+		The negative free energy of every class comes from h_partial plus
+		a column of Who and is normalized with logaddexp, so no one of k
+		vectors are built. The (batch, nout, nhid) hidden input is
+		evaluated a block of at most blocksize elements at a time.
+
+		:param v: visible unit state, or one state per row
+		:param h_partial: Whv v + hb if already known
+		:type v: numpy.array
+		:type h_partial: numpy.array
+		:returns: class log probabilities, shape (nout,) or (batch, nout)
+		:rtype: numpy.array
+		"""
+		if h_partial is None:
+			h_partial = np.dot(v, self.Whv.T) + self.hb
+		hp = np.atleast_2d(h_partial)
+		logits = np.empty((len(hp), self.nout), dtype = hp.dtype)
+		step = max(1, self.blocksize // (self.nout * self.nhid))
+		for i in range(0, len(hp), step):
+			a = hp[i:i + step, np.newaxis, :] + self.Who.T
+			np.logaddexp(0, a).sum(axis = 2, out = logits[i:i + step])
+		logits += self.ob
+		logits -= np.logaddexp.reduce(logits, axis = 1)[:, np.newaxis]
+		return logits.reshape(np.shape(h_partial)[:-1] + (self.nout,))
 
 	def visible_free_energy_terms(self, v):
-		vbias_term = -1 * np.sum(v * self.vb)
-		h_partial = np.dot(self.Whv, v) + self.hb
+		"""compute the terms of the free energy that do not depend on the output
+
+		:param v: visible unit state, or one state per row
+		:type v: numpy.array
+		:returns: -vb v and Whv v + hb
+		:rtype: (float or numpy.array, numpy.array)
+		"""
+		vbias_term = -1 * np.dot(v, self.vb)
+		h_partial = np.dot(v, self.Whv.T) + self.hb
 		return vbias_term, h_partial
 
 	def free_energy(self, v, o, vbias_term = None, h_partial = None):
 		"""compute the free energy of a visible and output vector
 
-		:param v: visible unit state
-		:param o: output unit state
+		:param v: visible unit state, or one state per row
+		:param o: output unit state, or one state per row
 		:type v: numpy.ndarray
-		:type d: numpy.ndarray
+		:type o: numpy.ndarray
 		:returns: free energy of [v:o]
-		:rtype: float 
+		:rtype: float or numpy.array
 		"""
-		obias_term = -1 * np.sum(o * self.ob)
+		obias_term = -1 * np.dot(o, self.ob)
 		if vbias_term is None:
-			vbias_term = -1 * np.sum(v * self.vb)
+			vbias_term = -1 * np.dot(v, self.vb)
 		if h_partial is None:
-			h_term = -1 * np.sum(np.log(1 + np.exp(np.dot(self.Whv, v) + np.dot(self.Who, o) + self.hb)))
-		else:
-			h_term = -1 * np.sum(np.log(1 + np.exp(h_partial + np.dot(self.Who, o))))
+			h_partial = np.dot(v, self.Whv.T) + self.hb
+		h_term = -1 * np.sum(np.logaddexp(0, h_partial + np.dot(o, self.Who.T)), axis = -1)
 		return obias_term + vbias_term + h_term
 
-	def __getstate__(self):
+	def _state(self):
+		"""state of the model without copying its arrays, read by ebmlib.checkpoint"""
 		d = {
 			'nvis':		self.nvis,
 			'nhid':		self.nhid,
@@ -141,18 +192,21 @@ class Drbm(object):
 			'vtype':	self.vtype,
 			'htype':	self.htype,
 			'otype':	self.otype,
-			'Whv':		self.Whv.copy(),
-			'Who':		self.Who.copy(),
-			'vb':		self.vb.copy(),
-			'hb':		self.hb.copy(),
-			'ob':		self.ob.copy(),
-			'dWhv':		self.dWhv.copy(),
-			'dWho':		self.dWho.copy(),
-			'dhb':		self.dhb.copy(),
-			'dob':		self.dob.copy(),
-			'dvb':		self.dvb.copy()}
+			'Whv':		self.Whv,
+			'Who':		self.Who,
+			'vb':		self.vb,
+			'hb':		self.hb,
+			'ob':		self.ob,
+			'dWhv':		self.dWhv,
+			'dWho':		self.dWho,
+			'dhb':		self.dhb,
+			'dob':		self.dob,
+			'dvb':		self.dvb}
 		return d
 
+	def __getstate__(self):
+		return copystate(self._state())
+
 	def __setstate__(self, d):
 		self.nvis = 	d['nvis']
 		self.nhid =		d['nhid']
@@ -170,6 +224,7 @@ class Drbm(object):
 		self.dvb =		d['dvb']
 		self.dhb =		d['dhb']
 		self.dob =		d['dob']
+		self.dtype = self.Whv.dtype
 		self.vact = unittypes[self.vtype]
 		self.hact = unittypes[self.htype]
 		self.oact = unittypes[self.otype]
@@ -26,14 +26,14 @@
 # description:
 #	Contrastive Divergence for training RBMs and Sparse RBMs
 #---------------------------------------#
-import random
 import numpy as np
+from .. units import apply_update
 
 class PcdTrainer(object):
 	"""persistent contrastive divergence trainer class
 
 	:param rbm: the model to train
-	:param nchains: the number of markov chains
+	:param nchains: the number of markov chains, stored as the rows of a matrix
 	:param lr: learning rate
 	:param m: momentum
 	:param l2: l2 regularization penalty
@@ -54,9 +54,14 @@ class PcdTrainer(object):
 					spen = 0.001, p = 0.1, pdecay = 0.96):
 		self.lr, self.m, self.l2 = lr, m, l2
 		self.spen, self.p, self.pdecay = spen, p, pdecay
-		self.q = np.zeros(rbm.nhid)
+		self.q = np.zeros(rbm.nhid, dtype = rbm.dtype)
 		self.nchains = nchains
-		self.chains = [np.zeros(rbm.nvis) for i in range(nchains)]
+		self.chains = np.zeros((nchains, rbm.nvis), dtype = rbm.dtype)
+		# workspace, reused by every update
+		self._gW = np.zeros(rbm.W.shape, dtype = rbm.dtype)
+		self._tW = np.zeros(rbm.W.shape, dtype = rbm.dtype)
+		self._gvb = np.zeros(rbm.vb.shape, dtype = rbm.dtype)
+		self._ghb = np.zeros(rbm.hb.shape, dtype = rbm.dtype)
 
 	def cross_entropy(self, rbm, x):
 		"""compute the cross entropy of a reconstruction of an input x"""
@@ -85,12 +90,28 @@ class PcdTrainer(object):
 		"""
 		return self.spen * (q - self.p)
 
+	def sample(self, rbm, n = None):
+		"""advance n randomly chosen chains, or all of them, one gibbs step
+
+		:param rbm: model defining the chains
+		:param n: number of distinct chains to advance, all chains if None
+		:type rbm: ebmlib.rbm.Rbm
+		:type n: int
+		:returns: visible states before the step and the hidden probabilities given them, one chain per row
+		:rtype: (numpy.array, numpy.array)
+		"""
+		idx = np.random.permutation(self.nchains)[:n]
+		nv = self.chains[idx]
+		nh = rbm.ff(rbm.vis_sample(nv))
+		self.chains[idx] = rbm.fb(rbm.hid_sample(nh))
+		return nv, nh
+
 	def learn(self, rbm, x, k = 10, m = True, l2 = True, s = True):
 		"""PCD weight update for single visible vector using k chains
 
 		:param rbm: model to update
 		:param x: data sample
-		:param k: number of chains to use for estimating the negative gradient
+		:param k: number of chains to use for estimating the negative gradient, all chains if None
 		:param m: include momentum term in cost function
 		:param l2: include l2 regularization term in cost function
 		:param s: include sparsity penalty term in cost function
@@ -104,63 +125,44 @@ class PcdTrainer(object):
 
 		:rtype: None
 		"""
+		x = np.asarray(x, dtype = rbm.dtype)
 		pv = x
 		ph = rbm.ff(x)
-		pg = np.outer(ph, pv)
-		ng = np.zeros((rbm.nhid, rbm.nvis))
-		ngvb = np.zeros(rbm.nvis)
-		nghb = np.zeros(rbm.nhid)
-		indexes = [random.randint(0, self.nchains - 1) for i in range(k)]
-		for index in indexes:
-			nv = self.chains[index]
-			nh = rbm.ff(rbm.vis_sample(nv))
-			self.chains[index] = rbm.fb(rbm.hid_sample(nh))
-
-			ng += np.outer(nh, nv)
-			ngvb += nv
-			nghb += nh
-
-		ng = ng / k
-		ngvb = ngvb / k
-		nghb = nghb / k
-
-		gW = pg - ng
-		gvb = pv - nv
-		ghb = ph - nh
+		nv, nh = self.sample(rbm, k)
+
+		gW, gvb, ghb = self._gW, self._gvb, self._ghb
+		# positive minus mean negative outer products as one product
+		np.dot(np.vstack((ph, -nh / len(nh))).T, np.vstack((pv, nv)), out = gW)
+		np.subtract(pv, nv.mean(axis = 0), out = gvb)
+		np.subtract(ph, nh.mean(axis = 0), out = ghb)
 
 		# regulization
 		if l2:
-			gW -= (self.l2 * rbm.W)
+			np.multiply(rbm.W, self.l2, out = self._tW)
+			gW -= self._tW
 		# sparisty
 		if s:
 			sparse_penalty_term = self.sparseterm(ph)
-			gW = (gW.T - sparse_penalty_term).T
+			gW -= sparse_penalty_term[:, np.newaxis]
 			ghb -= sparse_penalty_term
 
-		dW = self.lr * gW
-		dvb = self.lr * gvb
-		dhb = self.lr * ghb
-
-		# momentum
-		if m:
-			dW += self.m * rbm.dW
-			dvb += self.m * rbm.dvb
-			dhb += self.m * rbm.dhb
-
-		rbm.W += dW
-		rbm.vb += dvb
-		rbm.hb += dhb
+		gW *= self.lr
+		gvb *= self.lr
+		ghb *= self.lr
 
-		rbm.dW = dW
-		rbm.dvb = dvb
-		rbm.dhb = dhb
+		apply_update(rbm.W, rbm.dW, gW, self.m if m else 0.)
+		apply_update(rbm.vb, rbm.dvb, gvb, self.m if m else 0.)
+		apply_update(rbm.hb, rbm.dhb, ghb, self.m if m else 0.)
 
 	def batchlearn(self, rbm, X, k = 1, m = True, l2 = True, s = True):
-		"""cdk weight update for a batch visible vector
+		"""PCD weight update for a batch of visible vectors
+
+		The negative phase advances k * len(X) distinct chains, or all of
+		them when there are fewer chains, as one matrix per half step.
 
 		:param rbm: model to update
 		:param X: datapoints
-		:param k: number of gibbs steps to take for negative phase
+		:param k: number of chains to advance per datapoint, all chains if None
 		:param m: include momentum term in cost function
 		:param l2: include l2 regularization term in cost function
 		:param s: include sparsity penalty term in cost function
@@ -174,67 +176,33 @@ class PcdTrainer(object):
 
 		:rtype: None
 		"""
-		pgW = np.zeros(rbm.W.shape)
-		ngW = np.zeros(rbm.W.shape)
-		
-		pgvb = np.zeros(rbm.vb.shape)
-		ngvb = np.zeros(rbm.vb.shape)
-		
-		pghb = np.zeros(rbm.hb.shape)
-		nghb = np.zeros(rbm.hb.shape)
-				
-		q = np.zeros(rbm.nhid)
-
-		for x in X:
-			ph = rbm.ff(x)
-			pgW += np.outer(ph, x)
-			pgvb += x
-			pghb += ph
-			
-			if s:
-				q += ph
-			
-			indexes = [random.randint(0, self.nchains - 1) for i in range(k)]
-			for index in indexes:
-				nv = self.chains[index]
-				nh = rbm.ff(rbm.vis_sample(nv))
-				self.chains[index] = rbm.fb(rbm.hid_sample(nh))
-				ngW += np.outer(nh, nv)
-				ngvb += nv
-				nghb += nh
-
-		ngW = ngW / k
-		ngvb = ngvb / k
-		nghb = nghb / k
-
-		dW = pgW - ngW
-		dvb = pgvb - ngvb
-		dhb = pghb - nghb
-		
+		X = np.asarray(X, dtype = rbm.dtype)
+		n = len(X)
+		ph = rbm.ff(X)
+		nv, nh = self.sample(rbm, None if k is None else k * n)
+		# weight of each chain so the negative statistics sum to n samples
+		w = float(n) / len(nv)
+
+		gW, gvb, ghb = self._gW, self._gvb, self._ghb
+		# positive minus negative outer products as one product
+		np.dot(np.vstack((ph, -w * nh)).T, np.vstack((X, nv)), out = gW)
+		np.subtract(X.sum(axis = 0), w * nv.sum(axis = 0), out = gvb)
+		np.subtract(ph.sum(axis = 0), w * nh.sum(axis = 0), out = ghb)
+
 		# regularization
 		if l2:
-			dW -= self.l2 * rbm.W
+			np.multiply(rbm.W, self.l2, out = self._tW)
+			gW -= self._tW
 		# sparsity
 		if s:
-			sparse_penalty_term = self.batchsparseterm(q/len(X))
-			dW = (dW.T - sparse_penalty_term).T
-			dhb -= sparse_penalty_term
-
-			
-		dW = self.lr * dW / len(X)
-		dvb = self.lr * dvb / len(X)
-		dhb = self.lr * dhb  / len(X)
-
-		if m:
-			dW += self.m * rbm.dW
-			dvb += self.m * rbm.dvb
-			dhb += self.m * rbm.dhb
-
-		rbm.W += dW
-		rbm.vb += dvb
-		rbm.hb += dhb
+			sparse_penalty_term = self.batchsparseterm(ph.sum(axis = 0) / n)
+			gW -= sparse_penalty_term[:, np.newaxis]
+			ghb -= sparse_penalty_term
 
-		rbm.dW = dW
-		rbm.dvb = dvb
-		rbm.dhb = dhb
+		gW *= self.lr / n
+		gvb *= self.lr / n
+		ghb *= self.lr / n
 
+		apply_update(rbm.W, rbm.dW, gW, self.m if m else 0.)
+		apply_update(rbm.vb, rbm.dvb, gvb, self.m if m else 0.)
+		apply_update(rbm.hb, rbm.dhb, ghb, self.m if m else 0.)
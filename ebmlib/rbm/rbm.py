@@ -28,7 +28,7 @@
 #---------------------------------------#
 
 import numpy as np
-from .. units import unittypes, sigmoid, rthresh, pthresh
+from .. units import unittypes, sigmoid, rthresh, pthresh, inputdot, copystate
 
 class Rbm(object):
 	"""restricted boltzmann machine class
@@ -37,23 +37,26 @@ class Rbm(object):
 	:param nhid: number of hidden units
 	:param vtype: visible unit type, see units.py for available types
 	:param htype: hidden unit type, see units.py for available types
+	:param dtype: floating point type of the weights and biases
 	:type nvis: int
 	:type nhid: int
 	:type vtype: string
 	:type htype: string
+	:type dtype: numpy.dtype
 	"""
-	def __init__(self, nvis, nhid, vtype = 'pthresh', htype = 'sigmoid'):
+	def __init__(self, nvis, nhid, vtype = 'pthresh', htype = 'sigmoid', dtype = np.float64):
 		self.nvis = nvis
 		self.nhid = nhid
+		self.dtype = np.dtype(dtype)
 		# weights
-		self.W = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nvis))
+		self.W = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nvis)).astype(dtype)
 		# biases
-		self.vb = np.zeros(nvis)
-		self.hb = np.zeros(nhid)
+		self.vb = np.zeros(nvis, dtype = dtype)
+		self.hb = np.zeros(nhid, dtype = dtype)
 		# deltas
-		self.dW = np.zeros((nhid, nvis))
-		self.dvb = np.zeros(nvis)
-		self.dhb = np.zeros(nhid)
+		self.dW = np.zeros((nhid, nvis), dtype = dtype)
+		self.dvb = np.zeros(nvis, dtype = dtype)
+		self.dhb = np.zeros(nhid, dtype = dtype)
 		# activation functions
 		self.htype = htype
 		self.vtype = vtype
@@ -63,22 +66,22 @@ class Rbm(object):
 	def ff(self, v):
 		"""sample hidden given visible
 
-		:param v: visible unit state
-		:type v: numpy.array
+		:param v: visible unit state, or one state per row, which may be a scipy.sparse matrix
+		:type v: numpy.array or scipy.sparse matrix
 		:returns: hidden state
 		:rtype: numpy.array
 		"""
-		return sigmoid(np.dot(self.W, v) + self.hb)
+		return sigmoid(inputdot(v, self.W) + self.hb)
 
 	def fb(self, h):
 		"""sample visible given hidden
 
-		:param h: hidden unit state
+		:param h: hidden unit state, or one state per row
 		:type h: numpy.array
 		:returns: visible state
 		:rtype: numpy.ndarray
 		"""
-		return sigmoid(np.dot(self.W.T, h) + self.vb)
+		return sigmoid(np.dot(h, self.W) + self.vb)
 
 	def hid_sample(self, h):
 		return rthresh(h)
@@ -87,40 +90,60 @@ class Rbm(object):
 		return rthresh(v)
 
 	def reconstruct(self, v):
+		"""sample a reconstruction of a visible vector
+
+		:param v: visible unit state, or one state per row
+		:type v: numpy.ndarray
+		:returns: sampled reconstruction of v
+		:rtype: numpy.ndarray
+		"""
 		return rthresh(self.fb(rthresh(self.ff(v))))
 	
 	def free_energy(self, v):
 		"""compute the free energy of a visible vector
 
-		:param v: visible unit state
-		:type v: numpy.ndarray
-		:returns: free energy of v
-		:rtype: float 
+		:param v: visible unit state, or one state per row, which may be a scipy.sparse matrix
+		:type v: numpy.ndarray or scipy.sparse matrix
+		:returns: free energy of v, one per row if v is 2d
+		:rtype: float or numpy.ndarray
 		"""
-		vbias_term = -1 *np.sum(v * self.vb)
-		hidden_term = -1 * np.sum(np.log(1 + np.exp(np.dot(self.W, v) + self.hb)))
+		vbias_term = -1 * inputdot(v, self.vb)
+		hidden_term = -1 * np.sum(np.log(1 + np.exp(inputdot(v, self.W) + self.hb)), axis = -1)
 		return vbias_term + hidden_term
 
 	def energy(self, v, h):
-		vbias_term = -1 * np.sum(v * self.vb)
-		hbias_term = -1 * np.sum(h * self.hb)
-		vhterm = -1 * np.sum(self.W * np.outer(h, v))
+		"""compute the energy of a joint configuration
+
+		:param v: visible unit state, or one state per row
+		:param h: hidden unit state, or one state per row
+		:type v: numpy.ndarray
+		:type h: numpy.ndarray
+		:returns: energy of (v, h), one per row if v and h are 2d
+		:rtype: float or numpy.ndarray
+		"""
+		vbias_term = -1 * np.dot(v, self.vb)
+		hbias_term = -1 * np.dot(h, self.hb)
+		vhterm = -1 * np.sum(np.dot(h, self.W) * v, axis = -1)
 		return vbias_term + hbias_term + vhterm
 
-	def __getstate__(self):
+	def _state(self):
+		"""state of the model without copying its arrays, read by ebmlib.checkpoint"""
 		d = {
 			'nvis':		self.nvis,
 			'nhid':		self.nhid,
 			'vtype':	self.vtype,
 			'htype':	self.htype,
-			'W':		self.W.copy(),
-			'vb':		self.vb.copy(),
-			'hb':		self.hb.copy(),
-			'dW':		self.dW.copy(),
-			'dhb':		self.dhb.copy(),
-			'dvb':		self.dvb.copy()}
+			'W':		self.W,
+			'vb':		self.vb,
+			'hb':		self.hb,
+			'dW':		self.dW,
+			'dhb':		self.dhb,
+			'dvb':		self.dvb}
 		return d
 
+	def __getstate__(self):
+		return copystate(self._state())
+
 	def __setstate__(self, d):
 		self.nvis = 	d['nvis']
 		self.nhid =		d['nhid']
@@ -132,6 +155,7 @@ class Rbm(object):
 		self.dW = 		d['dW']
 		self.dvb =		d['dvb']
 		self.dhb =		d['dhb']
+		self.dtype = self.W.dtype
 		self.vact = unittypes[self.vtype]
 		self.hact = unittypes[self.htype]
 
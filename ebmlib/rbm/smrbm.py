@@ -28,7 +28,7 @@
 #---------------------------------------#
 
 import numpy as np
-from .. units import unittypes, sigmoid, rthresh, pthresh, softmax
+from .. units import unittypes, sigmoid, rthresh, pthresh, softmax, copystate
 
 class SoftmaxRbm(object):
 	"""restricted boltzmann machine class
@@ -37,23 +37,26 @@ class SoftmaxRbm(object):
 	:param nhid: number of hidden units
 	:param vtype: visible unit type, see units.py for available types
 	:param htype: hidden unit type, see units.py for available types
+	:param dtype: floating point type of the weights and biases
 	:type nvis: int
 	:type nhid: int
 	:type vtype: string
 	:type htype: string
+	:type dtype: numpy.dtype
 	"""
-	def __init__(self, nvis, nhid):
+	def __init__(self, nvis, nhid, dtype = np.float64):
 		self.nvis = nvis
 		self.nhid = nhid
+		self.dtype = np.dtype(dtype)
 		# weights
-		self.W = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nvis))
+		self.W = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nvis)).astype(dtype)
 		# biases
-		self.vb = np.zeros(nvis)
-		self.hb = np.zeros(nhid)
+		self.vb = np.zeros(nvis, dtype = dtype)
+		self.hb = np.zeros(nhid, dtype = dtype)
 		# deltas
-		self.dW = np.zeros((nhid, nvis))
-		self.dvb = np.zeros(nvis)
-		self.dhb = np.zeros(nhid)
+		self.dW = np.zeros((nhid, nvis), dtype = dtype)
+		self.dvb = np.zeros(nvis, dtype = dtype)
+		self.dhb = np.zeros(nhid, dtype = dtype)
 
 	def ff(self, v):
 		"""sample hidden given visible
@@ -79,13 +82,13 @@ class SoftmaxRbm(object):
 		if det:
 			if index:
 				return h.argmax()
-			s = np.zeros(self.nhid)
+			s = np.zeros(self.nhid, dtype = self.dtype)
 			s[h.argmax()] = 1
 			return s
 		else:
 			if index:
 				return h.cumsum().searchsorted(np.random.random())
-			s = np.zeros(self.nhid)
+			s = np.zeros(self.nhid, dtype = self.dtype)
 			s[h.cumsum().searchsorted(np.random.random())] = 1
 			return s
 
@@ -113,18 +116,22 @@ class SoftmaxRbm(object):
 		vhterm = -1 * np.sum(self.W * np.outer(h, v))
 		return vbias_term + hbias_term + vhterm
 
-	def __getstate__(self):
+	def _state(self):
+		"""state of the model without copying its arrays, read by ebmlib.checkpoint"""
 		d = {
 			'nvis':		self.nvis,
 			'nhid':		self.nhid,
-			'W':		self.W.copy(),
-			'vb':		self.vb.copy(),
-			'hb':		self.hb.copy(),
-			'dW':		self.dW.copy(),
-			'dhb':		self.dhb.copy(),
-			'dvb':		self.dvb.copy()}
+			'W':		self.W,
+			'vb':		self.vb,
+			'hb':		self.hb,
+			'dW':		self.dW,
+			'dhb':		self.dhb,
+			'dvb':		self.dvb}
 		return d
 
+	def __getstate__(self):
+		return copystate(self._state())
+
 	def __setstate__(self, d):
 		self.nvis = 	d['nvis']
 		self.nhid =		d['nhid']
@@ -134,4 +141,5 @@ class SoftmaxRbm(object):
 		self.dW = 		d['dW']
 		self.dvb =		d['dvb']
 		self.dhb =		d['dhb']
+		self.dtype = self.W.dtype
 
@@ -0,0 +1,227 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake 
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	sequences.py
+# description:
+#	Packing several variable length sequences into one array so
+#	recursive models can step them forward together, and a compact
+#	container for many sequences.
+#---------------------------------------#
+
+import os
+import numpy as np
+
+def _packed_index(lengths, batchsizes):
+	"""row of the packed data holding each row of the sorted sequences laid end to end"""
+	starts = np.cumsum(batchsizes, dtype = np.int64) - batchsizes
+	seq = np.repeat(np.arange(len(lengths)), lengths)
+	offsets = np.cumsum(lengths, dtype = np.int64) - lengths
+	t = np.arange(lengths.sum()) - np.repeat(offsets, lengths)
+	return starts[t] + seq
+
+def _asseqs(seqs, dtype):
+	"""sequences as 2d arrays, an empty one as zero rows as wide as the others"""
+	seqs = [np.asarray(seq, dtype = dtype) for seq in seqs]
+	seqs = [seq if seq.ndim >= 2 else np.array(seq, ndmin = 2) for seq in seqs]
+	width = next((seq.shape[1:] for seq in seqs if seq.size), (0,))
+	return [seq if seq.size else seq.reshape((0,) + width) for seq in seqs]
+
+def _batchsizes(lengths):
+	"""number of sequences running at each time step, lengths sorted in decreasing order"""
+	maxlen = lengths[0] if len(lengths) else 0
+	return len(lengths) - np.cumsum(np.bincount(lengths, minlength = maxlen + 1))[:maxlen]
+
+def pack(seqs, dtype = None):
+	"""pack variable length sequences time step major
+
+	Sequences are sorted by decreasing length, so the sequences still
+	running at time step t are always the first batchsizes[t] of them and
+	their inputs are the contiguous rows
+	data[batchsizes[:t].sum():batchsizes[:t + 1].sum()]. No padding or
+	masking is needed. An empty list of sequences packs into empty arrays.
+
+	:param seqs: sequences, each a 2d array with one input per row
+	:param dtype: floating point type of the packed data, that of the sequences if None
+	:type seqs: list of numpy.array
+	:type dtype: numpy.dtype
+	:returns: packed data, number of running sequences at each time step, original index of each packed sequence
+	:rtype: (numpy.array, numpy.array, numpy.array)
+	"""
+	seqs = _asseqs(seqs, dtype)
+	lengths = np.array([len(seq) for seq in seqs], dtype = np.int64)
+	order = np.argsort(-lengths, kind = 'mergesort')
+	lengths = lengths[order]
+	batchsizes = _batchsizes(lengths)
+	if not seqs:
+		return np.empty((0, 0), dtype = dtype), batchsizes, order
+	flat = np.concatenate([seqs[i] for i in order])
+	data = np.empty_like(flat)
+	data[_packed_index(lengths, batchsizes)] = flat
+	return data, batchsizes, order
+
+def unpack(data, batchsizes, order):
+	"""undo pack
+
+	:param data: packed data, or any per step result with the same leading axis
+	:param batchsizes: number of running sequences at each time step
+	:param order: original index of each packed sequence
+	:type data: numpy.array
+	:type batchsizes: numpy.array
+	:type order: numpy.array
+	:returns: sequences in their original order
+	:rtype: list of numpy.array
+	"""
+	lengths = np.searchsorted(-np.asarray(batchsizes), -np.arange(len(order)), side = 'left')
+	flat = data[_packed_index(lengths, batchsizes)]
+	seqs = [None] * len(order)
+	for i, seq in zip(order, np.split(flat, np.cumsum(lengths)[:-1])):
+		seqs[i] = seq
+	return seqs
+
+def buckets(lengths, batchsize, rng = None):
+	"""minibatches of sequences of similar length
+
+	Sequences are sorted by length and cut into minibatches of batchsize,
+	so the sequences of a minibatch stop at about the same time step and
+	packing them wastes little of each step's matrix product. With a
+	random state, sequences of equal length are shuffled and the
+	minibatches are returned in random order.
+
+	:param lengths: length of each sequence
+	:param batchsize: number of sequences per minibatch
+	:param rng: random state, fixed order if None
+	:type lengths: numpy.array
+	:type batchsize: int
+	:type rng: numpy.random.RandomState
+	:returns: indices of the sequences of each minibatch
+	:rtype: list of numpy.array
+	"""
+	lengths = np.asarray(lengths)
+	if rng is None:
+		order = np.argsort(lengths, kind = 'mergesort')
+	else:
+		order = np.lexsort((rng.random_sample(len(lengths)), lengths))
+	batches = [order[i:i + batchsize] for i in range(0, len(order), batchsize)]
+	if rng is not None:
+		rng.shuffle(batches)
+	return batches
+
+class SequenceSet(object):
+	"""many variable length sequences in one array
+
+	The inputs of all sequences are the rows of one (steps, nvis) array,
+	sequence i being rows offsets[i] to offsets[i + 1], so there is no
+	per sequence object and the data may be memory mapped. Indexing
+	returns sequence i as a view of data, which the trainers' batchlearn
+	accepts like a list of vectors, and pack gathers a
+	minibatch straight into the layout of sequences.pack for the
+	trainers' seqbatchlearn. fit.fit takes a SequenceSet with method
+	'seqbatchlearn'.
+
+	:param data: inputs of all sequences end to end, one per row
+	:param offsets: first row of each sequence followed by the number of rows
+	:type data: numpy.array
+	:type offsets: numpy.array
+	"""
+	def __init__(self, data, offsets):
+		self.data = data
+		self.offsets = np.asarray(offsets, dtype = np.int64)
+		self.lengths = np.diff(self.offsets)
+
+	def __len__(self):
+		return len(self.lengths)
+
+	def __getitem__(self, i):
+		if i < 0:
+			i += len(self)
+		if not 0 <= i < len(self):
+			raise IndexError('sequence index out of range')
+		return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self.data[self.offsets[i]:self.offsets[i + 1]]
+
+	def pack(self, idx = None, dtype = None):
+		"""pack some of the sequences time step major, see sequences.pack
+
+		:param idx: indices of the sequences, all of them if None
+		:param dtype: floating point type of the packed data, that of data if None
+		:type idx: numpy.array
+		:type dtype: numpy.dtype
+		:returns: packed data, number of running sequences at each time step, position in idx of each packed sequence
+		:rtype: (numpy.array, numpy.array, numpy.array)
+		"""
+		idx = np.arange(len(self)) if idx is None else np.asarray(idx, dtype = np.int64)
+		lengths = self.lengths[idx]
+		order = np.argsort(-lengths, kind = 'mergesort')
+		lengths = lengths[order]
+		batchsizes = _batchsizes(lengths)
+		# row of data holding each row of the sorted sequences laid end to end
+		shift = self.offsets[idx[order]] - (np.cumsum(lengths) - lengths)
+		src = np.repeat(shift, lengths) + np.arange(lengths.sum())
+		packed = np.empty((len(src),) + self.data.shape[1:], dtype = self.data.dtype if dtype is None else dtype)
+		packed[_packed_index(lengths, batchsizes)] = self.data[src]
+		return packed, batchsizes, order
+
+def sequenceset(seqs, dtype = None):
+	"""copy sequences into a SequenceSet
+
+	:param seqs: sequences, each a 2d array with one input per row
+	:param dtype: floating point type of the data, that of the sequences if None
+	:type seqs: list of numpy.array
+	:type dtype: numpy.dtype
+	:rtype: ebmlib.sequences.SequenceSet
+	"""
+	seqs = _asseqs(seqs, dtype)
+	offsets = np.zeros(len(seqs) + 1, dtype = np.int64)
+	np.cumsum([len(seq) for seq in seqs], out = offsets[1:])
+	if not seqs:
+		return SequenceSet(np.empty((0, 0), dtype = dtype), offsets)
+	return SequenceSet(np.concatenate(seqs), offsets)
+
+def save(seqset, path):
+	"""write a SequenceSet to a new directory as data.npy and offsets.npy
+
+	:param seqset: sequences
+	:param path: directory
+	:type seqset: ebmlib.sequences.SequenceSet
+	:type path: string
+	:rtype: None
+	"""
+	os.makedirs(path)
+	np.save(os.path.join(path, 'data.npy'), seqset.data)
+	np.save(os.path.join(path, 'offsets.npy'), seqset.offsets)
+
+def load(path, mmap = True):
+	"""read a SequenceSet written by save
+
+	:param path: directory
+	:param mmap: memory map the data read only instead of reading it
+	:type path: string
+	:type mmap: bool
+	:rtype: ebmlib.sequences.SequenceSet
+	"""
+	data = np.load(os.path.join(path, 'data.npy'), mmap_mode = 'r' if mmap else None)
+	return SequenceSet(data, np.load(os.path.join(path, 'offsets.npy')))
@@ -0,0 +1,250 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake 
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	serve.py
+# description:
+#	Inference server coalescing concurrent requests into minibatches.
+#---------------------------------------#
+
+import json
+import time
+import threading
+import collections
+try:
+	import queue
+	from http.server import HTTPServer, BaseHTTPRequestHandler
+	from socketserver import ThreadingMixIn
+except ImportError:
+	import Queue as queue
+	from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+	from SocketServer import ThreadingMixIn
+import numpy as np
+
+class _Request(object):
+	"""one input waiting for its result"""
+	def __init__(self, x):
+		self.x = x
+		self.y = None
+		self.error = None
+		self.arrived = time.time()
+		self.done = threading.Event()
+
+class MicroBatcher(object):
+	"""coalesce concurrent single input calls into batched calls
+
+	Callers in any number of threads call submit with one input and
+	block until its result is ready. A worker thread takes the oldest
+	waiting input, collects further inputs until maxbatch are waiting or
+	maxdelay seconds have passed since the oldest arrived, calls fn once
+	with one input per row, and hands row i of the result back to the
+	i-th caller.
+
+	Inputs of the wrong shape are rejected by submit before they can
+	join a batch. If fn still fails on a batch, or does not return one
+	result per input, its inputs are retried one at a time so only the
+	offending requests get the error.
+
+	Latencies of the last window requests and a histogram of batch
+	sizes are kept for stats.
+
+	:param fn: batched function, one input per row in and one result per row out, e.g. Drbm.output, Rbm.free_energy or Autoencoder.encode
+	:param maxbatch: largest batch passed to fn
+	:param maxdelay: longest time in seconds a request waits for others to join its batch
+	:param window: number of recent requests latency percentiles are computed over
+	:param shape: shape of one input, (nvis,) or (nin,) of the model fn is a method of if None
+	:type fn: function
+	:type maxbatch: int
+	:type maxdelay: float
+	:type window: int
+	:type shape: tuple
+	"""
+	def __init__(self, fn, maxbatch = 64, maxdelay = 0.002, window = 100000, shape = None):
+		self.fn = fn
+		self.maxbatch = maxbatch
+		self.maxdelay = maxdelay
+		if shape is None:
+			model = getattr(fn, '__self__', None)
+			n = getattr(model, 'nvis', getattr(model, 'nin', None))
+			shape = None if n is None else (n,)
+		self.shape = shape
+		self.latencies = collections.deque(maxlen = window)
+		self.batchsizes = collections.Counter()
+		self.requests = 0
+		self._closed = False
+		self._queue = queue.Queue()
+		self._lock = threading.Lock()
+		self._thread = threading.Thread(target = self._run)
+		self._thread.daemon = True
+		self._thread.start()
+
+	def submit(self, x):
+		"""compute fn for a single input
+
+		:param x: input
+		:type x: numpy.array
+		:returns: the row of the batched result belonging to x
+		:rtype: numpy.array or scalar
+		"""
+		x = np.asarray(x)
+		if x.dtype.kind not in 'biuf':
+			raise ValueError('input is not numeric')
+		if self.shape is not None and x.shape != tuple(self.shape):
+			raise ValueError('input shape %s, expected %s' % (x.shape, tuple(self.shape)))
+		r = _Request(x)
+		with self._lock:
+			if self._closed:
+				raise RuntimeError('MicroBatcher is closed')
+			self._queue.put(r)
+		r.done.wait()
+		with self._lock:
+			self.latencies.append(time.time() - r.arrived)
+			self.requests += 1
+		if r.error is not None:
+			raise r.error
+		return r.y
+
+	def _run(self):
+		while True:
+			first = self._queue.get()
+			if first is None:
+				return
+			batch = [first]
+			deadline = first.arrived + self.maxdelay
+			while len(batch) < self.maxbatch:
+				timeout = deadline - time.time()
+				try:
+					r = self._queue.get(timeout = timeout) if timeout > 0 else self._queue.get_nowait()
+				except queue.Empty:
+					break
+				if r is None:
+					self._queue.put(None)
+					break
+				batch.append(r)
+			self._call(batch)
+			with self._lock:
+				self.batchsizes[len(batch)] += 1
+			for r in batch:
+				r.done.set()
+
+	def _call(self, batch):
+		"""set the result or the error of every request of a batch"""
+		try:
+			Y = self.fn(np.array([r.x for r in batch]))
+			if len(Y) != len(batch):
+				raise ValueError('%d results for %d inputs' % (len(Y), len(batch)))
+		except Exception as e:
+			if len(batch) == 1:
+				batch[0].error = e
+			else:
+				for r in batch:
+					self._call([r])
+			return
+		for r, y in zip(batch, Y):
+			r.y = y
+
+	def stats(self):
+		"""request count, latency percentiles in seconds and batch size histogram
+
+		:rtype: dict
+		"""
+		with self._lock:
+			lat = np.array(self.latencies)
+			hist = dict(self.batchsizes)
+			n = self.requests
+		return {
+			'requests':	n,
+			'p50':		float(np.percentile(lat, 50)) if len(lat) else None,
+			'p99':		float(np.percentile(lat, 99)) if len(lat) else None,
+			'batchsizes':	dict((int(k), v) for k, v in sorted(hist.items()))}
+
+	def close(self):
+		"""stop the worker thread once the waiting requests are served,
+		later calls of submit raise RuntimeError
+
+		:rtype: None
+		"""
+		with self._lock:
+			if self._closed:
+				return
+			self._closed = True
+			self._queue.put(None)
+		self._thread.join()
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+	# many clients connect at once, that is the point
+	request_queue_size = 1024
+
+def _handler(batchers):
+	"""request handler class serving a dict of MicroBatchers"""
+	class Handler(BaseHTTPRequestHandler):
+		def _reply(self, code, obj):
+			body = json.dumps(obj).encode('utf-8')
+			self.send_response(code)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(body)))
+			self.end_headers()
+			self.wfile.write(body)
+
+		def do_GET(self):
+			if self.path.strip('/') == 'stats':
+				self._reply(200, dict((name, b.stats()) for name, b in batchers.items()))
+			else:
+				self._reply(404, {'error': 'unknown path %s' % self.path})
+
+		def do_POST(self):
+			b = batchers.get(self.path.strip('/'))
+			if b is None:
+				return self._reply(404, {'error': 'unknown path %s' % self.path})
+			try:
+				n = int(self.headers.get('Content-Length', 0))
+				x = np.asarray(json.loads(self.rfile.read(n).decode('utf-8'))['x'])
+				y = b.submit(x)
+			except Exception as e:
+				return self._reply(400, {'error': str(e)})
+			self._reply(200, {'y': np.asarray(y).tolist()})
+
+		def log_message(self, *args):
+			pass
+	return Handler
+
+def serve(batchers, host = 'localhost', port = 8000):
+	"""http front end for MicroBatchers
+
+	POST /name with the json body {"x": [...]} returns {"y": ...}
+	computed by batchers[name], and GET /stats returns the stats of
+	every batcher. Each connection is handled in its own thread so
+	concurrent requests are batched together. Call serve_forever on the
+	result, e.g. in a thread, and shutdown to stop.
+
+	:param batchers: batchers by name
+	:param host: address to listen on
+	:param port: port to listen on, 0 for any free port
+	:type batchers: dict
+	:type host: string
+	:type port: int
+	:returns: the server, not yet serving
+	:rtype: HTTPServer
+	"""
+	return _ThreadingHTTPServer((host, port), _handler(batchers))
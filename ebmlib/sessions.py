@@ -0,0 +1,306 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake 
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	sessions.py
+# description:
+#	Sequence state kept outside of the recurrent models, so one model
+#	can serve many sequences at once.
+#---------------------------------------#
+
+import time
+import threading
+import collections
+import numpy as np
+
+class Session(object):
+	"""state of one sequence of a recurrent model
+
+	The recurrent models (srrbm.Srrbm, srrbm.SoftmaxSrrbm, srrbm.Drrbm
+	and srautoencoder.SimpleRecursiveAutoencoder) keep the state of a
+	single sequence in model.h. A session keeps it instead and only
+	calls the model's initial_state, next_state and prev_state, which do
+	not change the model, so any number of sessions in any number of
+	threads can share one model, e.g. one loaded read only with
+	checkpoint.load.
+
+	:param model: recurrent model
+	:param h: starting state, the model's initial state if None
+	:type model: ebmlib recurrent model
+	:type h: numpy.array
+	"""
+	def __init__(self, model, h = None):
+		self.model = model
+		self.h = model.initial_state() if h is None else h
+
+	def push(self, x):
+		"""push an input x
+
+		:param x: input
+		:type x: numpy.array
+		:returns: new state
+		:rtype: numpy.array
+		"""
+		self.h = self.model.next_state(x, self.h)
+		return self.h
+
+	def pop(self):
+		"""pop the most recent input and return the model's reconstruction of it
+
+		:returns: output of the model's prev_state
+		:rtype: numpy.array
+		"""
+		y, self.h = self.model.prev_state(self.h)
+		return y
+
+	def reset(self):
+		"""start a new sequence
+
+		:rtype: None
+		"""
+		self.h = self.model.initial_state()
+
+	def output(self, *args, **kwargs):
+		"""the model's output given this session's state, see srrbm.Drrbm.output
+
+		:rtype: numpy.array or int
+		"""
+		return self.model.output(*args, h = self.h, **kwargs)
+
+	def free_energy(self, v):
+		"""the model's free energy of v given this session's state, see srrbm.Srrbm.free_energy
+
+		:param v: visible unit state
+		:type v: numpy.array
+		:rtype: float
+		"""
+		return self.model.free_energy(v, self.h)
+
+class SessionStore(object):
+	"""states of many concurrent sequences of one recurrent model
+
+	The state of every live sequence is a row of one preallocated
+	(capacity, nhid) array, addressed by an arbitrary hashable key.
+	Inputs pushed between ticks are queued, and tick advances every
+	sequence with a queued input by a single call of the model's
+	next_state on the stacked inputs and state rows, i.e. one matrix
+	product for all of them. A sequence with several queued inputs takes
+	one per round, so its inputs are consumed in order. This needs a
+	next_state that takes one input and state per row, which all of the
+	recurrent models but srrbm.SoftmaxSrrbm have, and other models are
+	rejected. Inputs of the wrong shape are rejected by push.
+
+	A key first seen by push or reset starts from the model's initial
+	state. state, pop, output and free_energy only look sequences up and
+	raise KeyError for a key that is not live, so they never take a row
+	or evict another sequence.
+	When every row is taken the least recently used sequence is evicted,
+	and with a ttl sequences not used for ttl seconds are evicted on the
+	next push or tick. An evicted sequence loses its queued inputs and
+	starts over if its key is used again.
+
+	:param model: recurrent model, see Session
+	:param capacity: maximum number of live sequences
+	:param ttl: seconds a sequence may go unused, no limit if None
+	:type model: ebmlib recurrent model
+	:type capacity: int
+	:type ttl: float
+	"""
+	def __init__(self, model, capacity = 1024, ttl = None):
+		self.model = model
+		self.capacity, self.ttl = capacity, ttl
+		self.h0 = model.initial_state()
+		self.shape = (model.nvis if hasattr(model, 'nvis') else model.nin,)
+		# try two rows, leaving the random state as it was
+		rng = np.random.get_state()
+		try:
+			H = model.next_state(np.zeros((2,) + self.shape, dtype = self.h0.dtype), np.array([self.h0, self.h0]))
+		except Exception:
+			H = None
+		finally:
+			np.random.set_state(rng)
+		if np.shape(H) != (2,) + self.h0.shape:
+			raise ValueError('%s.next_state does not take one input and state per row' % type(model).__name__)
+		self.states = np.empty((capacity,) + self.h0.shape, dtype = self.h0.dtype)
+		self.evictions = 0
+		self.clock = time.time
+		# key -> row, least recently used first
+		self._slots = collections.OrderedDict()
+		self._used = np.zeros(capacity)
+		self._free = list(range(capacity - 1, -1, -1))
+		self._pending = collections.OrderedDict()
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._slots)
+
+	def __contains__(self, key):
+		return key in self._slots
+
+	def _slot(self, key):
+		now = self.clock()
+		slot = self._slots.pop(key, None)
+		if slot is None:
+			self._expire(now)
+			if not self._free:
+				self._evict(next(iter(self._slots)))
+				self.evictions += 1
+			slot = self._free.pop()
+			self.states[slot] = self.h0
+		self._slots[key] = slot
+		self._used[slot] = now
+		return slot
+
+	def _lookup(self, key):
+		slot = self._slots.pop(key)
+		self._slots[key] = slot
+		self._used[slot] = self.clock()
+		return slot
+
+	def _evict(self, key):
+		self._free.append(self._slots.pop(key))
+		self._pending.pop(key, None)
+
+	def _expire(self, now):
+		if self.ttl is None:
+			return 0
+		expired = []
+		for key, slot in self._slots.items():
+			if now - self._used[slot] <= self.ttl:
+				break
+			expired.append(key)
+		for key in expired:
+			self._evict(key)
+		self.evictions += len(expired)
+		return len(expired)
+
+	def expire(self):
+		"""evict every sequence not used for ttl seconds
+
+		:returns: number of evicted sequences
+		:rtype: int
+		"""
+		with self._lock:
+			return self._expire(self.clock())
+
+	def push(self, key, x):
+		"""queue an input of a sequence for the next tick
+
+		:param key: sequence
+		:param x: input
+		:type key: hashable
+		:type x: numpy.array
+		:rtype: None
+		"""
+		if np.shape(x) != self.shape:
+			raise ValueError('input shape %s, expected %s' % (np.shape(x), self.shape))
+		with self._lock:
+			self._slot(key)
+			self._pending.setdefault(key, []).append(x)
+
+	def tick(self):
+		"""advance every sequence with queued inputs
+
+		:returns: keys of the advanced sequences
+		:rtype: list
+		"""
+		with self._lock:
+			self._expire(self.clock())
+			keys = list(self._pending)
+			while self._pending:
+				idx = np.fromiter((self._slots[k] for k in self._pending), dtype = np.intp)
+				X = np.array([q[0] for q in self._pending.values()], dtype = self.states.dtype)
+				self.states[idx] = self.model.next_state(X, self.states[idx])
+				# the inputs are only consumed once next_state succeeded
+				for k in list(self._pending):
+					q = self._pending[k]
+					q.pop(0)
+					if not q:
+						del self._pending[k]
+			return keys
+
+	def state(self, key):
+		"""current state of a sequence
+
+		:param key: sequence
+		:type key: hashable
+		:returns: copy of the state
+		:rtype: numpy.array
+		"""
+		with self._lock:
+			return self.states[self._lookup(key)].copy()
+
+	def pop(self, key):
+		"""pop the most recent input of a sequence, see Session.pop
+
+		:param key: sequence
+		:type key: hashable
+		:returns: output of the model's prev_state
+		:rtype: numpy.array
+		"""
+		with self._lock:
+			slot = self._lookup(key)
+			y, self.states[slot] = self.model.prev_state(self.states[slot])
+			return y
+
+	def reset(self, key):
+		"""start a sequence over, dropping its queued inputs
+
+		:param key: sequence
+		:type key: hashable
+		:rtype: None
+		"""
+		with self._lock:
+			self.states[self._slot(key)] = self.h0
+			self._pending.pop(key, None)
+
+	def drop(self, key):
+		"""forget a sequence and free its row
+
+		:param key: sequence
+		:type key: hashable
+		:rtype: None
+		"""
+		with self._lock:
+			if key in self._slots:
+				self._evict(key)
+
+	def output(self, key, *args, **kwargs):
+		"""the model's output given a sequence's state, see Session.output
+
+		:param key: sequence
+		:type key: hashable
+		:rtype: numpy.array or int
+		"""
+		return self.model.output(*args, h = self.state(key), **kwargs)
+
+	def free_energy(self, key, v):
+		"""the model's free energy of v given a sequence's state, see Session.free_energy
+
+		:param key: sequence
+		:param v: visible unit state
+		:type key: hashable
+		:type v: numpy.array
+		:rtype: float
+		"""
+		return self.model.free_energy(v, self.state(key))
@@ -1,3 +1,3 @@
 """... automodule::"""
-from srautoencoder import SimpleRecursiveAutoencoder
-from backproptrainer import BackPropTrainer, SparseBackPropTrainer
+from . srautoencoder import SimpleRecursiveAutoencoder
+from . backproptrainer import BackPropTrainer, SparseBackPropTrainer
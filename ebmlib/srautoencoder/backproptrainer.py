@@ -28,7 +28,7 @@
 #---------------------------------------#
 
 import numpy as np
-from .. units import derivatives
+from .. units import derivatives, apply_update
 
 class BackPropTrainer(object):
 	"""backpropagation trainer class
@@ -47,6 +47,18 @@ class BackPropTrainer(object):
 		self.lr, self.m, self.l2 = lr, m, l2
 		self.dherr = derivatives[net.htype]
 		self.doerr = derivatives[net.otype]
+		# workspace, reused by every update
+		self._gwoih = np.zeros(net.woih.shape, dtype = net.dtype)
+		self._twoih = np.zeros(net.woih.shape, dtype = net.dtype)
+		self._gwoch = np.zeros(net.woch.shape, dtype = net.dtype)
+		self._twoch = np.zeros(net.woch.shape, dtype = net.dtype)
+		self._gwhi = np.zeros(net.whi.shape, dtype = net.dtype)
+		self._twhi = np.zeros(net.whi.shape, dtype = net.dtype)
+		self._gwhc = np.zeros(net.whc.shape, dtype = net.dtype)
+		self._twhc = np.zeros(net.whc.shape, dtype = net.dtype)
+		self._goib = np.zeros(net.oib.shape, dtype = net.dtype)
+		self._gocb = np.zeros(net.ocb.shape, dtype = net.dtype)
+		self._ghb = np.zeros(net.hb.shape, dtype = net.dtype)
 
 	def learn(self, net, x, m = True, l2 = True):
 		"""weight update for single training example
@@ -61,51 +73,39 @@ class BackPropTrainer(object):
 		:type l2: bool
 		:rtype: None
 		"""
+		x = np.asarray(x, dtype = net.dtype)
 		c = net.h.copy()
 		net.ff(x, c)
 		eoi = self.doerr(net.oi) * (x - net.oi)
 		eoc = self.dherr(net.oc) * (c - net.oc)
 		eh = self.dherr(net.h) * (np.dot(net.woih.T, eoi) + np.dot(net.woch.T, eoc))
 
+		gwoih, gwoch, gwhi, gwhc = self._gwoih, self._gwoch, self._gwhi, self._gwhc
+		goib, gocb, ghb = self._goib, self._gocb, self._ghb
+		np.multiply(eoi[:, np.newaxis], net.h, out = gwoih)
+		np.multiply(eoc[:, np.newaxis], net.h, out = gwoch)
+		np.multiply(eh[:, np.newaxis], x, out = gwhi)
+		np.multiply(eh[:, np.newaxis], c, out = gwhc)
+		goib[...] = eoi
+		gocb[...] = eoc
+		ghb[...] = eh
+
 		if l2:
-			dwoih = self.lr * (np.outer(eoi, net.h) - self.l2 * net.woih)
-			dwoch = self.lr * (np.outer(eoc, net.h) - self.l2 * net.woch)
-			dwhi = self.lr * (np.outer(eh, x) - self.l2 * net.whi)
-			dwhc = self.lr * (np.outer(eh, c) - self.l2 * net.whc)
-		else:
-			dwoih = self.lr * np.outer(eoi, net.h)
-			dwoch = self.lr * np.outer(eoc, net.h)
-			dwhi = self.lr * np.outer(eh, x)
-			dwhc = self.lr * np.outer(eh, c)
-		
-		doib = self.lr * eoi
-		docb = self.lr * eoc
-		dhb = self.lr * eh
-
-		if m:
-			dwoih += self.m * net.dwoih
-			dwoch += self.m * net.dwoch
-			dwhi += self.m * net.dwhi
-			dwhc += self.m * net.dwhc
-			doib += self.m * net.doib
-			docb += self.m * net.docb
-			dhb += self.m * net.dhb
-
-		net.woih += dwoih
-		net.woch += dwoch
-		net.whi += dwhi
-		net.whc += dwhc
-		net.oib += doib
-		net.ocb += docb
-		net.hb += dhb
-
-		net.dwoih = dwoih
-		net.dwoch = dwoch
-		net.dwhi = dwhi
-		net.dwhc = dwhc
-		net.doib = doib
-		net.docb = docb
-		net.dhb = dhb
+			for w, g, t in ((net.woih, gwoih, self._twoih), (net.woch, gwoch, self._twoch),
+							(net.whi, gwhi, self._twhi), (net.whc, gwhc, self._twhc)):
+				np.multiply(w, self.l2, out = t)
+				g -= t
+
+		for g in (gwoih, gwoch, gwhi, gwhc, goib, gocb, ghb):
+			g *= self.lr
+
+		apply_update(net.woih, net.dwoih, gwoih, self.m if m else 0.)
+		apply_update(net.woch, net.dwoch, gwoch, self.m if m else 0.)
+		apply_update(net.whi, net.dwhi, gwhi, self.m if m else 0.)
+		apply_update(net.whc, net.dwhc, gwhc, self.m if m else 0.)
+		apply_update(net.oib, net.doib, goib, self.m if m else 0.)
+		apply_update(net.ocb, net.docb, gocb, self.m if m else 0.)
+		apply_update(net.hb, net.dhb, ghb, self.m if m else 0.)
 
 	def batchlearn(self, net, X, m = True, l2 = True):
 		"""weight update for a batch of training examples
@@ -122,13 +122,11 @@ class BackPropTrainer(object):
 
 		:rtype: None
 		"""
-		dwoih = np.zeros(net.woih.shape)
-		dwoch = np.zeros(net.woch.shape)
-		dwhi = np.zeros(net.whi.shape)
-		dwhc = np.zeros(net.whc.shape)
-		doib = np.zeros(net.oib.shape)
-		docb = np.zeros(net.ocb.shape)
-		dhb = np.zeros(net.hb.shape)
+		X = np.asarray(X, dtype = net.dtype)
+		gwoih, gwoch, gwhi, gwhc = self._gwoih, self._gwoch, self._gwhi, self._gwhc
+		goib, gocb, ghb = self._goib, self._gocb, self._ghb
+		for g in (gwoih, gwoch, gwhi, gwhc, goib, gocb, ghb):
+			g.fill(0)
 		
 		for x in X:
 			c = net.h.copy()
@@ -136,55 +134,109 @@ class BackPropTrainer(object):
 			eoi = self.doerr(net.oi) * (x - net.oi)
 			eoc = self.dherr(net.oc) * (c - net.oc)
 			eh = self.dherr(net.h) * (np.dot(net.woih.T, eoi) + np.dot(net.woch.T, eoc))
-			dwoih += np.outer(eoi, net.h)
-			dwoch += np.outer(eoc, net.h)
-			dwhi += np.outer(eh, x)
-			dwhc += np.outer(eh, c)
-			doib += eoi
-			docb += eoc
-			dhb += eh
+			np.multiply(eoi[:, np.newaxis], net.h, out = self._twoih)
+			np.multiply(eoc[:, np.newaxis], net.h, out = self._twoch)
+			np.multiply(eh[:, np.newaxis], x, out = self._twhi)
+			np.multiply(eh[:, np.newaxis], c, out = self._twhc)
+			gwoih += self._twoih
+			gwoch += self._twoch
+			gwhi += self._twhi
+			gwhc += self._twhc
+			goib += eoi
+			gocb += eoc
+			ghb += eh
+
+		for g in (gwoih, gwoch, gwhi, gwhc, goib, gocb, ghb):
+			g /= len(X)
 
 		if l2:
-			dwoih = self.lr * ((dwoih / len(X)) - self.l2 * net.woih)
-			dwoch = self.lr * ((dwoch / len(X)) - self.l2 * net.woch)
-			dwhi = self.lr * ((dwhi / len(X)) - self.l2 * net.whi)
-			dwhc = self.lr * ((dwhc / len(X)) - self.l2 * net.whc)
-		else:
-			dwoih = self.lr * dwoih / len(X)
-			dwoch = self.lr * dwoch / len(X)
-			dwhi = self.lr * dwhi / len(X)
-			dwhc = self.lr * dwhc / len(X)
-		
-		doib = self.lr * doib / len(X)
-		docb = self.lr * docb / len(X)
-		dhb = self.lr * dhb / len(X)
-
-		if m:
-			dwoih += self.m * net.dwoih
-			dwoch += self.m * net.dwoch
-			dwhi += self.m * net.dwhi
-			dwhc += self.m * net.dwhc
-			doib += self.m * net.doib
-			docb += self.m * net.docb
-			dhb += self.m * net.dhb
-
-		net.woih += dwoih
-		net.woch += dwoch
-		net.whi += dwhi
-		net.whc += dwhc
-		net.oib += doib
-		net.ocb += docb
-		net.hb += dhb
-
-		net.dwoih = dwoih
-		net.dwoch = dwoch
-		net.dwhi = dwhi
-		net.dwhc = dwhc
-		net.doib = doib
-		net.docb = docb
-		net.dhb = dhb
-
-class SparseBackPropTrainer(object):
+			for w, g, t in ((net.woih, gwoih, self._twoih), (net.woch, gwoch, self._twoch),
+							(net.whi, gwhi, self._twhi), (net.whc, gwhc, self._twhc)):
+				np.multiply(w, self.l2, out = t)
+				g -= t
+
+		for g in (gwoih, gwoch, gwhi, gwhc, goib, gocb, ghb):
+			g *= self.lr
+
+		apply_update(net.woih, net.dwoih, gwoih, self.m if m else 0.)
+		apply_update(net.woch, net.dwoch, gwoch, self.m if m else 0.)
+		apply_update(net.whi, net.dwhi, gwhi, self.m if m else 0.)
+		apply_update(net.whc, net.dwhc, gwhc, self.m if m else 0.)
+		apply_update(net.oib, net.doib, goib, self.m if m else 0.)
+		apply_update(net.ocb, net.docb, gocb, self.m if m else 0.)
+		apply_update(net.hb, net.dhb, ghb, self.m if m else 0.)
+
+	def seqbatchlearn(self, net, data, batchsizes, m = True, l2 = True):
+		"""weight update for several sequences encoded together
+
+		The sequences are given packed by ebmlib.sequences.pack and each
+		starts from a zero context. Only computing the hidden states needs
+		a loop over time steps, the errors and gradients of every packed
+		input are then computed at once. net.h is not used. An empty batch
+		leaves the model unchanged.
+		SparseBackPropTrainer inherits this method and adds its sparsity
+		penalty, computed from the mean hidden activity of the same pass.
+
+		:param net: model to update
+		:param data: packed examples
+		:param batchsizes: number of running sequences at each time step
+		:param m: include momentum term in cost function
+		:param l2: include l2 regularization term in cost function
+
+		:type net: ebmlib.srautoencoder.SimpleRecursiveAutoencoder
+		:type data: 2d numpy.array
+		:type batchsizes: numpy.array
+		:type m: bool
+		:type l2: bool
+
+		:rtype: None
+		"""
+		data = np.asarray(data, dtype = net.dtype)
+		n = len(data)
+		if n == 0:
+			return
+		H, C = net.seqstates(data, batchsizes)
+		OI = net.oact(np.dot(H, net.woih.T) + net.oib)
+		OC = net.hact(np.dot(H, net.woch.T) + net.ocb)
+		EOI = self.doerr(OI) * (data - OI)
+		EOC = self.dherr(OC) * (C - OC)
+		EH = self.dherr(H) * (np.dot(EOI, net.woih) + np.dot(EOC, net.woch) - self._seqpenalty(H))
+
+		gwoih, gwoch, gwhi, gwhc = self._gwoih, self._gwoch, self._gwhi, self._gwhc
+		goib, gocb, ghb = self._goib, self._gocb, self._ghb
+		np.dot(EOI.T, H, out = gwoih)
+		np.dot(EOC.T, H, out = gwoch)
+		np.dot(EH.T, data, out = gwhi)
+		np.dot(EH.T, C, out = gwhc)
+		EOI.sum(axis = 0, out = goib)
+		EOC.sum(axis = 0, out = gocb)
+		EH.sum(axis = 0, out = ghb)
+
+		for g in (gwoih, gwoch, gwhi, gwhc, goib, gocb, ghb):
+			g /= n
+
+		if l2:
+			for w, g, t in ((net.woih, gwoih, self._twoih), (net.woch, gwoch, self._twoch),
+							(net.whi, gwhi, self._twhi), (net.whc, gwhc, self._twhc)):
+				np.multiply(w, self.l2, out = t)
+				g -= t
+
+		for g in (gwoih, gwoch, gwhi, gwhc, goib, gocb, ghb):
+			g *= self.lr
+
+		apply_update(net.woih, net.dwoih, gwoih, self.m if m else 0.)
+		apply_update(net.woch, net.dwoch, gwoch, self.m if m else 0.)
+		apply_update(net.whi, net.dwhi, gwhi, self.m if m else 0.)
+		apply_update(net.whc, net.dwhc, gwhc, self.m if m else 0.)
+		apply_update(net.oib, net.doib, goib, self.m if m else 0.)
+		apply_update(net.ocb, net.docb, gocb, self.m if m else 0.)
+		apply_update(net.hb, net.dhb, ghb, self.m if m else 0.)
+
+	def _seqpenalty(self, H):
+		"""penalty on the hidden errors of seqbatchlearn, none without a sparsity constraint"""
+		return 0.
+
+class SparseBackPropTrainer(BackPropTrainer):
 	"""backpropagation with sparisty constraint trainer class
 
 	:param net: the model to train
@@ -204,11 +256,9 @@ class SparseBackPropTrainer(object):
 	:type pdecay: float
 	"""
 	def __init__(self, net, lr = 0.1, m = 0.9, l2 = 0.0001, p = 0.1, spen = 0.0001, pdecay = 0.9):
-		self.lr, self.m, self.l2, self.p, self.spen, self.pdecay = lr, m, l2, p, spen, pdecay
-		self.dherr = derivatives[net.htype]
-		self.doerr = derivatives[net.otype]
-
-		self.q = np.zeros(net.nhid)
+		BackPropTrainer.__init__(self, net, lr, m, l2)
+		self.p, self.spen, self.pdecay = p, spen, pdecay
+		self.q = np.zeros(net.nhid, dtype = net.dtype)
 
 	def sparseterm(self, h):
 		"""compute the sparse penalty term and update the exponential decaying mean approximation
@@ -247,51 +297,39 @@ class SparseBackPropTrainer(object):
 
 		:rtype: None
 		"""
+		x = np.asarray(x, dtype = net.dtype)
 		c = net.h.copy()
 		net.ff(x, c)
 		eoi = self.doerr(net.oi) * (x - net.oi)
 		eoc = self.dherr(net.oc) * (c - net.oc)
 		eh = self.dherr(net.h) * (np.dot(net.woih.T, eoi) + np.dot(net.woch.T, eoc) - self.sparseterm(net.h))
 
+		gwoih, gwoch, gwhi, gwhc = self._gwoih, self._gwoch, self._gwhi, self._gwhc
+		goib, gocb, ghb = self._goib, self._gocb, self._ghb
+		np.multiply(eoi[:, np.newaxis], net.h, out = gwoih)
+		np.multiply(eoc[:, np.newaxis], net.h, out = gwoch)
+		np.multiply(eh[:, np.newaxis], x, out = gwhi)
+		np.multiply(eh[:, np.newaxis], c, out = gwhc)
+		goib[...] = eoi
+		gocb[...] = eoc
+		ghb[...] = eh
+
 		if l2:
-			dwoih = self.lr * (np.outer(eoi, net.h) - self.l2 * net.woih)
-			dwoch = self.lr * (np.outer(eoc, net.h) - self.l2 * net.woch)
-			dwhi = self.lr * (np.outer(eh, x) - self.l2 * net.whi)
-			dwhc = self.lr * (np.outer(eh, c) - self.l2 * net.whc)
-		else:
-			dwoih = self.lr * np.outer(eoi, net.h)
-			dwoch = self.lr * np.outer(eoc, net.h)
-			dwhi = self.lr * np.outer(eh, x)
-			dwhc = self.lr * np.outer(eh, c)
-		
-		doib = self.lr * eoi
-		docb = self.lr * eoc
-		dhb = self.lr * eh
-
-		if m:
-			dwoih += self.m * net.dwoih
-			dwoch += self.m * net.dwoch
-			dwhi += self.m * net.dwhi
-			dwhc += self.m * net.dwhc
-			doib += self.m * net.doib
-			docb += self.m * net.docb
-			dhb += self.m * net.dhb
-
-		net.woih += dwoih
-		net.woch += dwoch
-		net.whi += dwhi
-		net.whc += dwhc
-		net.oib += doib
-		net.ocb += docb
-		net.hb += dhb
-
-		net.dwoih = dwoih
-		net.dwoch = dwoch
-		net.dwhi = dwhi
-		net.dwhc = dwhc
-		net.doib = doib
-		net.docb = docb
-		net.dhb = dhb
+			for w, g, t in ((net.woih, gwoih, self._twoih), (net.woch, gwoch, self._twoch),
+							(net.whi, gwhi, self._twhi), (net.whc, gwhc, self._twhc)):
+				np.multiply(w, self.l2, out = t)
+				g -= t
+
+		for g in (gwoih, gwoch, gwhi, gwhc, goib, gocb, ghb):
+			g *= self.lr
+
+		apply_update(net.woih, net.dwoih, gwoih, self.m if m else 0.)
+		apply_update(net.woch, net.dwoch, gwoch, self.m if m else 0.)
+		apply_update(net.whi, net.dwhi, gwhi, self.m if m else 0.)
+		apply_update(net.whc, net.dwhc, gwhc, self.m if m else 0.)
+		apply_update(net.oib, net.doib, goib, self.m if m else 0.)
+		apply_update(net.ocb, net.docb, gocb, self.m if m else 0.)
+		apply_update(net.hb, net.dhb, ghb, self.m if m else 0.)
 
 	def batchlearn(self, net, X, m = True, l2 = True):
 		"""weight update for a batch of training examples
@@ -308,15 +346,13 @@ class SparseBackPropTrainer(object):
 
 		:rtype: None
 		"""
-		dwoih = np.zeros(net.woih.shape)
-		dwoch = np.zeros(net.woch.shape)
-		dwhi = np.zeros(net.whi.shape)
-		dwhc = np.zeros(net.whc.shape)
-		doib = np.zeros(net.oib.shape)
-		docb = np.zeros(net.ocb.shape)
-		dhb = np.zeros(net.hb.shape)
+		X = np.asarray(X, dtype = net.dtype)
+		gwoih, gwoch, gwhi, gwhc = self._gwoih, self._gwoch, self._gwhi, self._gwhc
+		goib, gocb, ghb = self._goib, self._gocb, self._ghb
+		for g in (gwoih, gwoch, gwhi, gwhc, goib, gocb, ghb):
+			g.fill(0)
 		
-		phat = np.zeros(net.nhid)
+		phat = np.zeros(net.nhid, dtype = net.dtype)
 		for x in X:
 			net.push(x)
 			phat += net.h
@@ -329,51 +365,38 @@ class SparseBackPropTrainer(object):
 			eoi = self.doerr(net.oi) * (x - net.oi)
 			eoc = self.dherr(net.oc) * (c - net.oc)
 			eh = self.dherr(net.h) * (np.dot(net.woih.T, eoi) + np.dot(net.woch.T, eoc) - sparse_penalty_term)
-			dwoih += np.outer(eoi, net.h)
-			dwoch += np.outer(eoc, net.h)
-			dwhi += np.outer(eh, x)
-			dwhc += np.outer(eh, c)
-			doib += eoi
-			docb += eoc
-			dhb += eh
+			np.multiply(eoi[:, np.newaxis], net.h, out = self._twoih)
+			np.multiply(eoc[:, np.newaxis], net.h, out = self._twoch)
+			np.multiply(eh[:, np.newaxis], x, out = self._twhi)
+			np.multiply(eh[:, np.newaxis], c, out = self._twhc)
+			gwoih += self._twoih
+			gwoch += self._twoch
+			gwhi += self._twhi
+			gwhc += self._twhc
+			goib += eoi
+			gocb += eoc
+			ghb += eh
+
+		for g in (gwoih, gwoch, gwhi, gwhc, goib, gocb, ghb):
+			g /= len(X)
 
 		if l2:
-			dwoih = self.lr * ((dwoih / len(X)) - self.l2 * net.woih)
-			dwoch = self.lr * ((dwoch / len(X)) - self.l2 * net.woch)
-			dwhi = self.lr * ((dwhi / len(X)) - self.l2 * net.whi)
-			dwhc = self.lr * ((dwhc / len(X)) - self.l2 * net.whc)
-		else:
-			dwoih = self.lr * dwoih / len(X)
-			dwoch = self.lr * dwoch / len(X)
-			dwhi = self.lr * dwhi / len(X)
-			dwhc = self.lr * dwhc / len(X)
-		
-		doib = self.lr * doib / len(X)
-		docb = self.lr * docb / len(X)
-		dhb = self.lr * dhb / len(X)
-
-		if m:
-			dwoih += self.m * net.dwoih
-			dwoch += self.m * net.dwoch
-			dwhi += self.m * net.dwhi
-			dwhc += self.m * net.dwhc
-			doib += self.m * net.doib
-			docb += self.m * net.docb
-			dhb += self.m * net.dhb
-
-		net.woih += dwoih
-		net.woch += dwoch
-		net.whi += dwhi
-		net.whc += dwhc
-		net.oib += doib
-		net.ocb += docb
-		net.hb += dhb
-
-		net.dwoih = dwoih
-		net.dwoch = dwoch
-		net.dwhi = dwhi
-		net.dwhc = dwhc
-		net.doib = doib
-		net.docb = docb
-		net.dhb = dhb
-
+			for w, g, t in ((net.woih, gwoih, self._twoih), (net.woch, gwoch, self._twoch),
+							(net.whi, gwhi, self._twhi), (net.whc, gwhc, self._twhc)):
+				np.multiply(w, self.l2, out = t)
+				g -= t
+
+		for g in (gwoih, gwoch, gwhi, gwhc, goib, gocb, ghb):
+			g *= self.lr
+
+		apply_update(net.woih, net.dwoih, gwoih, self.m if m else 0.)
+		apply_update(net.woch, net.dwoch, gwoch, self.m if m else 0.)
+		apply_update(net.whi, net.dwhi, gwhi, self.m if m else 0.)
+		apply_update(net.whc, net.dwhc, gwhc, self.m if m else 0.)
+		apply_update(net.oib, net.doib, goib, self.m if m else 0.)
+		apply_update(net.ocb, net.docb, gocb, self.m if m else 0.)
+		apply_update(net.hb, net.dhb, ghb, self.m if m else 0.)
+
+	def _seqpenalty(self, H):
+		"""sparsity penalty on the hidden errors, from the mean activity of the same pass"""
+		return self.batchsparseterm(H.mean(axis = 0))
@@ -28,7 +28,7 @@
 #---------------------------------------#
 
 import numpy as np
-from .. units import unittypes
+from .. units import unittypes, copystate
 
 class SimpleRecursiveAutoencoder(object):
 	"""autoencoder class
@@ -37,38 +37,41 @@ class SimpleRecursiveAutoencoder(object):
 	:param nhid: number of hidden units
 	:param htype: hidden unit type, see units.py for available types
 	:param otype: output unit type, see units.py for available types
+	:param dtype: floating point type of the weights and biases
 
 	:type nin: int
 	:type nhid: int
 	:type htype: string
 	:type otype: string
+	:type dtype: numpy.dtype
 	"""
-	def __init__(self, nin, nhid, htype = 'tanh', otype = 'sigmoid'):
+	def __init__(self, nin, nhid, htype = 'tanh', otype = 'sigmoid', dtype = np.float64):
 		self.nin = nin
 		self.nhid = nhid
-		self.i = np.zeros(nin)
-		self.c = np.zeros(nhid)
-		self.h = np.zeros(nhid)
-		self.oi = np.zeros(nin)
-		self.oc = np.zeros(nhid)
-
-		self.hb = np.zeros(nhid)
-		self.oib = np.zeros(nin)
-		self.ocb = np.zeros(nhid)
-
-		self.whi = np.random.normal(0., 0.2, (nhid, nin))
-		self.whc = np.random.normal(0., 0.2, (nhid, nhid))
-		self.woih = np.random.normal(0., 0.2, (nin, nhid))
-		self.woch = np.random.normal(0, 0.2, (nhid, nhid))
-
-		self.dwhi = np.zeros((nhid, nin))
-		self.dwhc = np.zeros((nhid, nhid))
-		self.dwoih = np.zeros((nin, nhid))
-		self.dwoch = np.zeros((nhid, nhid))
+		self.dtype = np.dtype(dtype)
+		self.i = np.zeros(nin, dtype = dtype)
+		self.c = np.zeros(nhid, dtype = dtype)
+		self.h = np.zeros(nhid, dtype = dtype)
+		self.oi = np.zeros(nin, dtype = dtype)
+		self.oc = np.zeros(nhid, dtype = dtype)
+
+		self.hb = np.zeros(nhid, dtype = dtype)
+		self.oib = np.zeros(nin, dtype = dtype)
+		self.ocb = np.zeros(nhid, dtype = dtype)
+
+		self.whi = np.random.normal(0., 0.2, (nhid, nin)).astype(dtype)
+		self.whc = np.random.normal(0., 0.2, (nhid, nhid)).astype(dtype)
+		self.woih = np.random.normal(0., 0.2, (nin, nhid)).astype(dtype)
+		self.woch = np.random.normal(0, 0.2, (nhid, nhid)).astype(dtype)
+
+		self.dwhi = np.zeros((nhid, nin), dtype = dtype)
+		self.dwhc = np.zeros((nhid, nhid), dtype = dtype)
+		self.dwoih = np.zeros((nin, nhid), dtype = dtype)
+		self.dwoch = np.zeros((nhid, nhid), dtype = dtype)
 		
-		self.dhb = np.zeros(nhid)
-		self.doib = np.zeros(nin)
-		self.docb = np.zeros(nhid)
+		self.dhb = np.zeros(nhid, dtype = dtype)
+		self.doib = np.zeros(nin, dtype = dtype)
+		self.docb = np.zeros(nhid, dtype = dtype)
 
 		self.htype = htype
 		self.otype = otype
@@ -79,27 +82,62 @@ class SimpleRecursiveAutoencoder(object):
 	def ff(self, x, c):
 		"""get reconstruction of x
 
-		:param x: input
-		:param c: context
+		:param x: input, or one input per row
+		:param c: context, or one context per row
 		:type x: numpy.array
 		:type c: numpy.array
 		:returns: reconstruction of x and c
 		:rtype: (numpy.array, numpy.array)
 		"""
-		self.h = self.hact(np.dot(self.whi, x) + np.dot(self.whc, c) + self.hb)
-		self.oi = self.oact(np.dot(self.woih, self.h) + self.oib)
-		self.oc = self.hact(np.dot(self.woch, self.h) + self.ocb)
+		self.h = self.hact(np.dot(x, self.whi.T) + np.dot(c, self.whc.T) + self.hb)
+		self.oi = self.oact(np.dot(self.h, self.woih.T) + self.oib)
+		self.oc = self.hact(np.dot(self.h, self.woch.T) + self.ocb)
 		return self.oi, self.oc
 
+	def initial_state(self, nseq = None):
+		"""context of a new sequence
+
+		:param nseq: number of sequences, one context vector if None
+		:type nseq: int
+		:returns: zero context
+		:rtype: numpy.array
+		"""
+		if nseq is None:
+			return np.zeros(self.nhid, dtype = self.dtype)
+		return np.zeros((nseq, self.nhid), dtype = self.dtype)
+
+	def next_state(self, x, h):
+		"""encoding of a context given x, without changing the model
+
+		:param x: input, or one input per row
+		:param h: current context, or one context per row
+		:type x: numpy.array
+		:type h: numpy.array
+		:returns: new context
+		:rtype: numpy.array
+		"""
+		return self.hact(np.dot(x, self.whi.T) + np.dot(h, self.whc.T) + self.hb)
+
+	def prev_state(self, h):
+		"""decode the most recent input from a context, without changing the model
+
+		:param h: current context, or one context per row
+		:type h: numpy.array
+		:returns: decoding of the most recent input and previous context
+		:rtype: (numpy.array, numpy.array)
+		"""
+		return (self.oact(np.dot(h, self.woih.T) + self.oib),
+			self.hact(np.dot(h, self.woch.T) + self.ocb))
+
 	def push(self, x):
 		"""push an input x
 
-		:param x: input
+		:param x: input, or one input per row when the state holds one context per row
 		:type x: numpy.array
 		:returns: encoding of the current context given x
 		:rtype: numpy.array
 		"""
-		self.h = self.hact(np.dot(self.whi, x) + np.dot(self.whc, self.h) + self.hb)
+		self.h = self.next_state(x, self.h)
 		return self.h
 
 	def pop(self):
@@ -108,40 +146,71 @@ class SimpleRecursiveAutoencoder(object):
 		:returns: decoding of the most recent input
 		:rtype: numpy.array
 		"""
-		self.oi = self.oact(np.dot(self.woih, self.h) + self.oib)
-		self.h = self.hact(np.dot(self.woch, self.h) + self.ocb)
+		self.oi, self.h = self.prev_state(self.h)
 		return self.oi
 
-	def reset(self):
+	def reset(self, nseq = None):
 		"""reset the netowrks stateful hidden units to 0
 		
+		:param nseq: number of sequences to hold state for, one state vector if None
+		:type nseq: int
 		:rtype: None
 		"""
-		self.h = np.zeros(self.nhid)
+		self.h = self.initial_state(nseq)
 
-	def __getstate__(self):
+	def seqstates(self, data, batchsizes):
+		"""encode several sequences together
+
+		The sequences are given packed by ebmlib.sequences.pack and each
+		starts from a zero context. Every time step is one matrix product
+		over the sequences still running. The model state is not used.
+
+		:param data: packed inputs
+		:param batchsizes: number of running sequences at each time step
+		:type data: 2d numpy.array
+		:type batchsizes: numpy.array
+		:returns: hidden state and context of every packed input
+		:rtype: (numpy.array, numpy.array)
+		"""
+		H = np.empty((len(data), self.nhid), dtype = self.dtype)
+		C = np.zeros((len(data), self.nhid), dtype = self.dtype)
+		start = prev = 0
+		for b in batchsizes:
+			if start:
+				C[start:start + b] = H[prev:prev + b]
+			H[start:start + b] = self.hact(np.dot(data[start:start + b], self.whi.T) + 
+				np.dot(C[start:start + b], self.whc.T) + self.hb)
+			prev = start
+			start += b
+		return H, C
+
+	def _state(self):
+		"""state of the model without copying its arrays, read by ebmlib.checkpoint"""
 		d = {
 			'nin':		self.nin,
 			'nhid':		self.nhid,
 			'htype':	self.htype,
 			'otype':	self.otype,
-			'whi':		self.whi.copy(),
-			'whc':		self.whc.copy(),
-			'woih':		self.woih.copy(),
-			'woch':		self.woch.copy(),
-			'hb':		self.hb.copy(),
-			'oib':		self.oib.copy(),
-			'ocb':		self.ocb.copy(),
-			'dwhi':		self.dwhi.copy(),
-			'dwhc':		self.dwhc.copy(),
-			'dwoih':	self.dwoih.copy(),
-			'dwoch':	self.dwoch.copy(),
-			'dhb':		self.dhb.copy(),
-			'doib':		self.doib.copy(),
-			'docb':		self.docb.copy(),
-			'hstate':	self.h.copy()}
+			'whi':		self.whi,
+			'whc':		self.whc,
+			'woih':		self.woih,
+			'woch':		self.woch,
+			'hb':		self.hb,
+			'oib':		self.oib,
+			'ocb':		self.ocb,
+			'dwhi':		self.dwhi,
+			'dwhc':		self.dwhc,
+			'dwoih':	self.dwoih,
+			'dwoch':	self.dwoch,
+			'dhb':		self.dhb,
+			'doib':		self.doib,
+			'docb':		self.docb,
+			'hstate':	self.h}
 		return d
 
+	def __getstate__(self):
+		return copystate(self._state())
+
 	def __setstate__(self, d):
 		self.nin =		d['nin']
 		self.nhid =		d['nhid']
@@ -161,14 +230,15 @@ class SimpleRecursiveAutoencoder(object):
 		self.dhb =		d['dhb']
 		self.doib =		d['doib']
 		self.docb =		d['docb']
+		self.dtype = self.whi.dtype
 		
 		self.hact = unittypes[self.htype]
 		self.oact = unittypes[self.otype]
 
-		self.i = np.zeros(self.nin)
-		self.c = np.zeros(self.nhid)
+		self.i = np.zeros(self.nin, dtype = self.dtype)
+		self.c = np.zeros(self.nhid, dtype = self.dtype)
 		self.h = d['hstate']
-		self.oi = np.zeros(self.nin)
-		self.oc = np.zeros(self.nhid)
+		self.oi = np.zeros(self.nin, dtype = self.dtype)
+		self.oc = np.zeros(self.nhid, dtype = self.dtype)
 
 
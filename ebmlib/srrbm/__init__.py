@@ -1,9 +1,9 @@
 """... automodule::"""
-from srrbm import Srrbm
-from cdktrainer import CdkTrainer
-from pcdtrainer import PcdTrainer
+from . srrbm import Srrbm
+from . cdktrainer import CdkTrainer
+from . pcdtrainer import PcdTrainer
 
-from drrbm import Drrbm
-from disccdktrainer import DiscCdkTrainer
+from . drrbm import Drrbm
+from . disccdktrainer import DiscCdkTrainer
 
-from smsrrbm import SoftmaxSrrbm
+from . smsrrbm import SoftmaxSrrbm
@@ -26,7 +26,7 @@
 # description:
 #	Contrastive Divergence for training recursive RBM variants
 #---------------------------------------#
-from .. units import rthresh, sigmoid
+from .. units import rthresh, sigmoid, apply_update
 import numpy as np
 
 class CdkTrainer(object):
@@ -52,7 +52,15 @@ class CdkTrainer(object):
 					spen = 0.001, p = 0.1, pdecay = 0.96):
 		self.lr, self.m, self.l2 = lr, m, l2
 		self.spen, self.p, self.pdecay = spen, p, pdecay
-		self.q = np.zeros(rbm.nhid)
+		self.q = np.zeros(rbm.nhid, dtype = rbm.dtype)
+		# workspace, reused by every update
+		self._gWhv = np.zeros(rbm.Whv.shape, dtype = rbm.dtype)
+		self._tWhv = np.zeros(rbm.Whv.shape, dtype = rbm.dtype)
+		self._gWhc = np.zeros(rbm.Whc.shape, dtype = rbm.dtype)
+		self._tWhc = np.zeros(rbm.Whc.shape, dtype = rbm.dtype)
+		self._gvb = np.zeros(rbm.vb.shape, dtype = rbm.dtype)
+		self._gcb = np.zeros(rbm.cb.shape, dtype = rbm.dtype)
+		self._ghb = np.zeros(rbm.hb.shape, dtype = rbm.dtype)
 
 	def cross_entropy(self, x, v):
 		return (x * np.log(v + 1e-8) + (1 - x) * np.log(1 - v + 1e-8)).sum()
@@ -78,7 +86,7 @@ class CdkTrainer(object):
 		:rtype: float
 		"""
 		return self.spen * (q - self.p)
-	
+
 	def learn(self, rbm, x, k = 1, m = True, l2 = True, s = True):
 		"""cdk weight update for single visible vector
 
@@ -97,6 +105,7 @@ class CdkTrainer(object):
 
 		:rtype: None
 		"""
+		x = np.asarray(x, dtype = rbm.dtype)
 		pv = x
 		pc = rbm.h
 		ph = rbm.ff(pv, rbm.hid_sample(pc))
@@ -110,55 +119,39 @@ class CdkTrainer(object):
 				nv, nc = rbm.fb(rbm.hid_sample(nh))
 				nh = rbm.ff(rbm.vis_sample(nv), rbm.hid_sample(nc))
 	
-		pgv = np.outer(ph, pv)
-		pgc = np.outer(ph, pc)
-		ngv = np.outer(nh, nv)
-		ngc = np.outer(nh, nc)
-
-		gWhv = pgv - ngv
-		gWhc = pgc - ngc
+		gWhv, gWhc = self._gWhv, self._gWhc
+		gvb, gcb, ghb = self._gvb, self._gcb, self._ghb
+		# positive minus negative outer products as rank 2 products
+		hs = np.vstack((ph, -nh)).T
+		np.dot(hs, np.vstack((pv, nv)), out = gWhv)
+		np.dot(hs, np.vstack((pc, nc)), out = gWhc)
 		
-		gvb = pv - nv
-		gcb = pc - nc
-		ghb = ph - nh
+		np.subtract(pv, nv, out = gvb)
+		np.subtract(pc, nc, out = gcb)
+		np.subtract(ph, nh, out = ghb)
 
 		# regulization
 		if l2:
-			gWhv -= self.l2 * rbm.Whv
-			gWhc -= self.l2 * rbm.Whc
+			np.multiply(rbm.Whv, self.l2, out = self._tWhv)
+			np.multiply(rbm.Whc, self.l2, out = self._tWhc)
+			gWhv -= self._tWhv
+			gWhc -= self._tWhc
 		# sparsity
 		if s:
 			sparse_penalty_term = self.sparseterm(ph)
-			gWhv = (gWhv.T - sparse_penalty_term).T
-			gWhc = (gWhc.T - sparse_penalty_term).T
+			gWhv -= sparse_penalty_term[:, np.newaxis]
+			gWhc -= sparse_penalty_term[:, np.newaxis]
 			ghb -= sparse_penalty_term
 			gcb -= sparse_penalty_term
 
-		dWhv = self.lr * gWhv
-		dWhc = self.lr * gWhc
-		dvb = self.lr * gvb
-		dcb = self.lr * gcb
-		dhb = self.lr * ghb
-
-		# momentum
-		if m:
-			dWhv += self.m * rbm.dWhv
-			dWhc += self.m * rbm.dWhc
-			dvb += self.m * rbm.dvb
-			dcb += self.m * rbm.dcb
-			dhb += self.m * rbm.dhb
-
-		rbm.Whv += dWhv
-		rbm.Whc += dWhc
-		rbm.vb += dvb
-		rbm.cb += dcb
-		rbm.hb += dhb
-
-		rbm.dWhv = dWhv
-		rbm.dWhc = dWhc
-		rbm.dvb = dvb
-		rbm.dcb = dcb
-		rbm.dhb = dhb
+		for g in (gWhv, gWhc, gvb, gcb, ghb):
+			g *= self.lr
+
+		apply_update(rbm.Whv, rbm.dWhv, gWhv, self.m if m else 0.)
+		apply_update(rbm.Whc, rbm.dWhc, gWhc, self.m if m else 0.)
+		apply_update(rbm.vb, rbm.dvb, gvb, self.m if m else 0.)
+		apply_update(rbm.cb, rbm.dcb, gcb, self.m if m else 0.)
+		apply_update(rbm.hb, rbm.dhb, ghb, self.m if m else 0.)
 
 		rbm.h = ph
 		#rbm.push(x)
@@ -180,13 +173,10 @@ class CdkTrainer(object):
 		:type s: bool
 		:rtype: None
 		"""
-		gWhv = np.zeros(rbm.Whv.shape)
-		gWhc = np.zeros(rbm.Whc.shape)
-		gvb = np.zeros(rbm.vb.shape)
-		gcb = np.zeros(rbm.cb.shape)
-		ghb = np.zeros(rbm.hb.shape)
-		
-		q = np.zeros(rbm.nhid)
+		X = np.asarray(X, dtype = rbm.dtype)
+		n = len(X)
+		pvs, pcs, phs = [], [], []
+		nvs, ncs, nhs = [], [], []
 
 		for x in X:
 			pv = x
@@ -201,67 +191,136 @@ class CdkTrainer(object):
 					nv, nc = rbm.fb(rbm.hid_sample(nh))
 					nh = rbm.ff(rbm.vis_sample(nv), rbm.hid_sample(nc))
 	
-			gWhv += np.outer(ph, pv) - np.outer(nh, nv)
-			gWhc += np.outer(ph, pc) - np.outer(nh, nc)
-		
-			gvb += (pv - nv)
-			gcb += (pc - nc)
-			ghb += (ph - nh)
-
-			if s:
-				q += ph
+			pvs.append(pv)
+			pcs.append(pc)
+			phs.append(ph)
+			nvs.append(nv)
+			ncs.append(nc)
+			nhs.append(nh)
 			
 			#rbm.push(x)
 			rbm.h = ph
 
-		gWhv /= len(X)
-		gWhc /= len(X)
-		gvb /= len(X)
-		ghb /= len(X)
-		gcb /= len(X)
+		ph = np.array(phs)
+		nh = np.array(nhs)
+
+		gWhv, gWhc = self._gWhv, self._gWhc
+		gvb, gcb, ghb = self._gvb, self._gcb, self._ghb
+		# summed outer products over the sequence
+		hs = np.vstack((ph, -nh)).T
+		np.dot(hs, np.vstack(pvs + nvs), out = gWhv)
+		np.dot(hs, np.vstack(pcs + ncs), out = gWhc)
+		np.subtract(np.sum(pvs, axis = 0), np.sum(nvs, axis = 0), out = gvb)
+		np.subtract(np.sum(pcs, axis = 0), np.sum(ncs, axis = 0), out = gcb)
+		np.subtract(ph.sum(axis = 0), nh.sum(axis = 0), out = ghb)
+
+		for g in (gWhv, gWhc, gvb, gcb, ghb):
+			g /= n
 
 		# regulization
 		if l2:
-			gWhv -= self.l2 * rbm.Whv
-			gWhc -= self.l2 * rbm.Whc
+			np.multiply(rbm.Whv, self.l2, out = self._tWhv)
+			np.multiply(rbm.Whc, self.l2, out = self._tWhc)
+			gWhv -= self._tWhv
+			gWhc -= self._tWhc
 		# sparsity
 		if s:
-			sparse_penalty_term = self.batchsparseterm(q/len(X))
-			gWhv = (gWhv.T - sparse_penalty_term).T
-			gWhc = (gWhc.T - sparse_penalty_term).T
+			sparse_penalty_term = self.batchsparseterm(ph.sum(axis = 0) / n)
+			gWhv -= sparse_penalty_term[:, np.newaxis]
+			gWhc -= sparse_penalty_term[:, np.newaxis]
 			ghb -= sparse_penalty_term
 			gcb -= sparse_penalty_term
 
-		#dwv = self.lr / len(X) * gwv
-		#dwc = self.lr / len(X) * gwc
-		#dvb = self.lr / len(X) * gvb
-		#dcb = self.lr / len(X) * gcb
-		#dhb = self.lr / len(X) * ghb
-		
-		dWhv = self.lr * gWhv
-		dWhc = self.lr * gWhc
-		dvb = self.lr * gvb
-		dcb = self.lr * gcb
-		dhb = self.lr * ghb
+		for g in (gWhv, gWhc, gvb, gcb, ghb):
+			g *= self.lr
+
+		apply_update(rbm.Whv, rbm.dWhv, gWhv, self.m if m else 0.)
+		apply_update(rbm.Whc, rbm.dWhc, gWhc, self.m if m else 0.)
+		apply_update(rbm.vb, rbm.dvb, gvb, self.m if m else 0.)
+		apply_update(rbm.cb, rbm.dcb, gcb, self.m if m else 0.)
+		apply_update(rbm.hb, rbm.dhb, ghb, self.m if m else 0.)
+
+	def seqbatchlearn(self, rbm, data, batchsizes, k = 1, m = True, l2 = True, s = True):
+		"""cdk weight update for several sequences stepped forward together
+
+		The sequences are given packed by ebmlib.sequences.pack. Each
+		sequence starts from a zero hidden state and the hidden states of
+		all sequences are kept as the rows of one matrix, so every time
+		step is a matrix product over the sequences still running.
+		rbm.h is not used. An empty batch leaves the model unchanged.
+
+		:param rbm: model to update
+		:param data: packed datapoints
+		:param batchsizes: number of running sequences at each time step
+		:param k: number of gibbs steps to take for negative phase
+		:param m: include momentum term in cost function
+		:param l2: include l2 regularization term in cost function
+		:param s: include sparsity penalty term in cost function
+		:type rbm: ebmlib.srrbm.Srrbm
+		:type data: 2d numpy.array
+		:type batchsizes: numpy.array
+		:type k: int
+		:type m: bool
+		:type l2: bool
+		:type s: bool
+		:rtype: None
+		"""
+		data = np.asarray(data, dtype = rbm.dtype)
+		n = len(data)
+		if n == 0:
+			return
+		H = np.zeros((batchsizes[0], rbm.nhid), dtype = rbm.dtype)
 
+		gWhv, gWhc = self._gWhv, self._gWhc
+		gvb, gcb, ghb = self._gvb, self._gcb, self._ghb
+		for g in (gWhv, gWhc, gvb, gcb, ghb):
+			g.fill(0)
+		phsum = np.zeros(rbm.nhid, dtype = rbm.dtype)
 
-		if m:
-			dWhv += self.m * rbm.dWhv
-			dWhc += self.m * rbm.dWhc
-			dvb += self.m * rbm.dvb
-			dcb += self.m * rbm.dcb
-			dhb += self.m * rbm.dhb
+		start = 0
+		for b in batchsizes:
+			pv = data[start:start + b]
+			pc = H[:b]
+			ph = rbm.ff(pv, rbm.hid_sample(pc))
+			nh = ph
+			for i in range(k):
+				nv, nc = rbm.fb(rbm.hid_sample(nh))
+				nh = rbm.ff(rbm.vis_sample(nv), rbm.hid_sample(nc))
+
+			# positive minus negative outer products summed over the running sequences
+			hs = np.vstack((ph, -nh)).T
+			gWhv += np.dot(hs, np.vstack((pv, nv)), out = self._tWhv)
+			gWhc += np.dot(hs, np.vstack((pc, nc)), out = self._tWhc)
+			gvb += pv.sum(axis = 0) - nv.sum(axis = 0)
+			gcb += pc.sum(axis = 0) - nc.sum(axis = 0)
+			ghb += ph.sum(axis = 0) - nh.sum(axis = 0)
+			phsum += ph.sum(axis = 0)
+
+			H[:b] = ph
+			start += b
 
-		rbm.Whv += dWhv
-		rbm.Whc += dWhc
-		rbm.vb += dvb
-		rbm.cb += dcb
-		rbm.hb += dhb
+		for g in (gWhv, gWhc, gvb, gcb, ghb):
+			g /= n
 
-		rbm.dWhv = dWhv
-		rbm.dWhc = dWhc
-		rbm.dvb = dvb
-		rbm.dcb = dcb
-		rbm.dhb = dhb
+		# regulization
+		if l2:
+			np.multiply(rbm.Whv, self.l2, out = self._tWhv)
+			np.multiply(rbm.Whc, self.l2, out = self._tWhc)
+			gWhv -= self._tWhv
+			gWhc -= self._tWhc
+		# sparsity
+		if s:
+			sparse_penalty_term = self.batchsparseterm(phsum / n)
+			gWhv -= sparse_penalty_term[:, np.newaxis]
+			gWhc -= sparse_penalty_term[:, np.newaxis]
+			ghb -= sparse_penalty_term
+			gcb -= sparse_penalty_term
 
+		for g in (gWhv, gWhc, gvb, gcb, ghb):
+			g *= self.lr
 
+		apply_update(rbm.Whv, rbm.dWhv, gWhv, self.m if m else 0.)
+		apply_update(rbm.Whc, rbm.dWhc, gWhc, self.m if m else 0.)
+		apply_update(rbm.vb, rbm.dvb, gvb, self.m if m else 0.)
+		apply_update(rbm.cb, rbm.dcb, gcb, self.m if m else 0.)
+		apply_update(rbm.hb, rbm.dhb, ghb, self.m if m else 0.)
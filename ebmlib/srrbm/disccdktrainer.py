@@ -52,7 +52,7 @@ class DiscCdkTrainer(object):
 					spen = 0.001, p = 0.1, pdecay = 0.96):
 		self.lr, self.m, self.l2 = lr, m, l2
 		self.spen, self.p, self.pdecay = spen, p, pdecay
-		self.q = np.zeros(rbm.nhid)
+		self.q = np.zeros(rbm.nhid, dtype = rbm.dtype)
 
 	def cross_entropy(self, x, v):
 		"""compute the cross entropy of a reconstruction of an input x"""
@@ -99,6 +99,7 @@ class DiscCdkTrainer(object):
 
 		:rtype: None
 		"""
+		x = np.asarray(x, dtype = rbm.dtype)
 		pv = x
 		pc = rbm.h
 		ph = rbm.ff(pv, rbm.hid_sample(pc))
@@ -182,13 +183,14 @@ class DiscCdkTrainer(object):
 
 		:rtype: None
 		"""
-		dWhv = np.zeros(rbm.Whv.shape)
-		dWhc = np.zeros(rbm.Whc.shape)
-		dvb = np.zeros(rbm.vb.shape)
-		dhb = np.zeros(rbm.hb.shape)
-		dcb = np.zeros(rbm.cb.shape)
+		X = np.asarray(X, dtype = rbm.dtype)
+		dWhv = np.zeros(rbm.Whv.shape, dtype = rbm.dtype)
+		dWhc = np.zeros(rbm.Whc.shape, dtype = rbm.dtype)
+		dvb = np.zeros(rbm.vb.shape, dtype = rbm.dtype)
+		dhb = np.zeros(rbm.hb.shape, dtype = rbm.dtype)
+		dcb = np.zeros(rbm.cb.shape, dtype = rbm.dtype)
 		
-		q = np.zeros(rbm.nhid)
+		q = np.zeros(rbm.nhid, dtype = rbm.dtype)
 
 		rbm.reset()
 		for x in X:
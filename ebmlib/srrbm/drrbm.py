@@ -28,34 +28,40 @@
 #---------------------------------------#
 
 import numpy as np
-from .. units import sigmoid, rthresh, softmax
+from .. units import sigmoid, rthresh, softmax, copystate
 
 class Drrbm(object):
 	"""discriminitive recursive restricted boltzmann machine class
 
 	:param nvis: number of visible units
 	:param nhid: number of hidden units
+	:param dtype: floating point type of the weights and biases
 	:type nvis: int
 	:type nhid: int
+	:type dtype: numpy.dtype
 	"""
-	def __init__(self, nvis, nhid):
+	# largest (nhid, nvis) block evaluated at once by symbol_free_energies
+	blocksize = 2 ** 22
+
+	def __init__(self, nvis, nhid, dtype = np.float64):
 		self.nvis = nvis
 		self.nhid = nhid
+		self.dtype = np.dtype(dtype)
 		# weights
-		self.Whv = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nvis))
-		self.Whc = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nhid))
+		self.Whv = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nvis)).astype(dtype)
+		self.Whc = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nhid)).astype(dtype)
 		# biases
-		self.vb = np.zeros(nvis)
-		self.hb = np.zeros(nhid)
-		self.cb = np.zeros(nhid)
+		self.vb = np.zeros(nvis, dtype = dtype)
+		self.hb = np.zeros(nhid, dtype = dtype)
+		self.cb = np.zeros(nhid, dtype = dtype)
 		# deltas
-		self.dWhv = np.zeros((nhid, nvis))
-		self.dWhc = np.zeros((nhid, nhid))
-		self.dvb = np.zeros(nvis)
-		self.dhb = np.zeros(nhid)
-		self.dcb = np.zeros(nhid)
+		self.dWhv = np.zeros((nhid, nvis), dtype = dtype)
+		self.dWhc = np.zeros((nhid, nhid), dtype = dtype)
+		self.dvb = np.zeros(nvis, dtype = dtype)
+		self.dhb = np.zeros(nhid, dtype = dtype)
+		self.dcb = np.zeros(nhid, dtype = dtype)
 		# state
-		self.h = np.zeros(nhid)
+		self.h = np.zeros(nhid, dtype = dtype)
 
 	def hid_sample(self, h):
 		return rthresh(h)
@@ -64,56 +70,91 @@ class Drrbm(object):
 		if det:
 			if index:
 				return v.argmax()
-			s = np.zeros(self.nvis)
+			s = np.zeros(self.nvis, dtype = self.dtype)
 			s[v.argmax()] = 1
 			return s
 		else:
 			if index:
 				return v.cumsum().searchsorted(np.random.random())
-			s = np.zeros(self.nvis)
+			s = np.zeros(self.nvis, dtype = self.dtype)
 			s[v.cumsum().searchsorted(np.random.random())] = 1
 			return s
 
-		r = np.zeros(self.nvis)
+		r = np.zeros(self.nvis, dtype = self.dtype)
 		r[v.argmax()] = 1
 		return r
 
 	def ff(self, v, c):
 		"""sample hidden given visible and context
 
-		:param v: visible unit state
-		:param c: context unit state
+		:param v: visible unit state, or one state per row
+		:param c: context unit state, or one state per row
 		:type v: numpy.array
 		:type c: numpy.array
 		:returns: hidden state
 		:rtype: numpy.array
 		"""
-		return sigmoid(np.dot(self.Whv, v) + np.dot(self.Whc, c) + self.hb)
+		return sigmoid(np.dot(v, self.Whv.T) + np.dot(c, self.Whc.T) + self.hb)
 
 	def fb(self, h):
 		"""sample visible and context given hidden
 
-		:param h: hidden unit state
+		:param h: hidden unit state, or one state per row
 		:type h: numpy.array
 		:returns: visible and context states
 		:rtype: (numpy.ndarray, numpy.ndarray)
 		"""
-		return softmax(np.dot(self.Whv.T, h) + self.vb), sigmoid(np.dot(self.Whc.T, h) + self.cb)
-
-	def output(self, rtype = 'vector'):
-		v_class_vecs = [np.zeros(self.nvis) for i in range(self.nvis)]
-		cbias_term, h_partial = self.context_free_energy_terms(self.h)
-		minfe = float('inf')
-		idx = 999
-		for i, v in enumerate(v_class_vecs):
-			v[i] = 1
-			fe = self.free_energy(v, self.h, cbias_term = cbias_term, h_partial = h_partial)
-			if fe < minfe:
-				minfe = fe
-				idx = i
+		return softmax(np.dot(h, self.Whv) + self.vb), sigmoid(np.dot(h, self.Whc) + self.cb)
+
+	def output(self, rtype = 'vector', k = 1, h = None):
+		"""predict the next visible symbol given the current state
+
+		:param rtype: 'vector' for a 1 of k vector of the symbol with the lowest free energy, 'index' for its index, 'topk' for the indices of the k lowest free energies, 'energy' for every free energy, 'pvec' for the distribution over symbols
+		:param k: number of symbols returned by 'topk'
+		:param h: state to predict from, the model's own if None
+		:type rtype: string
+		:type k: int
+		:type h: numpy.array
+		:returns: prediction
+		:rtype: numpy.array or int
+		"""
+		fe = self.symbol_free_energies(self.h if h is None else h)
+		if rtype == 'energy':
+			return fe
+		elif rtype == 'pvec':
+			return np.exp(-fe - np.logaddexp.reduce(-fe))
+		elif rtype == 'topk':
+			idx = np.argpartition(fe, k - 1)[:k] if k < self.nvis else np.arange(self.nvis)
+			return idx[fe[idx].argsort()]
+		idx = fe.argmin()
 		if rtype == 'index':
 			return idx
-		return v_class_vecs[idx]
+		r = np.zeros(self.nvis, dtype = self.dtype)
+		r[idx] = 1
+		return r
+
+	def symbol_free_energies(self, c):
+		"""compute the free energy of every 1 of k visible vector given a context
+
+		The hidden input of symbol i is h_partial plus column i of Whv, so
+		the free energies are evaluated a block of columns at a time, each
+		block holding at most blocksize elements.
+
+		:param c: context unit state
+		:type c: numpy.array
+		:returns: free energy of each visible symbol
+		:rtype: numpy.array
+		"""
+		cbias_term, h_partial = self.context_free_energy_terms(c)
+		fe = np.empty(self.nvis, dtype = self.dtype)
+		step = max(1, self.blocksize // self.nhid)
+		for i in range(0, self.nvis, step):
+			a = h_partial[:, np.newaxis] + self.Whv[:, i:i + step]
+			np.logaddexp(0, a).sum(axis = 0, out = fe[i:i + step])
+		fe *= -1
+		fe -= self.vb
+		fe += cbias_term
+		return fe
 
 	def context_free_energy_terms(self, c):
 		cbias_term = -1 * np.sum(c * self.cb)
@@ -139,32 +180,66 @@ class Drrbm(object):
 			h_term = -1 * np.sum(np.log(1 + np.exp(h_partial + np.dot(self.Whv, v))))
 		return vbias_term + cbias_term + h_term
 
+	def initial_state(self):
+		"""state of a new sequence
+
+		:returns: zero state
+		:rtype: numpy.array
+		"""
+		return np.zeros(self.nhid, dtype = self.dtype)
+
+	def next_state(self, x, h):
+		"""state after pushing an input, without changing the model
+
+		:param x: input, or one input per row
+		:param h: current state, or one state per row
+		:type x: numpy.array
+		:type h: numpy.array
+		:returns: new state
+		:rtype: numpy.array
+		"""
+		return self.ff(x, self.hid_sample(h))
+
+	def prev_state(self, h):
+		"""pop the most recent input from a state, without changing the model
+
+		:param h: current state
+		:type h: numpy.array
+		:returns: distribution of the visible symbol and previous state
+		:rtype: (numpy.array, numpy.array)
+		"""
+		return self.fb(self.hid_sample(h))
+
 	def push(self, x):
-		self.h = self.ff(x, self.hid_sample(self.h))
+		self.h = self.next_state(x, self.h)
 
 	def pop(self):
-		y, self.h = self.fb(self.hid_sample(self.h))
+		y, self.h = self.prev_state(self.h)
 		return y
 
 	def reset(self):
-		self.h = np.zeros(self.nhid)
+		self.h = self.initial_state()
 
-	def __getstate__(self):
+	def _state(self):
+		"""state of the model without copying its arrays, read by ebmlib.checkpoint"""
 		d = {
 			'nvis':		self.nvis,
 			'nhid':		self.nhid,
-			'Whv':		self.Whv.copy(),
-			'Whc':		self.Whc.copy(),
-			'vb':		self.vb.copy(),
-			'hb':		self.hb.copy(),
-			'cb':		self.cb.copy(),
-			'dWhv':		self.dWhv.copy(),
-			'dWhc':		self.dWhc.copy(),
-			'dhb':		self.dhb.copy(),
-			'dcb':		self.dcb.copy(),
-			'dvb':		self.dvb.copy()}
+			'Whv':		self.Whv,
+			'Whc':		self.Whc,
+			'vb':		self.vb,
+			'hb':		self.hb,
+			'cb':		self.cb,
+			'dWhv':		self.dWhv,
+			'dWhc':		self.dWhc,
+			'dhb':		self.dhb,
+			'dcb':		self.dcb,
+			'dvb':		self.dvb}
 		return d
 
+	def __getstate__(self):
+		return copystate(self._state())
+
 	def __setstate__(self, d):
 		self.nvis = 	d['nvis']
 		self.nhid =		d['nhid']
@@ -178,4 +253,6 @@ class Drrbm(object):
 		self.dvb =		d['dvb']
 		self.dhb =		d['dhb']
 		self.dcb =		d['dcb']
+		self.dtype = self.Whv.dtype
+		self.h = self.initial_state()
 
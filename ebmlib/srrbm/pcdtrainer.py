@@ -54,15 +54,16 @@ class PcdTrainer(object):
 					spen = 0.001, p = 0.1, pdecay = 0.96):
 		self.lr, self.m, self.l2 = lr, m, l2
 		self.spen, self.p, self.pdecay = spen, p, pdecay
-		self.q = np.zeros(rbm.nhid)
+		self.q = np.zeros(rbm.nhid, dtype = rbm.dtype)
 		self.nvis = rbm.nvis
 		self.nhid = rbm.nhid
+		self.dtype = rbm.dtype
 		self.nchains = nchains
-		self.chains = [(np.zeros(rbm.nvis), np.zeros(rbm.nhid)) for i in range(nchains)]
+		self.chains = [(np.zeros(rbm.nvis, dtype = rbm.dtype), np.zeros(rbm.nhid, dtype = rbm.dtype)) for i in range(nchains)]
 
 	def reset_chains(self, p = 0.3):
-		zh = np.zeros(self.nhid)
-		zv = np.zeros(self.nvis)
+		zh = np.zeros(self.nhid, dtype = self.dtype)
+		zv = np.zeros(self.nvis, dtype = self.dtype)
 		self.chains = [(zv.copy(), zh.copy()) if random.random() < p else (v, c) for v, c in self.chains]
 
 	def cross_entropy(self, rbm, x):
@@ -111,17 +112,18 @@ class PcdTrainer(object):
 
 		:rtype: None
 		"""
+		x = np.asarray(x, dtype = rbm.dtype)
 		pv = x
 		pc = rbm.h
 		ph = rbm.ff(pv, rbm.hid_sample(pc))
 		pgWhv = np.outer(ph, pv)
 		pgWhc = np.outer(ph, pc)
 
-		ngWhv = np.zeros((rbm.nhid, rbm.nvis))
-		ngWhc = np.zeros((rbm.nhid, rbm.nhid))
-		ngvb = np.zeros(rbm.nvis)
-		nghb = np.zeros(rbm.nhid)
-		ngcb = np.zeros(rbm.nhid)
+		ngWhv = np.zeros((rbm.nhid, rbm.nvis), dtype = rbm.dtype)
+		ngWhc = np.zeros((rbm.nhid, rbm.nhid), dtype = rbm.dtype)
+		ngvb = np.zeros(rbm.nvis, dtype = rbm.dtype)
+		nghb = np.zeros(rbm.nhid, dtype = rbm.dtype)
+		ngcb = np.zeros(rbm.nhid, dtype = rbm.dtype)
 		
 		indexes = [random.randint(0, self.nchains - 1) for i in range(k)]
 		for index in indexes:
@@ -207,20 +209,21 @@ class PcdTrainer(object):
 
 		:rtype: None
 		"""
-		pgWhv = np.zeros(rbm.Whv.shape)
-		pgWhc = np.zeros(rbm.Whc.shape)
-		ngWhv = np.zeros(rbm.Whv.shape)
-		ngWhc = np.zeros(rbm.Whc.shape)
+		X = np.asarray(X, dtype = rbm.dtype)
+		pgWhv = np.zeros(rbm.Whv.shape, dtype = rbm.dtype)
+		pgWhc = np.zeros(rbm.Whc.shape, dtype = rbm.dtype)
+		ngWhv = np.zeros(rbm.Whv.shape, dtype = rbm.dtype)
+		ngWhc = np.zeros(rbm.Whc.shape, dtype = rbm.dtype)
 		
-		pgvb = np.zeros(rbm.vb.shape)
-		pghb = np.zeros(rbm.hb.shape)
-		pgcb = np.zeros(rbm.cb.shape)
-		ngvb = np.zeros(rbm.vb.shape)
-		nghb = np.zeros(rbm.hb.shape)
-		ngcb = np.zeros(rbm.cb.shape)
+		pgvb = np.zeros(rbm.vb.shape, dtype = rbm.dtype)
+		pghb = np.zeros(rbm.hb.shape, dtype = rbm.dtype)
+		pgcb = np.zeros(rbm.cb.shape, dtype = rbm.dtype)
+		ngvb = np.zeros(rbm.vb.shape, dtype = rbm.dtype)
+		nghb = np.zeros(rbm.hb.shape, dtype = rbm.dtype)
+		ngcb = np.zeros(rbm.cb.shape, dtype = rbm.dtype)
 		
-		q = np.zeros(rbm.nhid)
-		ph = np.zeros(rbm.nhid)
+		q = np.zeros(rbm.nhid, dtype = rbm.dtype)
+		ph = np.zeros(rbm.nhid, dtype = rbm.dtype)
 		indexes = [random.randint(0, self.nchains - 1) for i in range(k)]
 		for x in X:
 			pv = x
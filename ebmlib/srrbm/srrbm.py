@@ -28,7 +28,7 @@
 #---------------------------------------#
 
 import numpy as np
-from .. units import sigmoid, rthresh
+from .. units import sigmoid, rthresh, copystate
 from .. units import unittypes
 
 class Srrbm(object):
@@ -38,33 +38,36 @@ class Srrbm(object):
 	:param nhid: number of hidden units
 	:param vtype: visible unit type, see units.py for available types
 	:param htype: hidden unit type, see units.py for available types
+	:param dtype: floating point type of the weights and biases
 	:type nvis: int
 	:type nhid: int
 	:type vtype: string
 	:type htype: string
+	:type dtype: numpy.dtype
 	"""
-	def __init__(self, nvis, nhid, vtype = 'pthresh', htype = 'sigmoid'):
+	def __init__(self, nvis, nhid, vtype = 'pthresh', htype = 'sigmoid', dtype = np.float64):
 		# unit counts
 		self.nvis = nvis
 		self.nhid = nhid
+		self.dtype = np.dtype(dtype)
 		# units
-		self.v = np.zeros(nvis)
-		self.c = np.zeros(nhid)
-		self.h = np.zeros(nhid)
+		self.v = np.zeros(nvis, dtype = dtype)
+		self.c = np.zeros(nhid, dtype = dtype)
+		self.h = np.zeros(nhid, dtype = dtype)
 		# weights
-		self.Whv = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nvis))
-		self.Whc = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nhid))
+		self.Whv = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nvis)).astype(dtype)
+		self.Whc = np.random.uniform(low = -0.2, high = 0.2, size = (nhid, nhid)).astype(dtype)
 		# biases
-		self.vb = np.zeros(nvis)
-		self.cb = np.zeros(nhid)
-		self.hb = np.zeros(nhid)
+		self.vb = np.zeros(nvis, dtype = dtype)
+		self.cb = np.zeros(nhid, dtype = dtype)
+		self.hb = np.zeros(nhid, dtype = dtype)
 		# delta weights
-		self.dWhv = np.zeros((nhid, nvis))
-		self.dWhc = np.zeros((nhid, nhid))
+		self.dWhv = np.zeros((nhid, nvis), dtype = dtype)
+		self.dWhc = np.zeros((nhid, nhid), dtype = dtype)
 		# delta biases
-		self.dvb = np.zeros(nvis)
-		self.dcb = np.zeros(nhid)
-		self.dhb = np.zeros(nhid)
+		self.dvb = np.zeros(nvis, dtype = dtype)
+		self.dcb = np.zeros(nhid, dtype = dtype)
+		self.dhb = np.zeros(nhid, dtype = dtype)
 		# activation functions
 		self.htype = htype
 		self.vtype = vtype
@@ -74,24 +77,24 @@ class Srrbm(object):
 	def ff(self, v, c):
 		"""sample hidden given visible and context
 
-		:param v: visible unit state
-		:param c: context unit state
+		:param v: visible unit state, or one state per row
+		:param c: context unit state, or one state per row
 		:type v: numpy.array
 		:type c: numpy.array
 		:returns: hidden state
 		:rtype: numpy.array
 		"""
-		return sigmoid(np.dot(self.Whv, v) + np.dot(self.Whc, c) + self.hb)
+		return sigmoid(np.dot(v, self.Whv.T) + np.dot(c, self.Whc.T) + self.hb)
 
 	def fb(self, h):
 		"""sample hidden given visible
 
-		:param h: hidden unit state
+		:param h: hidden unit state, or one state per row
 		:type v: numpy.array
 		:returns: visible state, context state
 		:rtype: tuple (numpy.array, numpy.array)
 		"""
-		return sigmoid(np.dot(self.Whv.T, h) + self.vb), sigmoid(np.dot(self.Whc.T, h) + self.cb)
+		return sigmoid(np.dot(h, self.Whv) + self.vb), sigmoid(np.dot(h, self.Whc) + self.cb)
 
 	def hid_sample(self, h):
 		return rthresh(h)
@@ -99,6 +102,37 @@ class Srrbm(object):
 	def vis_sample(self, v):
 		return rthresh(v)
 
+	def initial_state(self):
+		"""state of a new sequence
+
+		:returns: zero state
+		:rtype: numpy.array
+		"""
+		return np.zeros(self.nhid, dtype = self.dtype)
+
+	def next_state(self, x, h):
+		"""state after pushing an input, without changing the model
+
+		:param x: input, or one input per row
+		:param h: current state, or one state per row
+		:type x: numpy.array
+		:type h: numpy.array
+		:returns: new state
+		:rtype: numpy.array
+		"""
+		return self.ff(x, self.hid_sample(h))
+
+	def prev_state(self, h):
+		"""pop the most recent input from a state, without changing the model
+
+		:param h: current state
+		:type h: numpy.array
+		:returns: visible state and previous state
+		:rtype: (numpy.array, numpy.array)
+		"""
+		v, c = self.fb(self.hid_sample(h))
+		return self.vis_sample(v), c
+
 	def push(self, x):
 		"""push an input x
 
@@ -106,7 +140,7 @@ class Srrbm(object):
 		:type x: numpy.array
 		:rtype: None
 		"""
-		self.h = self.ff(x, self.hid_sample(self.h))
+		self.h = self.next_state(x, self.h)
 
 	def pop(self):
 		"""pop a visible state and return it
@@ -114,50 +148,58 @@ class Srrbm(object):
 		:returns: visible state
 		:rtype: numpy.array
 		"""
-		v, self.h = self.fb(self.hid_sample(self.h))
-		return self.vis_sample(v)
+		v, self.h = self.prev_state(self.h)
+		return v
 
 	def reset(self):
 		"""reset the netowrks stateful hidden units to 0
 		
 		:rtype: None
 		"""
-		self.h = np.zeros(self.nhid)
+		self.h = self.initial_state()
 
-	def free_energy(self, v):
+	def free_energy(self, v, h = None):
 		"""compute the free energy of a visible vector
 
 		:param v: visible unit state
+		:param h: context state, the model's own if None
 		:type v: numpy.ndarray
+		:type h: numpy.ndarray
 		:returns: free energy of v
 		:rtype: float 
 		"""
-		vbias_term = -1 * np.sum(v * self.vb)
-		cbias_term = -1 * np.sum(self.h * self.cb)
-		hidden_term = -1 * np.sum(np.log(1 + np.exp(np.dot(self.Whv, v) + np.dot(self.Whc, self.h) + self.hb)))
+		if h is None:
+			h = self.h
+		vbias_term = -1 * np.dot(v, self.vb)
+		cbias_term = -1 * np.dot(h, self.cb)
+		hidden_term = -1 * np.sum(np.logaddexp(0, np.dot(v, self.Whv.T) + np.dot(h, self.Whc.T) + self.hb), axis = -1)
 		return vbias_term + cbias_term + hidden_term
 
-	def __getstate__(self):
+	def _state(self):
+		"""state of the model without copying its arrays, read by ebmlib.checkpoint"""
 		d = {
 			'nvis':		self.nvis,
 			'nhid':		self.nhid,	
-			'v':		self.v.copy(),
-			'c':		self.c.copy(),
-			'h':		self.h.copy(),
-			'Whv':		self.Whv.copy(),
-			'Whc':		self.Whc.copy(),
-			'vb':		self.vb.copy(),
-			'cb':		self.cb.copy(),
-			'hb':		self.hb.copy(),
-			'dWhv':		self.dWhv.copy(),
-			'dWhc':		self.dWhc.copy(),
-			'dvb':		self.dvb.copy(),
-			'dcb':		self.dcb.copy(),
-			'dhb':		self.dhb.copy(),
+			'v':		self.v,
+			'c':		self.c,
+			'h':		self.h,
+			'Whv':		self.Whv,
+			'Whc':		self.Whc,
+			'vb':		self.vb,
+			'cb':		self.cb,
+			'hb':		self.hb,
+			'dWhv':		self.dWhv,
+			'dWhc':		self.dWhc,
+			'dvb':		self.dvb,
+			'dcb':		self.dcb,
+			'dhb':		self.dhb,
 			'htype':	self.htype,
 			'vtype':	self.vtype}
 		return d
 
+	def __getstate__(self):
+		return copystate(self._state())
+
 	def __setstate__(self, d):
 		self.nvis = 	d['nvis']
 		self.nhid = 	d['nhid']
@@ -176,6 +218,7 @@ class Srrbm(object):
 		self.dhb =		d['dhb']
 		self.htype = 	d['htype']
 		self.vtype = 	d['vtype']
+		self.dtype = self.Whv.dtype
 		self.hact = unittypes[self.htype]
 		self.vact = unittypes[self.vtype]
 
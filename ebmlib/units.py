@@ -29,26 +29,38 @@
 #---------------------------------------#
 
 import numpy
+try:
+	from scipy import sparse
+except ImportError:
+	sparse = None
 
 #--- SAMPLING FUNCTIONS --#
-def pthresh(x):
+def pthresh(x, dtype = None):
 	"""probabilistic step funtion of x
 
 	:param x: input
+	:param dtype: type of the result, defaults to the type of x
 	:type x: numpy.array
+	:type dtype: numpy.dtype
 	:returns: 1 if sigmoid(x_i) >= ~ U(0,1) else 0 for x_i \in x
 	:rtype: numpy.array
 	"""
-	return numpy.array(sigmoid(x) >= numpy.random.random(x.shape), dtype = numpy.float32)
+	if dtype is None:
+		dtype = x.dtype
+	return numpy.array(sigmoid(x) >= numpy.random.random(x.shape), dtype = dtype)
 
-def rthresh(x):
+def rthresh(x, dtype = None):
 	""" sample r, r_i ~ bernoulli(p = x_i)
 	:param x: input
+	:param dtype: type of the result, defaults to the type of x
 	:type x: numpy.array
+	:type dtype: numpy.dtype
 	:returns: 1 if x_i >= ~ U(0,1) else 0 for x_i \in x
 	:rtype: numpy.array
 	"""
-	return numpy.array(x >= numpy.random.random(x.shape), dtype = numpy.float32)
+	if dtype is None:
+		dtype = x.dtype
+	return numpy.array(x >= numpy.random.random(x.shape), dtype = dtype)
 
 def cat(x):
 	""" sample categorical where p(x_i) = \frac{x_i}{\sum_{j = 1}^{n} x_j},
@@ -75,16 +87,20 @@ def catidx(x):
 	return x.cumsum().searchsorted(np.random.random())
 
 #--- ACTIVATION FUNCTIONS ---#
-def thresh(x, t = 0.5):
+def thresh(x, t = 0.5, dtype = None):
 	""" step function
 	:param x: input
 	:param t: threshold
+	:param dtype: type of the result, defaults to the type of x
 	:type x: numpy.array
 	:type t: float
+	:type dtype: numpy.dtype
 	:returns: 1 if x_i >= t else 0 for x_i \in x
 	:rtype: numpy.array
 	"""
-	return numpy.array(x >= t, dtype = numpy.float32)
+	if dtype is None:
+		dtype = x.dtype
+	return numpy.array(x >= t, dtype = dtype)
 
 def sigmoid(x):
 	"""logisitc sigmoid of x
@@ -114,7 +130,7 @@ def rectlinear(x):
 	:returns: max[0, x + ~ N(0, 1 / (1 + (e^(-x))))]
 	:rtype: numpy.array
 	"""
-	return numpy.maximum(0., x + sigmoid(x) * numpy.random.normal(0., 1, x.shape))
+	return numpy.maximum(0., x + sigmoid(x) * numpy.random.normal(0., 1, x.shape).astype(x.dtype))
 
 def linear(x):
 	"""identity function
@@ -127,15 +143,15 @@ def linear(x):
 	return x
 
 def softmax(x):
-	"""softmax function of x
+	"""softmax function of x over the last axis
 
-	:param x: input
+	:param x: input, one vector per row for batches
 	:type x: numpy.array
 	:returns: e^x_i / sum j = 1 to n e^x_j
 	:rtype: numpy.array
 	"""
-	e_to_the_x = numpy.exp(x)
-	return e_to_the_x / e_to_the_x.sum()
+	e_to_the_x = numpy.exp(x - numpy.max(x, axis = -1)[..., numpy.newaxis])
+	return e_to_the_x / e_to_the_x.sum(axis = -1)[..., numpy.newaxis]
 
 def detcat(x):
 	"""deterministic categorical, i.e. 1 of k binary
@@ -198,7 +214,123 @@ def drectlinear(y):
 	:returns: 1 if y_i > 0 else 0 for y_i \in y
 	:rtype: numpy.array
 	"""
-	return numpy.array(y > 0, dtype = numpy.float32)
+	return numpy.array(y > 0, dtype = y.dtype)
+
+#--- PARAMETER UPDATES ---#
+def apply_update(w, dw, g, momentum):
+	"""apply a scaled gradient to a parameter in place
+
+	:param w: parameter to update
+	:param dw: previous update of w, overwritten with the new update
+	:param g: gradient already scaled by the learning rate
+	:param momentum: fraction of the previous update added to g, none if 0
+	:type w: numpy.array
+	:type dw: numpy.array
+	:type g: numpy.array
+	:type momentum: float
+	:rtype: None
+	"""
+	if momentum:
+		dw *= momentum
+		dw += g
+	else:
+		dw[...] = g
+	w += dw
+
+#--- BATCH STATISTICS ---#
+def blockstats(batchstats, X, block = None):
+	"""summed statistics of a batch, computed over blocks of rows added in order
+
+	The blocks and the order they are added in do not depend on how
+	the work is split, so ebmlib.parallel.DataParallelTrainer, which
+	computes the same blocks in several processes, gets bit for bit the
+	same sums.
+
+	:param batchstats: summed statistics of some rows of X, e.g. a trainer's batchstats with the model bound
+	:param X: examples, one per row
+	:param block: number of rows per block, all of them if None
+	:type batchstats: function
+	:type X: 2d numpy.array or scipy.sparse matrix
+	:type block: int
+	:returns: the statistics of all rows of X
+	:rtype: tuple of numpy.array
+	"""
+	n = X.shape[0]
+	if block is None or block >= n:
+		return batchstats(X)
+	total = None
+	for lo in range(0, n, block):
+		stats = batchstats(X[lo:lo + block])
+		if total is None:
+			total = tuple(stat.copy() for stat in stats)
+		else:
+			for t, stat in zip(total, stats):
+				t += stat
+	return total
+
+#--- MODEL STATE ---#
+def copystate(d):
+	"""a model state with every array copied, as returned by __getstate__
+
+	:param d: state from a model's _state, whose arrays are the model's own
+	:type d: dict
+	:rtype: dict
+	"""
+	return dict((k, v.copy() if isinstance(v, numpy.ndarray) else v) for k, v in d.items())
+
+#--- SPARSE INPUT ---#
+def issparse(x):
+	"""whether x is a scipy.sparse matrix, always False without scipy
+
+	:param x: input
+	:type x: numpy.array or scipy.sparse matrix
+	:rtype: bool
+	"""
+	return sparse is not None and sparse.issparse(x)
+
+def asinput(x, dtype):
+	"""x as an array of dtype, or as a csr matrix of dtype if it is sparse
+
+	:param x: input, or one input per row
+	:param dtype: element type
+	:type x: numpy.array or scipy.sparse matrix
+	:type dtype: numpy.dtype
+	:rtype: numpy.array or scipy.sparse.csr_matrix
+	"""
+	if issparse(x):
+		return sparse.csr_matrix(x, dtype = dtype)
+	return numpy.asarray(x, dtype = dtype)
+
+def compact(x):
+	"""the columns of a sparse matrix holding nonzeros, and the matrix of only those columns
+
+	:param x: one input per row
+	:type x: scipy.sparse matrix
+	:returns: column indices and csr matrix with one column per index
+	:rtype: (numpy.array, scipy.sparse.csr_matrix)
+	"""
+	x = sparse.csr_matrix(x)
+	cols, idx = numpy.unique(x.indices, return_inverse = True)
+	return cols, sparse.csr_matrix((x.data, idx, x.indptr), shape = (x.shape[0], len(cols)))
+
+def inputdot(x, W):
+	"""product of inputs with the transpose of a weight matrix, or with a bias vector
+
+	A sparse x is multiplied with only the columns of W it has nonzeros
+	in, so the cost scales with its number of nonzeros rather than its
+	number of columns.
+
+	:param x: input, or one input per row
+	:param W: weights with one column per input element, or a vector
+	:type x: numpy.array or scipy.sparse matrix
+	:type W: numpy.array
+	:returns: numpy.dot(x, W.T)
+	:rtype: numpy.array
+	"""
+	if issparse(x):
+		cols, xc = compact(x)
+		return xc.dot(numpy.ascontiguousarray(numpy.take(W, cols, axis = -1).T))
+	return numpy.dot(x, W.T)
 
 # get function given the function name
 unittypes = {
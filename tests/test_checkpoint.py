@@ -0,0 +1,109 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	test_checkpoint.py
+# description:
+#	Saving and loading every model class with ebmlib.checkpoint.
+#---------------------------------------#
+
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from ebmlib import checkpoint, rbm, srrbm, autoencoder, srautoencoder
+
+x = np.array([1., 0., 1., 1., 0., 0.])
+
+# a model of each class and a use of it for inference
+models = [
+	(lambda: rbm.Rbm(6, 4), lambda m: m.ff(x)),
+	(lambda: rbm.Drbm(6, 3, 4), lambda m: m.output(x)),
+	(lambda: rbm.SoftmaxRbm(6, 4), lambda m: m.ff(x)),
+	(lambda: srrbm.Srrbm(6, 4), lambda m: (m.push(x), m.pop())),
+	(lambda: srrbm.Drrbm(6, 4), lambda m: (m.push(x), m.output())),
+	(lambda: srrbm.SoftmaxSrrbm(6, 4), lambda m: (m.reset(), m.push(x), m.pop())[1:]),
+	(lambda: autoencoder.Autoencoder(6, 4), lambda m: m.encode(x)),
+	(lambda: srautoencoder.SimpleRecursiveAutoencoder(6, 4), lambda m: (m.push(x), m.pop()))]
+
+def flat(y):
+	return np.concatenate([np.ravel(a) for a in y]) if isinstance(y, tuple) else np.ravel(y)
+
+class CheckpointTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def test_round_trip(self):
+		for i, (make, use) in enumerate(models):
+			model = make()
+			for training in (True, False):
+				for mmap in (True, False):
+					path = '%s/%d%d%d' % (self.dir, i, training, mmap)
+					checkpoint.save(model, path, training = training)
+					loaded = checkpoint.load(path, mmap = mmap)
+					name = type(model).__name__
+					self.assertTrue(type(loaded) is type(model), name)
+					state, restored = model._state(), loaded._state()
+					for key, value in state.items():
+						if isinstance(value, np.ndarray) and (training or not checkpoint.isdelta(key, state)):
+							np.testing.assert_array_equal(restored[key], value, err_msg = name + '.' + key)
+					np.random.seed(1)
+					expected = flat(use(model))
+					np.random.seed(1)
+					np.testing.assert_array_equal(flat(use(loaded)), expected, err_msg = name)
+
+class CheckpointWriterTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def test_rotation(self):
+		model = rbm.Rbm(6, 4)
+		writer = checkpoint.CheckpointWriter(self.dir + '/run', keep = 2)
+		for step in range(5):
+			writer.write(model, step)
+		writer.wait()
+		self.assertEqual(writer.checkpoints(), [writer.path(3), writer.path(4)])
+		self.assertRaises(ValueError, checkpoint.CheckpointWriter, self.dir + '/other', keep = 0)
+
+	def test_error_raised_once(self):
+		model = rbm.Rbm(6, 4)
+		writer = checkpoint.CheckpointWriter(self.dir + '/run')
+		# a file in place of the temporary directory makes the save fail
+		open(writer.path(0) + '.tmp', 'w').close()
+		writer.write(model, 0)
+		self.assertRaises(Exception, writer.wait)
+		writer.wait()
+		writer.write(model, 1)
+		writer.wait()
+		self.assertEqual(writer.checkpoints(), [writer.path(1)])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,77 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	test_parallel.py
+# description:
+#	Data parallel training against serial training.
+#---------------------------------------#
+
+import copy
+import unittest
+import numpy as np
+from ebmlib import rbm, autoencoder
+from ebmlib.parallel import DataParallelTrainer
+
+class DataParallelTrainerTest(unittest.TestCase):
+	"""N workers give bit for bit the updates of serial training"""
+
+	def setUp(self):
+		np.random.seed(0)
+		# full minibatches and a last one that ends inside a block
+		data = np.array(np.random.rand(70, 12) > 0.5, dtype = float)
+		self.batches = [data[:32], data[32:64], data[64:]]
+
+	def check(self, make, cls, names, params = {}, kwargs = {}, learnargs = {}):
+		for nworkers in (1, 3):
+			model = make()
+			serial = copy.deepcopy(model)
+			trainer, strainer = cls(model, **params), cls(serial, **params)
+			dp = DataParallelTrainer(trainer, model, 12, 32, nworkers = nworkers, seed = 5, block = 5, **kwargs)
+			try:
+				np.random.seed(5)
+				for X in self.batches:
+					dp.batchlearn(X, **learnargs)
+					strainer.batchlearn(serial, X, block = 5, **dict(kwargs, **learnargs))
+			finally:
+				dp.close()
+			for name in names:
+				np.testing.assert_array_equal(getattr(model, name), getattr(serial, name), err_msg = '%s %d' % (name, nworkers))
+
+	def test_cdk(self):
+		self.check(lambda: rbm.Rbm(12, 7), rbm.CdkTrainer, ('W', 'vb', 'hb', 'dW', 'dvb', 'dhb'),
+			{'spen': 0.1}, {'k': 2}, {'s': True})
+
+	def test_backprop(self):
+		# rectified linear hidden units draw normal noise
+		make = lambda: autoencoder.Autoencoder(12, 7, 'rectlinear', 'sigmoid')
+		names = ('woh', 'whi', 'ob', 'hb', 'dwoh', 'dwhi', 'dob', 'dhb')
+		self.check(make, autoencoder.BackPropTrainer, names)
+		self.check(make, autoencoder.SparseBackPropTrainer, names, {'spen': 0.1})
+
+	def test_rejects_trainer_without_batchstats(self):
+		r = rbm.Rbm(12, 7)
+		self.assertRaises(TypeError, DataParallelTrainer, rbm.PcdTrainer(r), r, 12, 32, nworkers = 1)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,91 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	test_serve.py
+# description:
+#	Request isolation in serve.MicroBatcher.
+#---------------------------------------#
+
+import threading
+import unittest
+import numpy as np
+from ebmlib import rbm
+from ebmlib.serve import MicroBatcher
+
+def negative_fails(X):
+	"""batched function failing on any batch holding a negative input"""
+	if (X < 0).any():
+		raise ValueError('negative input')
+	return X.sum(axis = 1)
+
+class MicroBatcherTest(unittest.TestCase):
+
+	def submit_all(self, mb, inputs):
+		"""submit every input from its own thread, returns results and errors by index"""
+		results, errors = {}, {}
+		def run(i, x):
+			try:
+				results[i] = mb.submit(x)
+			except Exception as e:
+				errors[i] = e
+		threads = [threading.Thread(target = run, args = (i, x)) for i, x in enumerate(inputs)]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+		return results, errors
+
+	def test_bad_request_is_isolated(self):
+		mb = MicroBatcher(negative_fails, maxbatch = 32, maxdelay = 0.05, shape = (3,))
+		inputs = [np.ones(3) * i for i in range(20)]
+		inputs[7] = -np.ones(3)
+		results, errors = self.submit_all(mb, inputs)
+		mb.close()
+		self.assertEqual(sorted(errors), [7])
+		self.assertTrue(isinstance(errors[7], ValueError))
+		for i in range(20):
+			if i != 7:
+				self.assertEqual(results[i], 3 * i)
+		self.assertTrue(max(mb.stats()['batchsizes']) > 1)
+
+	def test_wrong_number_of_results(self):
+		mb = MicroBatcher(lambda X: X.sum(axis = 1)[:1], maxbatch = 32, maxdelay = 0.05, shape = (3,))
+		results, errors = self.submit_all(mb, [np.ones(3) * i for i in range(5)])
+		mb.close()
+		self.assertEqual(errors, {})
+		self.assertEqual(sorted(results.values()), [0, 3, 6, 9, 12])
+
+	def test_rejected_inputs(self):
+		r = rbm.Rbm(4, 3)
+		mb = MicroBatcher(r.free_energy)
+		self.assertEqual(mb.shape, (4,))
+		self.assertRaises(ValueError, mb.submit, np.ones(5))
+		self.assertRaises(ValueError, mb.submit, np.array(['a', 'b', 'c', 'd']))
+		self.assertAlmostEqual(mb.submit(np.ones(4)), r.free_energy(np.ones(4)))
+		mb.close()
+		mb.close()
+		self.assertRaises(RuntimeError, mb.submit, np.ones(4))
+
+if __name__ == '__main__':
+	unittest.main()
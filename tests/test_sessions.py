@@ -0,0 +1,100 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	test_sessions.py
+# description:
+#	Batched stepping and eviction in sessions.SessionStore.
+#---------------------------------------#
+
+import unittest
+import numpy as np
+from ebmlib import srrbm, srautoencoder
+from ebmlib.sessions import Session, SessionStore
+
+class SessionStoreTest(unittest.TestCase):
+
+	def setUp(self):
+		np.random.seed(0)
+		self.model = srautoencoder.SimpleRecursiveAutoencoder(6, 4)
+		self.X = np.random.rand(5, 6)
+
+	def test_tick_matches_sessions(self):
+		store = SessionStore(self.model, capacity = 4)
+		sessions = dict((key, Session(self.model)) for key in 'abc')
+		for i, x in enumerate(self.X):
+			for key in 'abc'[:i % 3 + 1]:
+				store.push(key, x)
+				sessions[key].push(x)
+			# b gets a second input in the same round
+			store.push('b', x)
+			sessions['b'].push(x)
+			store.tick()
+		for key, session in sessions.items():
+			np.testing.assert_allclose(store.state(key), session.h, rtol = 1e-12)
+
+	def test_lru_eviction(self):
+		now = [0.]
+		store = SessionStore(self.model, capacity = 2)
+		store.clock = lambda: now[0]
+		store.push('a', self.X[0])
+		store.push('b', self.X[1])
+		store.tick()
+		store.state('a')
+		store.push('c', self.X[2])
+		self.assertEqual(sorted(store._slots), ['a', 'c'])
+		self.assertEqual(store.evictions, 1)
+		np.testing.assert_array_equal(store.state('c'), self.model.initial_state())
+
+	def test_ttl(self):
+		now = [0.]
+		store = SessionStore(self.model, ttl = 10.)
+		store.clock = lambda: now[0]
+		store.push('a', self.X[0])
+		now[0] = 5.
+		store.push('b', self.X[1])
+		now[0] = 12.
+		store.tick()
+		self.assertFalse('a' in store)
+		self.assertTrue('b' in store)
+
+	def test_lookup_does_not_allocate(self):
+		store = SessionStore(self.model, capacity = 1)
+		store.push('a', self.X[0])
+		store.tick()
+		h = store.state('a')
+		self.assertRaises(KeyError, store.state, 'typo')
+		self.assertRaises(KeyError, store.pop, 'typo')
+		self.assertEqual(list(store._slots), ['a'])
+		self.assertEqual(store.evictions, 0)
+		np.testing.assert_array_equal(store.state('a'), h)
+		store.reset('b')
+		self.assertEqual(list(store._slots), ['b'])
+
+	def test_rejects(self):
+		self.assertRaises(ValueError, SessionStore, srrbm.SoftmaxSrrbm(6, 4))
+		store = SessionStore(self.model)
+		self.assertRaises(ValueError, store.push, 'a', np.ones(5))
+
+if __name__ == '__main__':
+	unittest.main()
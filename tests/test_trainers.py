@@ -0,0 +1,256 @@
+#---------------------------------------#
+#	This file is part of EbmLib.
+#
+#	EbmLib is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	EbmLib is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with EbmLib.  If not, see <http://www.gnu.org/licenses/>.
+#---------------------------------------#
+# author:
+#	tllake
+# email:
+#	<thomas.l.lake@wmich.edu>
+#	<thom.l.lake@gmail.com>
+# date:
+#	2026.10.16
+# file:
+#	test_trainers.py
+# description:
+#	The vectorized trainers against the per example loops they replaced.
+#---------------------------------------#
+
+import copy
+import unittest
+import numpy as np
+from ebmlib import rbm, srrbm, autoencoder, srautoencoder
+from ebmlib.sequences import pack
+
+def deterministic(model):
+	"""replace sampling by thresholding, so both sides see the same states"""
+	model.hid_sample = lambda h: np.array(h > 0.5, dtype = h.dtype)
+	model.vis_sample = lambda v: np.array(v > 0.5, dtype = v.dtype)
+	return model
+
+def update(a, g, d, t, m):
+	"""the baseline parameter update, returns the new delta"""
+	g = t.lr * g
+	if m:
+		g += t.m * d
+	a += g
+	return g
+
+#--- baseline loops ---#
+def loop_cdk(t, r, X, k, m, l2, s):
+	gW, gvb, ghb = np.zeros(r.W.shape), np.zeros(r.vb.shape), np.zeros(r.hb.shape)
+	q = np.zeros(r.nhid)
+	for x in X:
+		ph = r.ff(x)
+		nh = ph
+		for i in range(k):
+			nv = r.fb(r.hid_sample(nh))
+			nh = r.ff(r.vis_sample(nv))
+		gW += np.outer(ph, x) - np.outer(nh, nv)
+		gvb += x - nv
+		ghb += ph - nh
+		q += ph
+	if l2:
+		gW -= t.l2 * r.W
+	if s:
+		penalty = t.spen * (q / len(X) - t.p)
+		gW = (gW.T - penalty).T
+		ghb -= penalty
+	r.dW = update(r.W, gW / len(X), r.dW, t, m)
+	r.dvb = update(r.vb, gvb / len(X), r.dvb, t, m)
+	r.dhb = update(r.hb, ghb / len(X), r.dhb, t, m)
+
+def loop_backprop(t, net, X, m, l2, sparse):
+	gwoh, gwhi = np.zeros(net.woh.shape), np.zeros(net.whi.shape)
+	gob, ghb = np.zeros(net.ob.shape), np.zeros(net.hb.shape)
+	penalty = 0.
+	if sparse:
+		hs = []
+		for x in X:
+			net.ff(x)
+			hs.append(net.h)
+		penalty = t.spen * (np.mean(hs, axis = 0) - t.p)
+	for x in X:
+		o = net.ff(x)
+		eo = t.doerr(o) * (x - o)
+		eh = t.dherr(net.h) * (np.dot(net.woh.T, eo) - penalty)
+		gwoh += np.outer(eo, net.h)
+		gwhi += np.outer(eh, x)
+		gob += eo
+		ghb += eh
+	if l2:
+		gwoh -= t.l2 * net.woh
+		gwhi -= t.l2 * net.whi
+	net.dwoh = update(net.woh, gwoh / len(X), net.dwoh, t, m)
+	net.dwhi = update(net.whi, gwhi / len(X), net.dwhi, t, m)
+	net.dob = update(net.ob, gob / len(X), net.dob, t, m)
+	net.dhb = update(net.hb, ghb / len(X), net.dhb, t, m)
+
+def loop_srrbm(t, r, seqs, k, m, l2, s):
+	g = dict((name, np.zeros(getattr(r, name).shape)) for name in ('Whv', 'Whc', 'vb', 'cb', 'hb'))
+	q = np.zeros(r.nhid)
+	n = 0
+	for X in seqs:
+		pc = np.zeros(r.nhid)
+		for x in X:
+			ph = r.ff(x, r.hid_sample(pc))
+			nh = ph
+			for i in range(k):
+				nv, nc = r.fb(r.hid_sample(nh))
+				nh = r.ff(r.vis_sample(nv), r.hid_sample(nc))
+			g['Whv'] += np.outer(ph, x) - np.outer(nh, nv)
+			g['Whc'] += np.outer(ph, pc) - np.outer(nh, nc)
+			g['vb'] += x - nv
+			g['cb'] += pc - nc
+			g['hb'] += ph - nh
+			q += ph
+			pc = ph
+			n += 1
+	for name in g:
+		g[name] /= n
+	if l2:
+		g['Whv'] -= t.l2 * r.Whv
+		g['Whc'] -= t.l2 * r.Whc
+	if s:
+		penalty = t.spen * (q / n - t.p)
+		g['Whv'] = (g['Whv'].T - penalty).T
+		g['Whc'] = (g['Whc'].T - penalty).T
+		g['hb'] -= penalty
+		g['cb'] -= penalty
+	for name in g:
+		setattr(r, 'd' + name, update(getattr(r, name), g[name], getattr(r, 'd' + name), t, m))
+
+def loop_srautoencoder(t, net, seqs, m, l2, sparse):
+	names = ('woih', 'woch', 'whi', 'whc', 'oib', 'ocb', 'hb')
+	g = dict((name, np.zeros(getattr(net, name).shape)) for name in names)
+	penalty = 0.
+	if sparse:
+		hs = []
+		for X in seqs:
+			net.reset()
+			hs.extend(net.push(x).copy() for x in X)
+		penalty = t.spen * (np.mean(hs, axis = 0) - t.p)
+	n = 0
+	for X in seqs:
+		net.reset()
+		for x in X:
+			c = net.h.copy()
+			net.ff(x, c)
+			eoi = t.doerr(net.oi) * (x - net.oi)
+			eoc = t.dherr(net.oc) * (c - net.oc)
+			eh = t.dherr(net.h) * (np.dot(net.woih.T, eoi) + np.dot(net.woch.T, eoc) - penalty)
+			g['woih'] += np.outer(eoi, net.h)
+			g['woch'] += np.outer(eoc, net.h)
+			g['whi'] += np.outer(eh, x)
+			g['whc'] += np.outer(eh, c)
+			g['oib'] += eoi
+			g['ocb'] += eoc
+			g['hb'] += eh
+			n += 1
+	for name in names:
+		g[name] /= n
+	if l2:
+		for name in ('woih', 'woch', 'whi', 'whc'):
+			g[name] -= t.l2 * getattr(net, name)
+	for name in names:
+		setattr(net, 'd' + name, update(getattr(net, name), g[name], getattr(net, 'd' + name), t, m))
+
+class TrainerTest(unittest.TestCase):
+	"""each vectorized update equals the baseline loop, three steps so momentum is used"""
+
+	def setUp(self):
+		np.random.seed(0)
+
+	def assertSame(self, a, b, names):
+		for name in names:
+			np.testing.assert_allclose(getattr(a, name), getattr(b, name), rtol = 1e-10, atol = 1e-12, err_msg = name)
+
+	def sequences(self, nvis):
+		return [np.array(np.random.rand(n, nvis) > 0.5, dtype = float) for n in (3, 5, 1, 4)]
+
+	def test_rbm_cdk(self):
+		X = np.array(np.random.rand(20, 12) > 0.5, dtype = float)
+		for k in (1, 3):
+			for flags in ((True, True, True), (False, False, False)):
+				a = deterministic(rbm.Rbm(12, 7))
+				b = deterministic(copy.deepcopy(a))
+				ta, tb = rbm.CdkTrainer(a, spen = 0.1), rbm.CdkTrainer(b, spen = 0.1)
+				for step in range(3):
+					ta.batchlearn(a, X, k, *flags)
+					loop_cdk(tb, b, X, k, *flags)
+				self.assertSame(a, b, ('W', 'vb', 'hb', 'dW', 'dvb', 'dhb'))
+
+	def test_autoencoder_backprop(self):
+		X = np.random.rand(16, 12)
+		for cls, sparse in ((autoencoder.BackPropTrainer, False), (autoencoder.SparseBackPropTrainer, True)):
+			for htype, otype in (('tanh', 'sigmoid'), ('sigmoid', 'softmax'), ('linear', 'linear')):
+				a = autoencoder.Autoencoder(12, 7, htype, otype)
+				b = copy.deepcopy(a)
+				kwargs = {'spen': 0.1} if sparse else {}
+				ta, tb = cls(a, **kwargs), cls(b, **kwargs)
+				for step in range(3):
+					ta.batchlearn(a, X)
+					loop_backprop(tb, b, X, True, True, sparse)
+				self.assertSame(a, b, ('woh', 'whi', 'ob', 'hb', 'dwoh', 'dwhi', 'dob', 'dhb'))
+
+	def test_srrbm_cdk(self):
+		seqs = self.sequences(6)
+		for k in (1, 2):
+			a = deterministic(srrbm.Srrbm(6, 4))
+			b = deterministic(copy.deepcopy(a))
+			ta, tb = srrbm.CdkTrainer(a, spen = 0.1), srrbm.CdkTrainer(b, spen = 0.1)
+			data, batchsizes, order = pack(seqs)
+			for step in range(3):
+				ta.seqbatchlearn(a, data, batchsizes, k)
+				loop_srrbm(tb, b, seqs, k, True, True, True)
+			self.assertSame(a, b, ('Whv', 'Whc', 'vb', 'cb', 'hb', 'dWhv', 'dWhc', 'dvb', 'dcb', 'dhb'))
+			# batchlearn trains on one sequence
+			for step in range(3):
+				a.reset()
+				ta.batchlearn(a, seqs[1], k)
+				loop_srrbm(tb, b, seqs[1:2], k, True, True, True)
+			self.assertSame(a, b, ('Whv', 'Whc', 'vb', 'cb', 'hb', 'dWhv', 'dWhc', 'dvb', 'dcb', 'dhb'))
+
+	def test_srrbm_empty_batch(self):
+		r = srrbm.Srrbm(6, 4)
+		W = r.Whv.copy()
+		t = srrbm.CdkTrainer(r)
+		t.seqbatchlearn(r, np.zeros((0, 6)), [])
+		t.seqbatchlearn(r, *pack([])[:2])
+		np.testing.assert_array_equal(r.Whv, W)
+
+	def test_srautoencoder_empty_batch(self):
+		for cls in (srautoencoder.BackPropTrainer, srautoencoder.SparseBackPropTrainer):
+			net = srautoencoder.SimpleRecursiveAutoencoder(6, 4)
+			whi = net.whi.copy()
+			t = cls(net)
+			t.seqbatchlearn(net, np.zeros((0, 6)), [])
+			t.seqbatchlearn(net, *pack([])[:2])
+			np.testing.assert_array_equal(net.whi, whi)
+
+	def test_srautoencoder_backprop(self):
+		seqs = [np.random.rand(n, 6) for n in (3, 5, 1, 4)]
+		data, batchsizes, order = pack(seqs)
+		for cls, sparse in ((srautoencoder.BackPropTrainer, False), (srautoencoder.SparseBackPropTrainer, True)):
+			a = srautoencoder.SimpleRecursiveAutoencoder(6, 4)
+			b = copy.deepcopy(a)
+			kwargs = {'spen': 0.1} if sparse else {}
+			ta, tb = cls(a, **kwargs), cls(b, **kwargs)
+			for step in range(3):
+				ta.seqbatchlearn(a, data, batchsizes)
+				loop_srautoencoder(tb, b, seqs, True, True, sparse)
+			self.assertSame(a, b, ('woih', 'woch', 'whi', 'whc', 'oib', 'ocb', 'hb', 'dwhi', 'dwhc', 'dhb'))
+
+if __name__ == '__main__':
+	unittest.main()